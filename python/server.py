@@ -15,9 +15,13 @@ import tempfile
 import asyncio
 import re
 import threading
-from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import queue
+import time
+import uuid
 from typing import List, Dict, Optional, Any, Tuple
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from concurrent.futures import Future
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -27,6 +31,7 @@ from openai import OpenAI
 from dotenv import load_dotenv
 from platformdirs import user_config_dir
 import hashlib
+import zlib
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -80,6 +85,9 @@ logger.info(f"__file__ path: {__file__}")
 OCR_AVAILABLE = False
 OCR_READER = None
 _OCR_IMPORT_ERROR: Optional[str] = None
+_ocr_reader_lock = threading.Lock()
+# Bump when rendering/recognition changes in a way that makes cached OCR output stale.
+OCR_CACHE_VERSION = 1
 
 def ensure_ocr_loaded() -> bool:
     """
@@ -117,6 +125,13 @@ DOCUMENTS_DIR = os.path.join(USER_DATA_DIR, "documents")
 TEMPLATES_DIR = os.path.join(USER_DATA_DIR, "templates")
 DB_DIR = os.path.join(USER_DATA_DIR, "chroma_db")
 METADATA_FILE = os.path.join(DOCUMENTS_DIR, "metadata.json")
+JOBS_FILE = os.path.join(USER_DATA_DIR, "jobs.json")
+NEAR_DUPLICATES_FILE = os.path.join(USER_DATA_DIR, "minhash.json")
+UPLOAD_SESSIONS_DIR = os.path.join(USER_DATA_DIR, "uploads")
+CACHE_DIR = os.path.join(USER_DATA_DIR, "cache")
+OCR_CACHE_DIR = os.path.join(CACHE_DIR, "ocr")
+COMPETENCY_CACHE_DIR = os.path.join(CACHE_DIR, "competencies")
+EXTRACTED_TEXT_DIR = os.path.join(DOCUMENTS_DIR, ".extracted")
 
 # Ensure all directories exist
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
@@ -132,23 +147,30 @@ APP_NAME = os.environ.get("APP_NAME", "DocuSenseLM")
 
 # Load prompts
 def load_prompts_config():
+    default_prompts = os.path.join(BASE_DIR, "prompts.default.yaml")
+    defaults = {}
+    try:
+        with open(default_prompts, "r") as f:
+            defaults = yaml.safe_load(f) or {}
+    except Exception as e:
+        logger.error(f"Failed to load default prompts: {e}")
+
     # Try loading user override first
     user_prompts = os.path.join(USER_DATA_DIR, "prompts.yaml")
     if os.path.exists(user_prompts):
         try:
             with open(user_prompts, "r") as f:
-                return yaml.safe_load(f)
+                user = yaml.safe_load(f) or {}
+            # prompts.yaml copied from an older version lacks prompts added since; take those from the defaults.
+            if isinstance(user.get("prompts"), dict):
+                for name, prompt in (defaults.get("prompts") or {}).items():
+                    user["prompts"].setdefault(name, prompt)
+            return user
         except Exception as e:
             logger.error(f"Failed to load user prompts: {e}")
 
     # Fallback to default
-    default_prompts = os.path.join(BASE_DIR, "prompts.default.yaml")
-    try:
-        with open(default_prompts, "r") as f:
-            return yaml.safe_load(f)
-    except Exception as e:
-        logger.error(f"Failed to load default prompts: {e}")
-        return {}
+    return defaults
 
 prompts_config = load_prompts_config()
 
@@ -215,6 +237,24 @@ def _get_distance_threshold() -> float:
         pass
     return DEFAULT_DISTANCE_THRESHOLD
 
+def _get_ocr_setting(key: str, default: Any) -> Any:
+    return _get_config_setting("ocr", key, default)
+
+def _get_config_setting(section: str, key: str, default: Any) -> Any:
+    """
+    Read a <section>.<key> value from config.yaml, coerced to the type of `default`.
+    Invalid or missing values fall back to the default.
+    """
+    try:
+        val = (config or {}).get(section, {}).get(key)
+        if val is not None:
+            if isinstance(default, bool):
+                return val if isinstance(val, bool) else str(val).strip().lower() in ("1", "true", "yes", "on")
+            return type(default)(val)
+    except Exception:
+        pass
+    return default
+
 # Ensure user config files exist in USER_DATA_DIR for editing
 if not os.path.exists(os.path.join(USER_DATA_DIR, "config.yaml")):
     config_default_path = os.path.join(BASE_DIR, "config.default.yaml")
@@ -248,23 +288,135 @@ def get_api_key():
     logger.info("OpenAI API key source: none (missing)")
     return None
 
+# --- Embedding providers ---
+# embeddings.provider in config.yaml selects how chunks and queries are embedded:
+# - openai:  OpenAI embeddings API (embeddings.openai_model); needs an API key and network
+# - local:   on-CPU model, no key or network: Chroma's bundled ONNX all-MiniLM-L6-v2 by default,
+#            or a sentence-transformers model named in embeddings.local_model
+# - hashing: deterministic feature-hashing vectors (no model download); a stand-in for tests/CI
+# Vectors from different providers are not comparable, so each provider/model gets its own Chroma
+# collection (see _get_active_collection_name) tagged with embedding_provider in its metadata.
+EMBEDDING_PROVIDERS = ("openai", "local", "hashing")
+DEFAULT_OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+
+def _get_embedding_provider() -> str:
+    provider = str(_get_config_setting("embeddings", "provider", "openai")).strip().lower()
+    if provider not in EMBEDDING_PROVIDERS:
+        logger.warning(f"Unknown embeddings.provider '{provider}', using 'openai'")
+        return "openai"
+    return provider
+
+def _get_embedding_provider_tag() -> str:
+    """Identifies the vector space: provider plus model (and size where it varies)."""
+    provider = _get_embedding_provider()
+    if provider == "openai":
+        tag = f"openai:{_get_config_setting('embeddings', 'openai_model', DEFAULT_OPENAI_EMBEDDING_MODEL)}"
+        dimensions = _get_config_setting("embeddings", "openai_dimensions", 0)
+        return f"{tag}@{dimensions}" if dimensions > 0 else tag
+    if provider == "local":
+        model = _get_config_setting("embeddings", "local_model", "")
+        return f"local:{model or 'onnx-all-MiniLM-L6-v2'}"
+    return f"hashing:{_get_config_setting('embeddings', 'hashing_dimensions', 512)}"
+
+def _get_active_collection_name() -> str:
+    """
+    Collection holding vectors for the configured provider. The default OpenAI model keeps the
+    plain rag.collection_name so existing indexes stay in use; anything else gets a suffix.
+    """
+    base = _get_collection_name()
+    tag = _get_embedding_provider_tag()
+    if tag == f"openai:{DEFAULT_OPENAI_EMBEDDING_MODEL}":
+        return base
+    suffix = re.sub(r"[^a-zA-Z0-9_-]+", "-", tag).strip("-")
+    # Chroma names: 3-63 chars of [a-zA-Z0-9._-], starting and ending alphanumeric.
+    return f"{base}__{suffix}"[:63].rstrip("-_.")
+
+def _hashing_embed(texts: List[str], dimensions: int) -> List[List[float]]:
+    """Signed feature hashing of lowercase word unigrams and bigrams, L2-normalized."""
+    vectors = []
+    for text in texts:
+        vec = [0.0] * dimensions
+        words = re.findall(r"\w+", (text or "").lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % dimensions
+            vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vec) ** 0.5
+        vectors.append([v / norm for v in vec] if norm else vec)
+    return vectors
+
+def _make_hashing_embedding_function(dimensions: int):
+    try:
+        from chromadb.api.types import EmbeddingFunction as _ChromaEmbeddingFunction  # type: ignore[import]
+    except Exception:
+        _ChromaEmbeddingFunction = object
+
+    class HashingEmbeddingFunction(_ChromaEmbeddingFunction):  # type: ignore[misc, valid-type]
+        def __init__(self, dims: int):
+            self.dimensions = dims
+
+        def __call__(self, input):
+            return _hashing_embed(list(input), self.dimensions)
+
+        @staticmethod
+        def name() -> str:
+            return "docusense_hashing"
+
+        def get_config(self) -> Dict[str, Any]:
+            return {"dimensions": self.dimensions}
+
+        @staticmethod
+        def build_from_config(config: Dict[str, Any]):
+            return HashingEmbeddingFunction(int(config.get("dimensions", 512)))
+
+    return HashingEmbeddingFunction(dimensions)
+
+def _build_embedding_function(embedding_functions, api_key: Optional[str]):
+    """Create the configured provider's Chroma embedding function (None if it cannot run)."""
+    provider = _get_embedding_provider()
+    if provider == "openai":
+        if not api_key:
+            return None
+        kwargs = {}
+        dimensions = _get_config_setting("embeddings", "openai_dimensions", 0)
+        if dimensions > 0:
+            # Shortened text-embedding-3 vectors: smaller index on disk and in memory.
+            kwargs["dimensions"] = dimensions
+        return _rate_limit_embedding_function(embedding_functions.OpenAIEmbeddingFunction(
+            api_key=api_key,
+            model_name=_get_config_setting("embeddings", "openai_model", DEFAULT_OPENAI_EMBEDDING_MODEL),
+            **kwargs
+        ))
+    if provider == "local":
+        model = _get_config_setting("embeddings", "local_model", "")
+        if model:
+            # Requires the optional sentence-transformers package.
+            return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model)
+        return embedding_functions.ONNXMiniLM_L6_V2()
+    return _make_hashing_embedding_function(max(8, _get_config_setting("embeddings", "hashing_dimensions", 512)))
+
 # Function to initialize or reinitialize OpenAI client
 def initialize_openai_client():
-    global openai_client, openai_ef, collection, chroma_client
+    global openai_client, embedding_fn, collection, chroma_client
 
     api_key = get_api_key()
+    provider = _get_embedding_provider()
 
     if not api_key:
         logger.warning("No OpenAI API key found in environment or config")
         openai_client = None
-        openai_ef = None
-        collection = None
-        return False
+        if provider == "openai":
+            embedding_fn = None
+            collection = None
+            return False
+        logger.info(f"Embedding provider '{provider}' runs locally; indexing and retrieval stay available without a key")
 
     try:
-        # Initialize OpenAI client with timeout to prevent hanging
-        openai_client = OpenAI(api_key=api_key, timeout=60.0)
-        logger.info("OpenAI client initialized successfully with 60s timeout")
+        if api_key:
+            # Initialize OpenAI client with timeout to prevent hanging. SDK retries are off: openai_request
+            # already retries 429s through the shared limiter, and stacked retries would double the wait.
+            openai_client = OpenAI(api_key=api_key, timeout=60.0, max_retries=0)
+            logger.info("OpenAI client initialized successfully with 60s timeout")
 
         # Ensure Chroma is available (lazy import/init)
         chromadb, embedding_functions = _ensure_chromadb_modules()
@@ -273,32 +425,41 @@ def initialize_openai_client():
                 if chroma_client is None:
                     chroma_client = chromadb.PersistentClient(path=DB_DIR)
 
-        # Initialize ChromaDB with OpenAI embeddings
-        openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-            api_key=api_key,
-            model_name="text-embedding-3-small"
-        )
-        # Initialize ChromaDB collection with OpenAI embeddings
+        # Initialize ChromaDB with the configured embedding provider
+        embedding_fn = _build_embedding_function(embedding_functions, api_key)
+        provider_tag = _get_embedding_provider_tag()
         # If collection name changes across versions, we want to avoid silently creating a new empty one.
-        desired_name = _get_collection_name()
+        desired_name = _get_active_collection_name()
         try:
             collection = chroma_client.get_or_create_collection(
                 name=desired_name,
-                embedding_function=openai_ef
+                embedding_function=embedding_fn,
+                metadata={"embedding_provider": provider_tag}
             )
         except Exception:
             # Fallback for older Chroma versions that may not accept embedding_function on get_or_create
-            collection = chroma_client.get_or_create_collection(name=desired_name)
+            collection = chroma_client.get_or_create_collection(name=desired_name, metadata={"embedding_provider": provider_tag})
             try:
                 # Try to attach embedding function if supported
-                collection._embedding_function = openai_ef  # type: ignore[attr-defined]
+                collection._embedding_function = embedding_fn  # type: ignore[attr-defined]
             except Exception:
                 pass
 
+        _int8_index.reset()
+        with _query_embedding_cache_lock:
+            _query_embedding_cache.clear()
+        existing_tag = (getattr(collection, "metadata", None) or {}).get("embedding_provider")
+        if existing_tag and existing_tag != provider_tag:
+            raise RuntimeError(
+                f"Chroma collection '{desired_name}' holds '{existing_tag}' embeddings but the configured provider is "
+                f"'{provider_tag}'; refusing to mix vector spaces"
+            )
+
         # Detect common footgun: an empty freshly-created collection while another legacy collection has data.
         try:
             desired_count = collection.count() if collection is not None else 0
-            if desired_count == 0:
+            # Legacy collections predate provider tags and hold OpenAI vectors only.
+            if desired_count == 0 and desired_name == _get_collection_name():
                 legacy_candidates = []
                 for c in chroma_client.list_collections():
                     try:
@@ -308,9 +469,12 @@ def initialize_openai_client():
                     if not cname or cname == desired_name:
                         continue
                     try:
-                        legacy_col = chroma_client.get_collection(name=cname, embedding_function=openai_ef)  # type: ignore[arg-type]
+                        legacy_col = chroma_client.get_collection(name=cname, embedding_function=embedding_fn)  # type: ignore[arg-type]
                     except Exception:
                         legacy_col = chroma_client.get_collection(name=cname)  # type: ignore[arg-type]
+                    legacy_tag = (getattr(legacy_col, "metadata", None) or {}).get("embedding_provider")
+                    if legacy_tag and legacy_tag != provider_tag:
+                        continue
                     try:
                         legacy_count = legacy_col.count()
                     except Exception:
@@ -325,41 +489,197 @@ def initialize_openai_client():
                         f"Using legacy collection to avoid silent RAG breakage."
                     )
                     try:
-                        collection = chroma_client.get_collection(name=chosen_name, embedding_function=openai_ef)  # type: ignore[arg-type]
+                        collection = chroma_client.get_collection(name=chosen_name, embedding_function=embedding_fn)  # type: ignore[arg-type]
                     except Exception:
                         collection = chroma_client.get_collection(name=chosen_name)  # type: ignore[arg-type]
                         try:
-                            collection._embedding_function = openai_ef  # type: ignore[attr-defined]
+                            collection._embedding_function = embedding_fn  # type: ignore[attr-defined]
                         except Exception:
                             pass
 
         except Exception as e:
             logger.warning(f"Could not validate Chroma collections on init: {e}")
 
-        logger.info(f"ChromaDB collection initialized: name='{_get_collection_name()}'")
+        logger.info(f"ChromaDB collection initialized: name='{getattr(collection, 'name', desired_name)}', embeddings='{provider_tag}'")
         return True
 
     except Exception as e:
         logger.error(f"Failed to initialize OpenAI client: {e}")
         openai_client = None
-        openai_ef = None
+        embedding_fn = None
         collection = None
         return False
 
 # Chroma/OpenAI clients are initialized lazily (see initialize_openai_client + startup_event).
 chroma_client = None
 openai_client = None
-openai_ef = None
+embedding_fn = None
 collection = None
 
+# --- OpenAI rate limiting ---
+# Ingestion stages, /chat and /report all share one API key. A single token-bucket limiter
+# (requests/minute + tokens/minute, from the api: section of config.yaml) paces every OpenAI call,
+# keeps a reserved slice of capacity that only interactive calls may use so a bulk ingest can't
+# starve a user's question, and pauses everyone when OpenAI answers 429 with Retry-After.
+_openai_interactive: contextvars.ContextVar = contextvars.ContextVar("openai_interactive", default=False)
+
+def _estimate_tokens(*texts: Any) -> int:
+    """Rough token count (~4 characters per token) used only for pacing."""
+    return sum(len(t) for t in texts if isinstance(t, str)) // 4 + 1
+
+class OpenAIRateLimiter:
+    """Thread-safe token buckets for requests and tokens per minute; 0 disables a bucket."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._levels: Dict[str, Optional[float]] = {"requests": None, "tokens": None}
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._rate_limited = 0
+        self._waited_seconds = 0.0
+
+    def _limits(self) -> Dict[str, float]:
+        return {
+            "requests": max(0.0, _get_config_setting("api", "requests_per_minute", 500.0)),
+            "tokens": max(0.0, _get_config_setting("api", "tokens_per_minute", 200000.0)),
+        }
+
+    def _refill_locked(self, limits: Dict[str, float]):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        for name, per_minute in limits.items():
+            level = self._levels[name]
+            self._levels[name] = per_minute if level is None else min(per_minute, level + elapsed * per_minute / 60.0)
+
+    @staticmethod
+    def _reserve(interactive: bool) -> float:
+        """Share of each bucket that background calls must leave untouched."""
+        return 0.0 if interactive else min(0.9, max(0.0, _get_config_setting("api", "interactive_reserve", 0.2)))
+
+    def _wait_seconds_locked(self, limits: Dict[str, float], tokens: int, interactive: bool) -> float:
+        wait = max(0.0, self._blocked_until - time.monotonic())
+        reserve = self._reserve(interactive)
+        for name, cost in (("requests", 1), ("tokens", tokens)):
+            per_minute = limits[name]
+            if per_minute <= 0:
+                continue
+            # A request larger than the usable bucket would never fit; let it through once the bucket is full.
+            usable = per_minute * (1.0 - reserve)
+            need = per_minute * reserve + min(cost, usable)
+            deficit = need - (self._levels[name] or 0.0)
+            if deficit > 0:
+                wait = max(wait, deficit * 60.0 / per_minute)
+        return wait
+
+    def acquire(self, tokens: int = 0, interactive: Optional[bool] = None):
+        """Block until a request costing `tokens` may be sent, then consume its budget."""
+        is_interactive: bool = _openai_interactive.get() if interactive is None else interactive
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                limits = self._limits()
+                self._refill_locked(limits)
+                wait = self._wait_seconds_locked(limits, tokens, is_interactive)
+                if wait <= 0:
+                    break
+                self._cond.wait(timeout=min(wait, 5.0))
+            # An oversize background request is charged only the usable share, never the interactive reserve.
+            reserve = self._reserve(is_interactive)
+            for name, cost in (("requests", 1), ("tokens", tokens)):
+                level = self._levels[name]
+                if limits[name] > 0 and level is not None:
+                    self._levels[name] = level - min(cost, limits[name] * (1.0 - reserve))
+            self._waited_seconds += time.monotonic() - started
+
+    def background_token_budget(self) -> Optional[int]:
+        """Largest token cost a background call can be paced for (None when tokens are unlimited)."""
+        per_minute = self._limits()["tokens"]
+        return int(per_minute * (1.0 - self._reserve(False))) if per_minute > 0 else None
+
+    def on_rate_limited(self, retry_after: float):
+        """OpenAI said 429: nobody sends anything until Retry-After has passed."""
+        with self._cond:
+            self._rate_limited += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            # Whatever the bucket believed, the server says it is empty.
+            self._levels = {name: (0.0 if level is not None else None) for name, level in self._levels.items()}
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            limits = self._limits()
+            self._refill_locked(limits)
+            return {
+                "requests_per_minute": limits["requests"],
+                "tokens_per_minute": limits["tokens"],
+                "available_requests": None if self._levels["requests"] is None else round(self._levels["requests"], 1),
+                "available_tokens": None if self._levels["tokens"] is None else round(self._levels["tokens"]),
+                "blocked_for_seconds": round(max(0.0, self._blocked_until - time.monotonic()), 1),
+                "rate_limited_responses": self._rate_limited,
+                "total_wait_seconds": round(self._waited_seconds, 1),
+            }
+
+openai_limiter = OpenAIRateLimiter()
+
+def _retry_after_seconds(e: Exception, attempt: int) -> float:
+    """Retry-After from a 429 response, else exponential backoff (1s, 2s, 4s, ... capped at 60s)."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return min(60.0, float(2 ** attempt))
+
+def openai_request(call, tokens: int = 0, interactive: Optional[bool] = None):
+    """
+    Run one OpenAI API call through the shared limiter, retrying 429s after Retry-After.
+    `call` is a zero-argument function performing the request.
+    """
+    max_retries = max(0, _get_config_setting("api", "max_retries", 4))
+    attempt = 0
+    while True:
+        openai_limiter.acquire(tokens, interactive=interactive)
+        try:
+            return call()
+        except Exception as e:
+            if not _is_rate_limit_error(e) or attempt >= max_retries:
+                raise
+            delay = _retry_after_seconds(e, attempt)
+            logger.warning(f"OpenAI rate limit hit; retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            openai_limiter.on_rate_limited(delay)
+            attempt += 1
+
+def _is_rate_limit_error(e: Exception) -> bool:
+    """True for OpenAI 429s, whichever layer (openai SDK, Chroma's embedding function) raised them."""
+    if getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError":
+        return True
+    return "429" in str(e) and "rate" in str(e).lower()
+
+def _rate_limit_embedding_function(ef):
+    """Route an embedding function's API calls (made inside Chroma upsert/query) through openai_request."""
+    base = type(ef)
+    # Chroma builds its own OpenAI client (`OpenAI(...).embeddings`); turn off its SDK retries like ours.
+    sdk_client = getattr(getattr(ef, "_client", None), "_client", None)
+    if sdk_client is not None and hasattr(sdk_client, "with_options"):
+        try:
+            ef._client = sdk_client.with_options(max_retries=0).embeddings
+        except Exception as e:
+            logger.warning(f"Could not disable SDK retries on the embedding client: {e}")
+
+    class RateLimitedEmbeddingFunction(base):  # type: ignore[misc, valid-type]
+        def __call__(self, input):
+            return openai_request(lambda: base.__call__(self, input), tokens=_estimate_tokens(*list(input or [])))
+
+    ef.__class__ = RateLimitedEmbeddingFunction
+    return ef
+
 # Initialize FastAPI
 app = FastAPI(title=f"{APP_NAME} API")
 
-# Thread pool for parallel document processing
-# Best Practice: Use ThreadPoolExecutor for I/O-bound and CPU-intensive tasks
-# This allows multiple documents to process in parallel rather than sequentially
-processing_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="doc_processor")
-
 # Thread lock for metadata file access (CRITICAL for thread safety)
 # Prevents race conditions when multiple threads update metadata simultaneously
 metadata_lock = threading.Lock()
@@ -531,7 +851,470 @@ def keyword_search(query: str, all_chunks: List[Dict], n_results: int = 20) -> L
     scored_chunks.sort(key=lambda x: -x["keyword_score"])
     return scored_chunks[:n_results]
 
-def hybrid_search_rrf(query: str, collection, n_results: int = 10, k: int = 60) -> List[Dict]:
+# --- Int8 first-pass vector search ---
+# With rag.quantized_search enabled, the semantic half of hybrid search scans an in-memory int8
+# copy of every chunk vector (1 byte per dimension instead of 4) and then rescores the best
+# rag.rescore_factor x n candidates exactly against their float vectors from Chroma. Distances
+# are squared L2, the same measure Chroma's default collection space reports, so
+# rag.distance_threshold keeps its meaning. The copy is built from Chroma on first use and kept
+# in sync by index_document/delete_document.
+
+def _quantize_int8(matrix):
+    """Symmetric per-vector scalar quantization: returns (int8 codes, float32 scales)."""
+    import numpy as np
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+class Int8VectorIndex:
+    """Brute-force int8 index over one collection's chunk vectors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.collection_name: Optional[str] = None
+        self.ids: List[str] = []
+        self.filenames: List[str] = []
+        # numpy arrays (numpy is imported lazily, hence Any); None until built.
+        self.codes: Any = None   # (N, D) int8
+        self.scales: Any = None  # (N,) float32
+        self.norms2: Any = None  # (N,) float32, squared norms of the original float vectors
+
+    @property
+    def built(self) -> bool:
+        return self.codes is not None
+
+    def reset(self):
+        with self._lock:
+            self.collection_name, self.ids, self.filenames = None, [], []
+            self.codes = self.scales = self.norms2 = None
+
+    def build(self, col):
+        import numpy as np
+        got = col.get(include=["embeddings", "metadatas"])
+        ids = list(got.get("ids") or [])
+        embeddings = got.get("embeddings")
+        metas = got.get("metadatas") or [{}] * len(ids)
+        matrix = np.asarray(embeddings if embeddings is not None and len(ids) else np.zeros((0, 0)), dtype=np.float32)
+        codes, scales = _quantize_int8(matrix)
+        with self._lock:
+            self.collection_name = getattr(col, "name", None)
+            self.ids = ids
+            self.filenames = [(m or {}).get("filename", "") for m in metas]
+            self.codes, self.scales = codes, scales
+            self.norms2 = (matrix * matrix).sum(axis=1) if len(ids) else np.zeros(0, dtype=np.float32)
+        logger.info(f"Built int8 search index: {len(ids)} vectors ({self.stats()['int8_bytes']} bytes)")
+
+    def remove_file(self, filename: str):
+        import numpy as np
+        with self._lock:
+            if not self.built:
+                return
+            keep = np.array([f != filename for f in self.filenames], dtype=bool)
+            if keep.all():
+                return
+            self.ids = [i for i, k in zip(self.ids, keep) if k]
+            self.filenames = [f for f, k in zip(self.filenames, keep) if k]
+            self.codes, self.scales, self.norms2 = self.codes[keep], self.scales[keep], self.norms2[keep]
+
+    def add(self, ids: List[str], embeddings, filename: str):
+        import numpy as np
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        codes, scales = _quantize_int8(matrix)
+        with self._lock:
+            if not self.built:
+                return
+            if len(self.ids) and self.codes.shape[1] != matrix.shape[1]:
+                # Dimension changed under us; rebuild from Chroma on next search.
+                self.codes = None
+                return
+            self.ids = self.ids + list(ids)
+            self.filenames = self.filenames + [filename] * len(ids)
+            self.codes = np.concatenate([self.codes.reshape(-1, matrix.shape[1]), codes])
+            self.scales = np.concatenate([self.scales, scales])
+            self.norms2 = np.concatenate([self.norms2, (matrix * matrix).sum(axis=1)])
+
+    def search(self, query_vector, n: int, filename: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Approximate squared-L2 nearest neighbours: ||v||^2 - 2 v.q + ||q||^2 with v ~ codes * scale."""
+        import numpy as np
+        q = np.asarray(query_vector, dtype=np.float32)
+        with self._lock:
+            if not self.built or not len(self.ids):
+                return []
+            dots = (self.codes.astype(np.float32) @ q) * self.scales
+            approx = self.norms2 - 2.0 * dots + float(q @ q)
+            if filename is not None:
+                approx = np.where(np.array([f == filename for f in self.filenames]), approx, np.inf)
+            top = [i for i in np.argsort(approx)[:max(1, n)] if np.isfinite(approx[i])]
+            return [(self.ids[i], float(approx[i])) for i in top]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = len(self.ids)
+            dims = int(self.codes.shape[1]) if self.built and n else 0
+        return {
+            "vectors": n,
+            "dimensions": dims,
+            "float32_bytes": n * dims * 4,
+            "int8_bytes": n * (dims + 4),  # codes + per-vector scale
+        }
+
+_int8_index = Int8VectorIndex()
+
+def _quantized_search_enabled() -> bool:
+    return bool(_get_config_setting("rag", "quantized_search", False)) and embedding_fn is not None
+
+# Query embeddings are reused: competency questions are asked of every document, and chat users
+# repeat questions. Keyed by provider tag so a provider switch never reuses foreign vectors.
+_query_embedding_cache: Dict[Tuple[str, str], Any] = {}
+_query_embedding_cache_lock = threading.Lock()
+QUERY_EMBEDDING_CACHE_SIZE = 512
+
+def embed_query(query: str):
+    key = (_get_embedding_provider_tag(), query)
+    with _query_embedding_cache_lock:
+        vector = _query_embedding_cache.get(key)
+    if vector is None:
+        vector = _embed_with_current_function([query])[0]
+        with _query_embedding_cache_lock:
+            if len(_query_embedding_cache) >= QUERY_EMBEDDING_CACHE_SIZE:
+                _query_embedding_cache.pop(next(iter(_query_embedding_cache)))
+            _query_embedding_cache[key] = vector
+    return vector
+
+def semantic_query(col, query: str, n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Vector search returning collection.query()'s result shape. Uses the int8 first pass with exact
+    rescoring when enabled, and Chroma's own index otherwise (or if the int8 path fails).
+    `where` is a Chroma metadata filter; the int8 path supports {"filename": ...}.
+    """
+    int8_filter_ok = not where or set(where) == {"filename"}
+    if _quantized_search_enabled() and int8_filter_ok:
+        try:
+            import numpy as np
+            if not _int8_index.built or _int8_index.collection_name != getattr(col, "name", None):
+                _int8_index.build(col)
+            query_vector = np.asarray(embed_query(query), dtype=np.float32)
+            factor = max(1, _get_config_setting("rag", "rescore_factor", 4))
+            candidate_ids = [cid for cid, _ in _int8_index.search(query_vector, n_results * factor, filename=(where or {}).get("filename"))]
+            if not candidate_ids:
+                return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+            got = col.get(ids=candidate_ids, include=["embeddings", "documents", "metadatas"])
+            vectors = np.asarray(got["embeddings"], dtype=np.float32)
+            exact = ((vectors - query_vector) ** 2).sum(axis=1)
+            order = np.argsort(exact)[:n_results]
+            return {
+                "ids": [[got["ids"][i] for i in order]],
+                "documents": [[got["documents"][i] for i in order]],
+                "metadatas": [[(got.get("metadatas") or [{}] * len(got["ids"]))[i] for i in order]],
+                "distances": [[float(exact[i]) for i in order]],
+            }
+        except Exception as e:
+            logger.warning(f"Int8 search failed, falling back to Chroma query: {e}")
+            _int8_index.reset()
+    kwargs: Dict[str, Any] = {"n_results": n_results, "include": ['documents', 'metadatas', 'distances']}
+    if where:
+        kwargs["where"] = where
+    if embedding_fn is not None:
+        try:
+            return col.query(query_embeddings=[embed_query(query)], **kwargs)
+        except Exception as e:
+            logger.warning(f"Query embedding failed, letting Chroma embed the query: {e}")
+    return col.query(query_texts=[query], **kwargs)
+
+def compression_report(matrix, query_vectors, k: int = 5, rescore_factor: int = 4,
+                       dimensions: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Recall@k of compressed search modes against exact float32 search, plus storage per mode.
+    Truncated dimensions are evaluated by cutting and re-normalizing the stored vectors, which
+    matches what the API's `dimensions` parameter returns for text-embedding-3 models.
+    """
+    import numpy as np
+    matrix = np.asarray(matrix, dtype=np.float32)
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    n, dims = matrix.shape
+    k = max(1, min(k, n))
+
+    def topk(corpus, q, count):
+        d = ((corpus - q) ** 2).sum(axis=1)
+        return list(np.argsort(d)[:count])
+
+    def recall(results):
+        hits = [len(set(r) & set(t)) / k for r, t in zip(results, truth)]
+        return round(float(np.mean(hits)), 4) if hits else None
+
+    truth = [topk(matrix, q, k) for q in queries]
+    codes, scales = _quantize_int8(matrix)
+    dequant = codes.astype(np.float32) * scales[:, None]
+    int8_first = [topk(dequant, q, k) for q in queries]
+    int8_rescored = []
+    for q in queries:
+        cands = topk(dequant, q, k * max(1, rescore_factor))
+        exact = ((matrix[cands] - q) ** 2).sum(axis=1)
+        int8_rescored.append([cands[i] for i in np.argsort(exact)[:k]])
+
+    modes = {
+        "float32": {"bytes": n * dims * 4, "recall_at_k": 1.0},
+        "int8": {"bytes": n * (dims + 4), "recall_at_k": recall(int8_first)},
+        "int8_rescored": {"bytes": n * (dims + 4), "recall_at_k": recall(int8_rescored)},
+    }
+    for d in sorted(set(dimensions or [])):
+        if not 0 < d < dims:
+            continue
+        def cut(x):
+            x = x[..., :d]
+            norms = np.linalg.norm(x, axis=-1, keepdims=True)
+            return x / np.where(norms > 0, norms, 1.0)
+        reduced = cut(matrix)
+        modes[f"dimensions_{d}"] = {
+            "bytes": n * d * 4,
+            "recall_at_k": recall([topk(reduced, cut(q), k) for q in queries]),
+        }
+    for mode in modes.values():
+        mode["savings"] = round(1.0 - mode["bytes"] / float(n * dims * 4), 4) if n and dims else 0.0
+    return {"vectors": n, "dimensions": dims, "k": k, "queries": len(queries), "modes": modes}
+
+# --- Near-duplicate detection (MinHash / LSH) ---
+# Archives hold many templated NDAs that differ only in party names. Each document gets a MinHash
+# signature over its word shingles at ingestion; an LSH index (bands of signature rows hashed into
+# buckets) finds candidates in sub-linear time, and candidates whose estimated Jaccard similarity
+# reaches near_duplicates.threshold are recorded both ways in metadata (near_duplicates). Hybrid
+# search uses the same index to collapse a chunk whose text is nearly identical to a higher-ranked
+# chunk from a near-duplicate document, so templated boilerplate doesn't crowd out other context.
+# Signatures are kept in USER_DATA_DIR/minhash.json.
+_MINHASH_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+def _shingle_hashes(text: str, shingle_words: int):
+    import numpy as np
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) <= shingle_words:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+def minhash_signature(text: str, num_perm: int = 128, shingle_words: int = 5) -> Optional[List[int]]:
+    """MinHash signature of text's word shingles, or None for text without words."""
+    import numpy as np
+    shingles = _shingle_hashes(text, shingle_words)
+    if shingles.size == 0:
+        return None
+    rng = np.random.default_rng(1)
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    signature = np.full(num_perm, _MINHASH_PRIME, dtype=np.uint64)
+    # a, b and the shingle hashes are < 2**32, so a * x + b cannot overflow uint64.
+    for start in range(0, shingles.size, 4096):
+        block = shingles[start:start + 4096, None]
+        signature = np.minimum(signature, ((block * a + b) % _MINHASH_PRIME).min(axis=0))
+    return [int(v) for v in signature]
+
+def minhash_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+class NearDuplicateIndex:
+    """Persistent MinHash signatures with an in-memory LSH band index."""
+
+    def __init__(self, path: str, num_perm: int = 128, bands: int = 16, threshold: float = 0.8,
+                 shingle_words: int = 5):
+        self.path = path
+        self.num_perm = int(num_perm)
+        self.shingle_words = int(shingle_words)
+        self.settings = {"num_perm": self.num_perm, "bands": int(bands), "threshold": float(threshold),
+                         "shingle_words": self.shingle_words}
+        self.bands = max(1, min(int(bands), self.num_perm))
+        self.rows = self.num_perm // self.bands
+        self.threshold = float(threshold)
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, List[int]] = {}
+        self._buckets: Dict[Tuple[int, int], set] = {}
+        self._loaded = False
+
+    def _band_keys(self, signature: List[int]) -> List[Tuple[int, int]]:
+        return [(i, hash(tuple(signature[i * self.rows:(i + 1) * self.rows]))) for i in range(self.bands)]
+
+    def _load_locked(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                # Signatures made with other permutations or shingle sizes are not comparable with new ones.
+                if data.get("num_perm") == self.num_perm and data.get("shingle_words") == self.shingle_words:
+                    self._signatures = {k: v for k, v in (data.get("signatures") or {}).items() if len(v) == self.num_perm}
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable near-duplicate index {self.path}: {e}")
+        for fname, sig in self._signatures.items():
+            for key in self._band_keys(sig):
+                self._buckets.setdefault(key, set()).add(fname)
+
+    def _save_locked(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"num_perm": self.num_perm, "shingle_words": self.shingle_words,
+                           "signatures": self._signatures}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not save near-duplicate index: {e}")
+
+    def _remove_locked(self, filename: str) -> bool:
+        sig = self._signatures.pop(filename, None)
+        if sig is None:
+            return False
+        for key in self._band_keys(sig):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(filename)
+                if not bucket:
+                    del self._buckets[key]
+        return True
+
+    def _query_locked(self, signature: List[int], exclude: Optional[str] = None) -> Dict[str, float]:
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates |= self._buckets.get(key, set())
+        candidates.discard(exclude)
+        matches = {}
+        for fname in candidates:
+            similarity = minhash_similarity(signature, self._signatures[fname])
+            if similarity >= self.threshold:
+                matches[fname] = round(similarity, 3)
+        return matches
+
+    def add(self, filename: str, signature: List[int]) -> Dict[str, float]:
+        """Index filename (replacing any earlier signature) and return its near-duplicates."""
+        with self._lock:
+            self._load_locked()
+            self._remove_locked(filename)
+            matches = self._query_locked(signature, exclude=filename)
+            self._signatures[filename] = list(signature)
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(filename)
+            self._save_locked()
+            return matches
+
+    def remove(self, filename: str):
+        with self._lock:
+            self._load_locked()
+            if self._remove_locked(filename):
+                self._save_locked()
+
+    def clear(self):
+        with self._lock:
+            self._loaded = True
+            self._signatures = {}
+            self._buckets = {}
+            self._save_locked()
+
+    def neighbors(self, filename: str) -> Dict[str, float]:
+        with self._lock:
+            self._load_locked()
+            sig = self._signatures.get(filename)
+            return self._query_locked(sig, exclude=filename) if sig else {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load_locked()
+            return len(self._signatures)
+
+_near_duplicate_index: Optional[NearDuplicateIndex] = None
+_near_duplicate_index_lock = threading.Lock()
+
+def _near_duplicates_enabled() -> bool:
+    return bool(_get_config_setting("near_duplicates", "enabled", True))
+
+def _get_near_duplicate_index() -> NearDuplicateIndex:
+    """The shared index, recreated when the near_duplicates settings in config.yaml change."""
+    global _near_duplicate_index
+    settings = {
+        "num_perm": int(_get_config_setting("near_duplicates", "num_perm", 128)),
+        "bands": int(_get_config_setting("near_duplicates", "bands", 16)),
+        "threshold": float(_get_config_setting("near_duplicates", "threshold", 0.8)),
+        "shingle_words": int(_get_config_setting("near_duplicates", "shingle_words", 5)),
+    }
+    with _near_duplicate_index_lock:
+        index = _near_duplicate_index
+        if index is None or index.settings != settings:
+            index = _near_duplicate_index = NearDuplicateIndex(NEAR_DUPLICATES_FILE, **settings)
+        return index
+
+def _document_signature(text: str) -> Optional[List[int]]:
+    if not _near_duplicates_enabled():
+        return None
+    return minhash_signature(
+        text,
+        num_perm=_get_config_setting("near_duplicates", "num_perm", 128),
+        shingle_words=_get_config_setting("near_duplicates", "shingle_words", 5),
+    )
+
+def record_near_duplicates(metadata: Dict[str, Any], filename: str, signature: Optional[List[int]]) -> List[Dict[str, Any]]:
+    """Index filename's signature and update near_duplicates on it and its matches (metadata not saved)."""
+    index = _get_near_duplicate_index()
+    if signature:
+        matches = index.add(filename, signature)
+    else:
+        index.remove(filename)
+        matches = {}
+    _forget_near_duplicate(metadata, filename)
+    entries = [{"filename": f, "similarity": sim} for f, sim in sorted(matches.items(), key=lambda x: -x[1]) if f in metadata]
+    if filename in metadata:
+        metadata[filename]["near_duplicates"] = entries
+    for match in entries:
+        others = metadata[match["filename"]].setdefault("near_duplicates", [])
+        others.append({"filename": filename, "similarity": match["similarity"]})
+    if entries:
+        logger.info(f"{filename} is a near-duplicate of {[e['filename'] for e in entries]}")
+    return entries
+
+def _forget_near_duplicate(metadata: Dict[str, Any], filename: str):
+    """Drop filename from every other document's near_duplicates list."""
+    for fname, entry in metadata.items():
+        if fname != filename and isinstance(entry, dict) and entry.get("near_duplicates"):
+            entry["near_duplicates"] = [d for d in entry["near_duplicates"] if d.get("filename") != filename]
+
+def _word_set(text: str) -> set:
+    return set(_WORD_RE.findall((text or "").lower()))
+
+def collapse_near_duplicate_chunks(results: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+    """
+    Keep the first n_results ranked chunks, skipping chunks that repeat (by word Jaccard similarity
+    >= near_duplicates.chunk_similarity) a kept chunk from a near-duplicate document. The kept chunk
+    lists the collapsed files under 'near_duplicate_files'.
+    """
+    chunk_similarity = float(_get_config_setting("near_duplicates", "chunk_similarity", 0.8))
+    index = _get_near_duplicate_index()
+    neighbors: Dict[str, Dict[str, float]] = {}
+    kept: List[Dict[str, Any]] = []
+    for result in results:
+        fname = result.get("filename") or ""
+        if fname not in neighbors:
+            neighbors[fname] = index.neighbors(fname) if fname else {}
+        duplicate_of = None
+        for k in kept:
+            if k.get("filename") == fname or k.get("filename") not in neighbors[fname]:
+                continue
+            a, b = _word_set(k["doc"]), _word_set(result.get("doc") or "")
+            if a and b and len(a & b) / len(a | b) >= chunk_similarity:
+                duplicate_of = k
+                break
+        if duplicate_of is not None:
+            duplicate_of.setdefault("near_duplicate_files", [])
+            if fname not in duplicate_of["near_duplicate_files"]:
+                duplicate_of["near_duplicate_files"].append(fname)
+            continue
+        kept.append(result)
+        if len(kept) >= n_results:
+            break
+    return kept
+
+def hybrid_search_rrf(query: str, collection, n_results: int = 10, k: int = 60, where: Optional[Dict[str, Any]] = None) -> List[Dict]:
     """
     Perform hybrid search using Reciprocal Rank Fusion (RRF).
     Combines semantic vector search with keyword-based search.
@@ -543,6 +1326,7 @@ def hybrid_search_rrf(query: str, collection, n_results: int = 10, k: int = 60)
         collection: ChromaDB collection
         n_results: Number of final results to return
         k: RRF constant (default 60, higher = more weight to lower ranks)
+        where: optional Chroma metadata filter (e.g. {"filename": ...}) applied to both searches
 
     Returns:
         List of chunk dicts sorted by combined RRF score
@@ -560,14 +1344,13 @@ def hybrid_search_rrf(query: str, collection, n_results: int = 10, k: int = 60)
     keyword_n = n_results * 3
 
     # 1. Semantic Search (vector-based)
-    semantic_results = collection.query(
-        query_texts=[query],
-        n_results=semantic_n,
-        include=['documents', 'metadatas', 'distances']
-    )
+    semantic_results = semantic_query(collection, query, semantic_n, where=where)
 
     # 2. Get all chunks for keyword search (we'll score them)
-    all_chunks_result = collection.get(include=['documents', 'metadatas'])
+    if where:
+        all_chunks_result = collection.get(where=where, include=['documents', 'metadatas'])
+    else:
+        all_chunks_result = collection.get(include=['documents', 'metadatas'])
     all_chunks = []
     if all_chunks_result and all_chunks_result.get('ids'):
         for i, doc_id in enumerate(all_chunks_result['ids']):
@@ -646,6 +1429,14 @@ def hybrid_search_rrf(query: str, collection, n_results: int = 10, k: int = 60)
             kw_matches = result.get('matched_keywords', [])
             logger.info(f"  #{i+1}: RRF={result['score']:.4f}, sem_rank={sem_rank}, kw_rank={kw_rank}, file={result['filename'][:40]}, kw_matches={kw_matches}")
 
+    # 6. Collapse boilerplate repeated across near-duplicate documents (not needed within one file)
+    if not (where and "filename" in where) and _near_duplicates_enabled() \
+            and _get_config_setting("near_duplicates", "collapse_in_search", True):
+        try:
+            return collapse_near_duplicate_chunks(sorted_results, n_results)
+        except Exception as e:
+            logger.warning(f"Near-duplicate collapsing failed, returning uncollapsed results: {e}")
+
     return sorted_results[:n_results]
 
 def load_metadata():
@@ -677,169 +1468,843 @@ def save_metadata(metadata):
             logger.error(f"Error saving metadata: {e}")
             raise
 
-def is_scanned_pdf(filepath):
+# Text stamped onto every page by DocuSign, including pages that are otherwise pure scans.
+DOCUSIGN_STAMP_MARKERS = ("DocuSign", "Envelope ID")
+
+def _page_needs_ocr(page_text: Optional[str], min_chars: int) -> bool:
+    """
+    Decide whether a single PDF page must be OCR'd.
+    A page needs OCR when its native text layer is (nearly) empty once DocuSign envelope
+    stamps are ignored - i.e. the content is an image (scanned page, signature/exhibit scan).
+    """
+    text = (page_text or "").strip()
+    if not text:
+        return True
+    if any(m in text for m in DOCUSIGN_STAMP_MARKERS):
+        lines = [ln for ln in text.splitlines() if not any(m in ln for m in DOCUSIGN_STAMP_MARKERS)]
+        text = "\n".join(lines).strip()
+    return len(text) < min_chars
+
+def _new_easyocr_reader():
+    """Construct an EasyOCR reader, preferring bundled models under tools/easyocr_models."""
+    model_dir = os.path.join(BASE_DIR, "tools", "easyocr_models")
+    if os.path.exists(model_dir):
+        logger.info(f"Using EasyOCR models from {model_dir}")
+        return easyocr.Reader(['en'], model_storage_directory=model_dir)
+    logger.info("Using default EasyOCR model location")
+    return easyocr.Reader(['en'])
+
+def _get_ocr_reader():
+    """
+    Return the in-process EasyOCR reader, constructing it on first use.
+    Callers must have checked ensure_ocr_loaded() first.
+    """
+    global OCR_READER
+    if OCR_READER is None:
+        with _ocr_reader_lock:
+            if OCR_READER is None:
+                OCR_READER = _new_easyocr_reader()
+    return OCR_READER
+
+def _readtext(reader, samples: bytes, height: int, width: int, channels: int) -> Tuple[str, float]:
     """
-    Detect if a PDF is scanned (image-based) or text-based.
-    Returns True if scanned, False if text-based.
+    Run EasyOCR on a raw rendered page (PyMuPDF pixmap samples).
+    Returns (text lines joined by newlines, mean detection confidence; 0.0 when nothing was detected).
     """
+    import numpy as np
+    img_array = np.frombuffer(samples, dtype=np.uint8).reshape(height, width, channels)
+    if channels == 1:
+        img_array = img_array.reshape(height, width)
+    elif channels == 4:
+        # Convert RGBA to RGB
+        img_array = img_array[:, :, :3]
+    result = reader.readtext(img_array)
+    detections = [d for d in result if len(d) > 1]
+    text = "\n".join([d[1] for d in detections])
+    confidences = [float(d[2]) for d in detections if len(d) > 2]
+    confidence = (sum(confidences) / len(confidences)) if confidences else 0.0
+    return text, confidence
+
+def _is_blank_page(samples: bytes) -> bool:
+    """A rendered grayscale page with (almost) no pixel variance has nothing to recognize."""
+    import numpy as np
+    arr = np.frombuffer(samples, dtype=np.uint8)[::7]  # subsample; a blank page is uniform everywhere
+    if arr.size == 0:
+        return True
+    return float(arr.var()) < float(_get_ocr_setting("blank_page_variance", 20.0))
+
+# --- OCR worker pool ---
+# Recognition is CPU-bound and EasyOCR readers are not safe to share across threads, so scanned
+# pages are recognized in worker processes that each own a reader. The calling thread rasterizes
+# pages ahead of the workers; a global in-flight limit bounds how many rendered page images
+# exist at once (across all documents being processed).
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+_ocr_pool_broken = False
+_ocr_inflight: Optional[threading.BoundedSemaphore] = None
+# PyMuPDF is not thread-safe; serialize rasterization across processing threads.
+_fitz_lock = threading.Lock()
+# Set inside OCR worker processes only.
+_OCR_WORKER_READER = None
+
+def _get_ocr_worker_count() -> int:
+    configured = int(_get_ocr_setting("workers", 0))
+    if configured > 0:
+        return configured
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+def _ocr_worker_init(torch_threads: int):
+    """ProcessPoolExecutor initializer: load OCR libs and build this worker's own reader."""
+    global _OCR_WORKER_READER
     try:
-        reader = PdfReader(filepath)
-        total_text_length = 0
-
-        # Check first few pages to determine document type
-        pages_to_check = min(3, len(reader.pages))
-        if pages_to_check == 0:
-            return True  # No pages, assume scanned
-
-        text_samples = []
-        for i in range(pages_to_check):
-            page = reader.pages[i]
-            page_text = page.extract_text()
-            if page_text:
-                text_samples.append(page_text.strip())
-                total_text_length += len(page_text.strip())
-
-        combined_text = " ".join(text_samples).strip()
-
-        # Heuristics for scanned PDF detection:
-        # 1. Very little text (< 100 chars per page on average)
-        avg_text_per_page = total_text_length / pages_to_check if pages_to_check > 0 else 0
-
-        # 2. Text is mostly metadata (DocuSign, envelope IDs, signatures only)
-        is_mostly_metadata = (
-            len(combined_text) < 500 or
-            (len(combined_text) < 1000 and ('DocuSign' in combined_text or 'Envelope ID' in combined_text))
-        )
+        import torch  # type: ignore
+        # Avoid oversubscription: N workers x all-cores torch threads thrashes the CPU.
+        torch.set_num_threads(torch_threads)
+    except Exception:
+        pass
+    if ensure_ocr_loaded():
+        _OCR_WORKER_READER = _new_easyocr_reader()
 
-        # If average text per page is very low (< 100 chars) or mostly metadata, it's scanned
-        is_scanned = avg_text_per_page < 100 or is_mostly_metadata
+def _ocr_worker_readtext(samples: bytes, height: int, width: int, channels: int) -> Tuple[str, float]:
+    if _OCR_WORKER_READER is None:
+        raise RuntimeError(f"OCR worker has no reader ({_OCR_IMPORT_ERROR or 'initialization failed'})")
+    return _readtext(_OCR_WORKER_READER, samples, height, width, channels)
 
-        logger.info(f"PDF type detection for {filepath}: avg_text_per_page={avg_text_per_page:.0f}, is_mostly_metadata={is_mostly_metadata}, detected_as_scanned={is_scanned}")
+def _get_ocr_pool():
+    """
+    Return the shared OCR process pool, or None when OCR should run in-process
+    (ocr.workers == 1, single-core machines, or after the pool broke).
+    """
+    global _ocr_pool, _ocr_inflight
+    if _ocr_pool_broken:
+        return None
+    workers = _get_ocr_worker_count()
+    if workers <= 1:
+        return None
+    if _ocr_pool is None:
+        with _ocr_pool_lock:
+            if _ocr_pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                torch_threads = max(1, (os.cpu_count() or 1) // workers)
+                # spawn: forking a process that already runs Uvicorn + worker threads is unsafe.
+                _ocr_pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_ocr_worker_init,
+                    initargs=(torch_threads,),
+                )
+                max_inflight = int(_get_ocr_setting("max_inflight_pages", 0)) or workers * 2
+                _ocr_inflight = threading.BoundedSemaphore(max(1, max_inflight))
+                logger.info(f"OCR worker pool started: {workers} processes, {torch_threads} torch threads each, max {max_inflight} pages in flight")
+    return _ocr_pool
+
+def _mark_ocr_pool_broken(e: Exception):
+    global _ocr_pool, _ocr_pool_broken
+    logger.error(f"OCR worker pool failed, falling back to in-process OCR: {e}")
+    with _ocr_pool_lock:
+        _ocr_pool_broken = True
+        pool, _ocr_pool = _ocr_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _ocr_worker_ping() -> bool:
+    """No-op task used to make pool workers start up and build their readers ahead of time."""
+    return _OCR_WORKER_READER is not None
+
+# --- OCR warm-up ---
+# Importing easyocr/PyMuPDF and constructing readers can take tens of seconds; doing it in the
+# background after startup keeps the first scanned upload from stalling on it.
+ocr_warmup_state: str = "not_started"  # not_started|skipped|warming|ready|unavailable|error
+ocr_warmup_error: Optional[str] = None
+
+def _should_warm_up_ocr() -> bool:
+    """
+    ocr.warmup: "always" warms on every start, "never" disables it, and "auto" (default) warms only
+    when the library already contains documents that needed OCR.
+    """
+    mode = str(_get_ocr_setting("warmup", "auto")).strip().lower()
+    if mode in ("always", "true", "yes", "on"):
+        return True
+    if mode != "auto":
+        return False
+    md = load_metadata()
+    return any(isinstance(d, dict) and d.get("ocr_pages") for d in (md.values() if isinstance(md, dict) else []))
+
+def warm_up_ocr():
+    """Load OCR libraries and build the reader(s) - in the worker pool if one is used, else in-process."""
+    global ocr_warmup_state, ocr_warmup_error
+    ocr_warmup_state = "warming"
+    ocr_warmup_error = None
+    try:
+        if not ensure_ocr_loaded():
+            ocr_warmup_state = "unavailable"
+            ocr_warmup_error = _OCR_IMPORT_ERROR
+            return
+        pool = _get_ocr_pool()
+        if pool is None:
+            _get_ocr_reader()
+        else:
+            pings = [pool.submit(_ocr_worker_ping) for _ in range(_get_ocr_worker_count())]
+            if not all(f.result() for f in pings):
+                raise RuntimeError(f"OCR worker could not build its reader ({_OCR_IMPORT_ERROR or 'see worker logs'})")
+        ocr_warmup_state = "ready"
+        logger.info("OCR warm-up complete")
+    except Exception as e:
+        ocr_warmup_state = "error"
+        ocr_warmup_error = str(e)
+        logger.error(f"OCR warm-up failed: {e}")
 
-        return is_scanned
+def _render_pdf_pages(filepath: str, page_indices: List[int], dpi: int = 300,
+                      before_render=None, on_render_error=None):
+    """
+    Rasterize the given (0-based) pages to grayscale, yielding (page_index, (samples, height, width, channels)).
+    Grayscale is all EasyOCR needs and keeps each page image a third of the RGB size.
+    `before_render` is called before each page is rendered (used to wait for an in-flight slot).
+    """
+    pdf_doc = fitz.open(filepath)
+    try:
+        total_pages = len(pdf_doc)
+        mat = fitz.Matrix(dpi/72, dpi/72)
+        for page_num in page_indices:
+            if page_num >= total_pages:
+                continue
+            if before_render is not None:
+                before_render()
+            try:
+                with _fitz_lock:
+                    pix = pdf_doc[page_num].get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+                    image = (pix.samples, pix.height, pix.width, pix.n)
+                pix = None
+            except Exception as e:
+                if on_render_error is not None:
+                    on_render_error()
+                logger.error(f"Error rendering page {page_num+1}/{total_pages} of {filepath}: {e}")
+                continue
+            yield page_num, image
+    finally:
+        pdf_doc.close()
 
+def _ocr_page_result(page_num: int, dpi: int, text: str = "", confidence: float = 0.0, blank: bool = False) -> Dict[str, Any]:
+    if blank:
+        logger.info(f"Page {page_num+1} is blank at {dpi} DPI; skipping OCR")
+    elif text.strip():
+        logger.info(f"Page {page_num+1} OCR extracted {len(text)} characters at {dpi} DPI (confidence={confidence:.2f})")
+    else:
+        logger.warning(f"Page {page_num+1} OCR returned no text at {dpi} DPI")
+    return {"text": text, "confidence": round(confidence, 4), "dpi": dpi, "blank": blank}
+
+def _ocr_pass_inprocess(filepath: str, page_indices: List[int], dpi: int) -> Dict[int, Dict[str, Any]]:
+    reader = _get_ocr_reader()
+    results: Dict[int, Dict[str, Any]] = {}
+    for page_num, image in _render_pdf_pages(filepath, page_indices, dpi=dpi):
+        if _is_blank_page(image[0]):
+            results[page_num] = _ocr_page_result(page_num, dpi, blank=True)
+            continue
+        logger.info(f"Processing page {page_num+1} with EasyOCR (in-process, {dpi} DPI)")
+        try:
+            text, confidence = _readtext(reader, *image)
+            results[page_num] = _ocr_page_result(page_num, dpi, text, confidence)
+        except Exception as e:
+            logger.error(f"Error processing page {page_num+1} with OCR: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            # Continue processing remaining pages even if one fails
+        image = None
+    return results
+
+def _recognize_pages(filepath: str, page_indices: List[int], dpi: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Render and recognize the given pages at a fixed DPI, through the worker pool when available.
+    Blank pages are detected on the rendered image and never sent for recognition.
+    """
+    pool = _get_ocr_pool()
+    if pool is None:
+        return _ocr_pass_inprocess(filepath, page_indices, dpi)
+
+    from concurrent.futures.process import BrokenProcessPool
+    inflight = _ocr_inflight
+    assert inflight is not None
+
+    def _release(_future):
+        inflight.release()
+
+    results: Dict[int, Dict[str, Any]] = {}
+    futures = []
+    retry_inprocess: List[int] = []
+    for page_num, image in _render_pdf_pages(filepath, page_indices, dpi=dpi,
+                                             before_render=inflight.acquire,
+                                             on_render_error=inflight.release):
+        if _is_blank_page(image[0]):
+            inflight.release()
+            results[page_num] = _ocr_page_result(page_num, dpi, blank=True)
+            continue
+        try:
+            future = pool.submit(_ocr_worker_readtext, *image)
+        except Exception as e:
+            inflight.release()
+            _mark_ocr_pool_broken(e)
+            # Pool went away mid-document: finish this and the remaining pages in-process.
+            retry_inprocess = page_indices[page_indices.index(page_num):]
+            break
+        future.add_done_callback(_release)
+        futures.append((page_num, future))
+        image = None
+
+    for page_num, future in futures:
+        try:
+            text, confidence = future.result()
+            results[page_num] = _ocr_page_result(page_num, dpi, text, confidence)
+        except BrokenProcessPool as e:
+            _mark_ocr_pool_broken(e)
+            retry_inprocess.append(page_num)
+        except Exception as e:
+            logger.error(f"Error processing page {page_num+1} with OCR worker: {e}")
+
+    if retry_inprocess:
+        results.update(_ocr_pass_inprocess(filepath, sorted(set(retry_inprocess)), dpi))
+    return results
+
+# --- OCR result cache ---
+# Reprocessing a scanned PDF (/reprocess, /rag/rebuild-missing) would otherwise re-run EasyOCR on
+# every page. Results are cached on disk keyed by (PDF content hash, page, DPI, OCR engine version),
+# so an unchanged file never hits recognition again. diskcache is safe across threads and processes.
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+def _file_sha256(filepath: str) -> Optional[str]:
+    try:
+        h = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        return h.hexdigest()
     except Exception as e:
-        logger.error(f"Error detecting PDF type for {filepath}: {e}")
-        # If detection fails, assume it might be scanned
-        return True
+        logger.warning(f"Could not hash {filepath}: {e}")
+        return None
+
+def _get_ocr_cache():
+    global _ocr_cache
+    if not _get_ocr_setting("cache_enabled", True):
+        return None
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                try:
+                    size_limit = int(_get_ocr_setting("cache_size_mb", 512)) * 1024 * 1024
+                    _ocr_cache = diskcache.Cache(OCR_CACHE_DIR, size_limit=size_limit, eviction_policy="least-recently-used")
+                except Exception as e:
+                    logger.warning(f"OCR cache unavailable at {OCR_CACHE_DIR}: {e}")
+                    return None
+    return _ocr_cache
+
+def _ocr_engine_version() -> str:
+    """Identifies everything that changes OCR output besides the page itself; bump OCR_CACHE_VERSION on pipeline changes."""
+    engine = getattr(globals().get("easyocr"), "__version__", "unknown")
+    return f"v{OCR_CACHE_VERSION}-easyocr-{engine}-en-gray"
+
+def _ocr_cache_key(file_hash: str, page_num: int, dpi: int) -> str:
+    return f"ocr:{file_hash}:{page_num}:{dpi}:{_ocr_engine_version()}"
+
+def _ocr_pass(filepath: str, page_indices: List[int], dpi: int, file_hash: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    One OCR pass over the given pages at a fixed DPI.
+    Pages already recognized for this exact file content/DPI/engine are served from the OCR cache.
+    """
+    cache = _get_ocr_cache() if file_hash else None
+    if cache is None or not file_hash:
+        return _recognize_pages(filepath, page_indices, dpi)
 
-def extract_text_from_pdf(filepath):
+    results: Dict[int, Dict[str, Any]] = {}
+    for page_num in page_indices:
+        try:
+            hit = cache.get(_ocr_cache_key(file_hash, page_num, dpi))
+        except Exception:
+            hit = None
+        if isinstance(hit, dict):
+            results[page_num] = hit
+    todo = [i for i in page_indices if i not in results]
+    if results:
+        logger.info(f"OCR cache: {len(results)}/{len(page_indices)} pages of {filepath} at {dpi} DPI served from cache")
+    if not todo:
+        return results
+
+    fresh = _recognize_pages(filepath, todo, dpi)
+    for page_num, res in fresh.items():
+        try:
+            cache.set(_ocr_cache_key(file_hash, page_num, dpi), res)
+        except Exception as e:
+            logger.warning(f"Could not store OCR result for page {page_num+1} in cache: {e}")
+    results.update(fresh)
+    return results
+
+def _ocr_pdf_pages(filepath: str, page_indices: List[int], file_hash: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    OCR the given (0-based) pages of a PDF.
+    Returns {page_index: {"text", "confidence", "dpi", "blank"}}; pages that fail are logged and omitted.
+
+    With ocr.adaptive_dpi, pages are first recognized at ocr.low_dpi and only pages whose mean
+    detection confidence is below ocr.min_confidence are re-rendered at ocr.high_dpi.
+    """
+    high_dpi = int(_get_ocr_setting("high_dpi", 300))
+    if file_hash is None and _get_ocr_setting("cache_enabled", True):
+        file_hash = _file_sha256(filepath)
+    if not _get_ocr_setting("adaptive_dpi", True):
+        return _ocr_pass(filepath, page_indices, high_dpi, file_hash=file_hash)
+
+    low_dpi = int(_get_ocr_setting("low_dpi", 150))
+    min_confidence = float(_get_ocr_setting("min_confidence", 0.6))
+    results = _ocr_pass(filepath, page_indices, low_dpi, file_hash=file_hash)
+    retry = [
+        i for i in page_indices
+        if i not in results or (not results[i]["blank"] and results[i]["confidence"] < min_confidence)
+    ]
+    if retry and low_dpi < high_dpi:
+        logger.info(f"Re-running OCR at {high_dpi} DPI for {len(retry)}/{len(page_indices)} low-confidence pages of {filepath}")
+        for page_num, hi in _ocr_pass(filepath, retry, high_dpi, file_hash=file_hash).items():
+            lo = results.get(page_num)
+            # Keep the low-DPI result if the high-DPI pass somehow did worse.
+            if lo is None or lo["blank"] or hi["confidence"] >= lo["confidence"] or not lo["text"].strip():
+                results[page_num] = hi
+    return results
+
+def extract_pdf_pages(filepath, file_hash: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Extract text from PDF, handling both native PDFs and scanned PDFs.
-    Detects document type first, then uses appropriate extraction method.
+    Extract text page by page, routing each page to the cheapest method that works.
+    Pages with a native text layer keep it; only image-only pages are sent to OCR.
+    Returns a list of {"page": 1-based number, "text": str, "source": "native"|"ocr"}; pages that went
+    through OCR also carry "ocr": {"dpi", "confidence", "blank"} for tuning the adaptive-DPI settings.
     """
-    # Detect if PDF is scanned or text-based
-    requires_ocr = is_scanned_pdf(filepath)
+    min_chars = int(_get_ocr_setting("page_text_min_chars", 100))
 
-    if requires_ocr:
-        # Scanned PDF - use OCR (lazy import to avoid slowing app startup)
-        if ensure_ocr_loaded():
+    native_texts: Optional[List[str]] = None
+    try:
+        reader = PdfReader(filepath)
+        native_texts = []
+        for i, page in enumerate(reader.pages):
             try:
-                logger.info(f"Detected scanned PDF - using OCR for {filepath}")
-
-                # Initialize EasyOCR reader on first use
-                global OCR_READER
-                if OCR_READER is None:
-                    # Set model directory to tools/easyocr_models if it exists
-                    model_dir = os.path.join(BASE_DIR, "tools", "easyocr_models")
-                    if os.path.exists(model_dir):
-                        logger.info(f"Using EasyOCR models from {model_dir}")
-                        OCR_READER = easyocr.Reader(['en'], model_storage_directory=model_dir)
-                    else:
-                        logger.info("Using default EasyOCR model location")
-                        OCR_READER = easyocr.Reader(['en'])
+                native_texts.append(page.extract_text() or "")
+            except Exception as e:
+                logger.warning(f"Native text extraction failed on page {i+1} of {filepath}: {e}")
+                native_texts.append("")
+    except Exception as e:
+        # pypdf could not parse the file; let PyMuPDF/OCR try every page.
+        logger.error(f"Error reading PDF text layer for {filepath}: {e}")
 
-                # Convert all PDF pages to images for OCR using PyMuPDF
-                ocr_text = ""
-                pdf_doc = fitz.open(filepath)
-                total_pages = len(pdf_doc)
-                logger.info(f"Opened PDF with {total_pages} pages for OCR processing")
+    if native_texts is None:
+        if not ensure_ocr_loaded():
+            logger.error(f"PDF unreadable and OCR not available for {filepath}")
+            return []
+        try:
+            with fitz.open(filepath) as pdf_doc:
+                native_texts = [""] * len(pdf_doc)
+        except Exception as e:
+            logger.error(f"PyMuPDF could not open {filepath}: {e}")
+            return []
 
-                pages_processed = 0
-                pages_failed = 0
-                total_chars_extracted = 0
+    pages: List[Dict[str, Any]] = [
+        {"page": i + 1, "text": t, "source": "native"} for i, t in enumerate(native_texts)
+    ]
+    ocr_indices = [i for i, t in enumerate(native_texts) if _page_needs_ocr(t, min_chars)]
+    logger.info(
+        f"Page routing for {filepath}: {len(pages)} pages, {len(pages) - len(ocr_indices)} native, "
+        f"{len(ocr_indices)} need OCR (min_chars={min_chars})"
+    )
+    if not ocr_indices:
+        return pages
 
-                for page_num in range(total_pages):
-                    logger.info(f"Processing page {page_num+1}/{total_pages} with EasyOCR")
-                    try:
-                        page = pdf_doc[page_num]
-                        # Render page to image at 300 DPI for better accuracy
-                        mat = fitz.Matrix(300/72, 300/72)  # 300 DPI
-                        pix = page.get_pixmap(matrix=mat)
-
-                        # Convert to numpy array for EasyOCR
-                        import numpy as np
-                        img_array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
-                        # Convert RGBA to RGB if needed
-                        if pix.n == 4:
-                            img_array = img_array[:, :, :3]
-
-                        # Perform OCR on the page
-                        result = OCR_READER.readtext(img_array)
-                        page_text = "\n".join([detection[1] for detection in result if len(detection) > 1])
-
-                        # Accumulate text with page separator
-                        if page_text.strip():
-                            ocr_text += f"\n--- Page {page_num+1} ---\n{page_text}\n"
-                            total_chars_extracted += len(page_text)
-                            logger.info(f"Page {page_num+1}/{total_pages} OCR extracted {len(page_text)} characters")
-                        else:
-                            logger.warning(f"Page {page_num+1}/{total_pages} OCR returned no text")
-
-                        pages_processed += 1
-
-                        # Clean up pixmap to free memory
-                        pix = None
-
-                    except Exception as e:
-                        pages_failed += 1
-                        logger.error(f"Error processing page {page_num+1}/{total_pages} with OCR: {e}")
-                        import traceback
-                        logger.error(traceback.format_exc())
-                        # Continue processing remaining pages even if one fails
-                        continue
+    # Pages routed to OCR stay flagged until recognition returns a result, so an extraction made while
+    # OCR was unavailable or failing is never persisted as the document's final text.
+    for i in ocr_indices:
+        pages[i]["ocr_missing"] = True
 
-                pdf_doc.close()
+    if not ensure_ocr_loaded():
+        logger.error(f"{len(ocr_indices)} image-only pages detected but OCR not available for {filepath}")
+        return pages
 
-                ocr_text_stripped = ocr_text.strip()
-                logger.info(f"OCR processing complete: {pages_processed}/{total_pages} pages processed, {pages_failed} failed, {len(ocr_text_stripped)} total characters extracted")
+    try:
+        ocr_results = _ocr_pdf_pages(filepath, ocr_indices, file_hash=file_hash)
+    except Exception as e:
+        logger.error(f"OCR failed for {filepath}: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return pages
 
-                # Return text even if minimal - let the indexing decide if it's useful
-                # Previously we returned empty string if < 50 chars, which prevented indexing
-                if ocr_text_stripped:
-                    logger.info(f"OCR extracted {len(ocr_text_stripped)} characters from scanned PDF {filepath}")
-                    return ocr_text_stripped
+    for i in ocr_indices:
+        res = ocr_results.get(i)
+        if res is None:
+            continue
+        pages[i].pop("ocr_missing", None)
+        pages[i]["ocr"] = {"dpi": res["dpi"], "confidence": res["confidence"], "blank": res["blank"]}
+        ocr_text = (res["text"] or "").strip()
+        # OCR sees the whole rendered page (including any stray text layer); keep native text only if OCR found nothing.
+        if ocr_text:
+            pages[i]["text"] = ocr_text
+            pages[i]["source"] = "ocr"
+    return pages
+
+# --- DOCX extraction ---
+# DOCX is a zip of WordprocessingML parts. We stream the XML with iterparse instead of building a full
+# document model, which keeps large contracts cheap and avoids an extra dependency.
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def _docx_paragraph_text(p_elem) -> str:
+    parts: List[str] = []
+    for node in p_elem.iter():
+        if node.tag == _W_NS + "t":
+            parts.append(node.text or "")
+        elif node.tag == _W_NS + "tab":
+            parts.append("\t")
+        elif node.tag in (_W_NS + "br", _W_NS + "cr"):
+            parts.append("\n")
+    return "".join(parts).strip()
+
+def _iter_docx_part_lines(zf, part_name: str):
+    """
+    Stream the text lines of one WordprocessingML part (body, header or footer).
+    Paragraphs are yielded one per line; table rows are yielded as "cell | cell | ...".
+    """
+    import xml.etree.ElementTree as ET
+    row_stack: List[List[str]] = []   # cells of the open table row(s)
+    cell_stack: List[List[str]] = []  # paragraphs of the open table cell(s)
+    with zf.open(part_name) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == _W_NS + "tr":
+                    row_stack.append([])
+                elif tag == _W_NS + "tc":
+                    cell_stack.append([])
+                continue
+            if tag == _W_NS + "p":
+                text = _docx_paragraph_text(elem)
+                elem.clear()
+                if cell_stack:
+                    if text:
+                        cell_stack[-1].append(text)
+                elif text:
+                    yield text
+            elif tag == _W_NS + "tc":
+                cell = " ".join(cell_stack.pop()) if cell_stack else ""
+                if row_stack:
+                    row_stack[-1].append(cell)
+                elem.clear()
+            elif tag == _W_NS + "tr":
+                cells = row_stack.pop() if row_stack else []
+                row = " | ".join(c for c in cells if c)
+                elem.clear()
+                if not row:
+                    continue
+                if cell_stack:
+                    # Nested table: fold the row into the enclosing cell.
+                    cell_stack[-1].append(row)
                 else:
-                    logger.warning(f"OCR returned no text for {filepath} after processing {total_pages} pages")
-                    return ""
-            except Exception as e:
-                logger.error(f"OCR failed for {filepath}: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-                return ""
+                    yield row
+
+def extract_docx_pages(filepath) -> List[Dict[str, Any]]:
+    """
+    Extract text from a DOCX: header text (deduplicated across header parts), then the body, then footers.
+    Returns a single "page" in the same shape as extract_pdf_pages (DOCX has no fixed pagination).
+    """
+    import zipfile
+    try:
+        with zipfile.ZipFile(filepath) as zf:
+            names = zf.namelist()
+            headers = sorted(n for n in names if re.match(r"word/header\d*\.xml$", n))
+            footers = sorted(n for n in names if re.match(r"word/footer\d*\.xml$", n))
+            lines: List[str] = []
+            seen_furniture = set()
+            for part in headers:
+                for line in _iter_docx_part_lines(zf, part):
+                    if line not in seen_furniture:
+                        seen_furniture.add(line)
+                        lines.append(line)
+            if "word/document.xml" in names:
+                lines.extend(_iter_docx_part_lines(zf, "word/document.xml"))
+            for part in footers:
+                for line in _iter_docx_part_lines(zf, part):
+                    if line not in seen_furniture:
+                        seen_furniture.add(line)
+                        lines.append(line)
+    except Exception as e:
+        logger.error(f"Error extracting text from DOCX {filepath}: {e}")
+        return []
+    text = "\n".join(lines)
+    logger.info(f"DOCX extraction got {len(text)} characters from {filepath}")
+    return [{"page": 1, "text": text, "source": "native"}]
+
+def extract_document_pages(filepath, file_hash: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Dispatch extraction by file type."""
+    if str(filepath).lower().endswith(".docx"):
+        return extract_docx_pages(filepath)
+    return extract_pdf_pages(filepath, file_hash=file_hash)
+
+def _pages_to_text(pages: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Join extracted pages into document text.
+    Native pages are concatenated as-is; OCR'd pages are wrapped in "--- Page N ---" separators.
+    Returns (text, page_offsets) where each offset entry records the page's [start, end) span in text.
+    """
+    text = ""
+    offsets: List[Dict[str, Any]] = []
+    for p in pages:
+        entry: Dict[str, Any] = {"page": p["page"], "source": p["source"]}
+        if p.get("ocr"):
+            entry["ocr"] = p["ocr"]
+        if p.get("ocr_missing"):
+            entry["ocr_missing"] = True
+        if p["source"] == "ocr":
+            text += f"\n--- Page {p['page']} ---\n"
+            entry["start"] = len(text)
+            text += p["text"] + "\n"
         else:
-            logger.error(f"Scanned PDF detected but OCR not available for {filepath}")
-            return ""
-    else:
-        # Text-based PDF - use regular extraction
-        logger.info(f"Detected text-based PDF - using regular extraction for {filepath}")
-        text = ""
+            entry["start"] = len(text)
+            if p["text"]:
+                text += p["text"] + "\n"
+        entry["end"] = entry["start"] + len(p["text"] or "")
+        offsets.append(entry)
+    ocr_count = sum(1 for p in pages if p["source"] == "ocr")
+    logger.info(f"Extracted {len(text.strip())} characters ({len(pages)} pages, {ocr_count} via OCR)")
+    return text, offsets
+
+def _ocr_page_stats(pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-page OCR diagnostics (chosen DPI, mean confidence, blank) stored in document metadata."""
+    return [{"page": p["page"], **p["ocr"]} for p in pages if p.get("ocr")]
+
+def extract_text_from_pdf(filepath):
+    """
+    Extract text from PDF, handling native, scanned, and mixed PDFs.
+    """
+    text, _ = _pages_to_text(extract_pdf_pages(filepath))
+    return text
+
+# --- Extracted-text cache ---
+# Extraction (and especially OCR) is the slowest ingestion step, yet reprocessing is often triggered
+# only to change doc_type or re-ask competency questions. The extracted text and per-page offsets are
+# persisted next to the document (documents/.extracted/<filename>.json) and reused while the file
+# content hash and extractor version still match.
+# Bump when extraction output changes for the same input file.
+EXTRACTOR_VERSION = 3
+
+def _extracted_text_path(filename: str) -> str:
+    return os.path.join(EXTRACTED_TEXT_DIR, f"{os.path.basename(filename)}.json")
+
+def _extractor_key() -> str:
+    return f"{EXTRACTOR_VERSION}:min_chars={int(_get_ocr_setting('page_text_min_chars', 100))}"
+
+def load_extracted_text(filename: str, file_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Return the cached extraction for filename if it was made from this exact content by this extractor."""
+    if not file_hash:
+        return None
+    path = _extracted_text_path(filename)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable extracted-text cache for {filename}: {e}")
+        return None
+    if data.get("file_sha256") != file_hash or data.get("extractor") != _extractor_key():
+        return None
+    return data
+
+def save_extracted_text(filename: str, file_hash: Optional[str], text: str, pages: List[Dict[str, Any]]):
+    if not file_hash:
+        return
+    # Empty page lists mean extraction failed outright; missing OCR pages would be filled in by a later
+    # run once OCR works again, so neither is cached.
+    missing = [p["page"] for p in pages if p.get("ocr_missing")]
+    if not pages or missing:
+        logger.info(f"Not caching extracted text for {filename}: incomplete extraction (pages without OCR: {missing})")
+        return
+    record = {
+        "filename": filename,
+        "file_sha256": file_hash,
+        "extractor": _extractor_key(),
+        "extracted_at": datetime.datetime.now().isoformat(),
+        "text": text,
+        "pages": pages,
+    }
+    path = _extracted_text_path(filename)
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(EXTRACTED_TEXT_DIR, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not save extracted-text cache for {filename}: {e}")
+
+def delete_extracted_text(filename: str):
+    try:
+        path = _extracted_text_path(filename)
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception as e:
+        logger.warning(f"Could not remove extracted-text cache for {filename}: {e}")
+
+# --- Embedding batching ---
+# Chroma would embed each document's chunks in its own request during upsert, so a bulk upload of
+# many small NDAs turns into many small embedding calls. Instead the embed stage computes vectors
+# through a shared batcher that merges chunks from concurrent ingestion jobs into one request (up to
+# the API's per-request input/token limits) and hands each job its own slice back. A batch is sent
+# as soon as it is full or when the oldest waiting chunk has waited embed_batch_wait_ms, so a single
+# upload only pays that short deadline.
+
+class EmbeddingBatcher:
+    """Coalesces embed(texts) calls from many threads into batched calls to embed_fn."""
+
+    def __init__(self, embed_fn, max_inputs: int = 2048, max_tokens: int = 150000, max_wait: float = 0.05):
+        self.embed_fn = embed_fn  # callable(List[str]) -> List[vector]
+        self._cond = threading.Condition()
+        self.configure(max_inputs, max_tokens, max_wait)
+        self._pending: List[Dict[str, Any]] = []  # {"texts", "tokens", "future", "queued_at"}
+        self._thread: Optional[threading.Thread] = None
+        self.batches_sent = 0
+        self.inputs_sent = 0
+
+    def configure(self, max_inputs: int, max_tokens: int, max_wait: float):
+        """Apply new limits; chunks already waiting are flushed against them."""
+        with self._cond:
+            self.max_inputs = max(1, int(max_inputs))
+            self.max_tokens = max(1, int(max_tokens))
+            self.max_wait = max(0.0, float(max_wait))
+            self._cond.notify()
+
+    def _split(self, texts: List[str]) -> List[Tuple[List[str], int]]:
+        """Cut one caller's texts into pieces that each fit in a single request."""
+        pieces, current, current_tokens = [], [], 0
+        for t in texts:
+            tokens = _estimate_tokens(t)
+            if current and (len(current) >= self.max_inputs or current_tokens + tokens > self.max_tokens):
+                pieces.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(t)
+            current_tokens += tokens
+        if current:
+            pieces.append((current, current_tokens))
+        return pieces
+
+    def embed(self, texts: List[str]) -> List[Any]:
+        if not texts:
+            return []
+        futures = []
+        with self._cond:
+            for piece, tokens in self._split(list(texts)):
+                future: Future = Future()
+                self._pending.append({"texts": piece, "tokens": tokens, "future": future, "queued_at": time.monotonic()})
+                futures.append(future)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding_batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        vectors: List[Any] = []
+        for future in futures:
+            vectors.extend(future.result())
+        return vectors
+
+    def _take_batch_locked(self) -> List[Dict[str, Any]]:
+        batch, inputs, tokens = [], 0, 0
+        while self._pending:
+            item = self._pending[0]
+            if batch and (inputs + len(item["texts"]) > self.max_inputs or tokens + item["tokens"] > self.max_tokens):
+                break
+            batch.append(self._pending.pop(0))
+            inputs += len(item["texts"])
+            tokens += item["tokens"]
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Wait for more work until the batch is full or the oldest item's deadline passes.
+                while True:
+                    inputs = sum(len(p["texts"]) for p in self._pending)
+                    tokens = sum(p["tokens"] for p in self._pending)
+                    remaining = self._pending[0]["queued_at"] + self.max_wait - time.monotonic()
+                    if inputs >= self.max_inputs or tokens >= self.max_tokens or remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                batch = self._take_batch_locked()
+            # Send on a separate thread so the next batch can fill while this request is in flight.
+            threading.Thread(target=self._send, args=(batch,), name="embedding_batch", daemon=True).start()
+
+    def _send(self, batch: List[Dict[str, Any]]):
+        flat = [t for item in batch for t in item["texts"]]
         try:
-            reader = PdfReader(filepath)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            logger.info(f"Regular extraction got {len(text.strip())} characters from text PDF {filepath}")
-            return text
+            vectors = list(self.embed_fn(flat))
+            if len(vectors) != len(flat):
+                raise RuntimeError(f"Embedding provider returned {len(vectors)} vectors for {len(flat)} inputs")
         except Exception as e:
-            logger.error(f"Error extracting text from {filepath}: {e}")
-            return ""
+            for item in batch:
+                item["future"].set_exception(e)
+            return
+        with self._cond:
+            self.batches_sent += 1
+            self.inputs_sent += len(flat)
+        offset = 0
+        for item in batch:
+            n = len(item["texts"])
+            item["future"].set_result(vectors[offset:offset + n])
+            offset += n
+
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+_embedding_batcher_lock = threading.Lock()
+
+def _embed_with_current_function(texts: List[str]) -> List[Any]:
+    # Resolve embedding_fn per call: it is replaced when the config or API key changes.
+    fn = embedding_fn
+    if fn is None:
+        raise RuntimeError("No embedding function is configured")
+    return fn(texts)
+
+def _get_embedding_batcher() -> EmbeddingBatcher:
+    """The shared batcher, with limits re-read from config.yaml so edits apply without a restart."""
+    global _embedding_batcher
+    # A batch must fit the background share of the token budget, or it would eat into the
+    # interactive reserve (see OpenAIRateLimiter).
+    max_tokens = _get_config_setting("processing", "embed_batch_tokens", 150000)
+    budget = openai_limiter.background_token_budget()
+    limits = {
+        "max_inputs": _get_config_setting("processing", "embed_batch_size", 2048),
+        "max_tokens": min(max_tokens, budget) if budget else max_tokens,
+        "max_wait": _get_config_setting("processing", "embed_batch_wait_ms", 50) / 1000.0,
+    }
+    with _embedding_batcher_lock:
+        if _embedding_batcher is None:
+            _embedding_batcher = EmbeddingBatcher(_embed_with_current_function, **limits)
+        else:
+            _embedding_batcher.configure(**limits)
+    return _embedding_batcher
 
-def index_document(filename: str, text: str) -> bool:
+def embed_chunks(chunks: List[str]) -> Optional[List[Any]]:
+    """
+    Embed document chunks through the shared batcher.
+    Returns None when no embedding function is configured (Chroma then embeds on upsert).
+    """
+    if embedding_fn is None or not chunks:
+        return None
+    return _get_embedding_batcher().embed(chunks)
+
+def _chunk_text(text: str) -> List[str]:
+    """Split document text into overlapping chunks for indexing."""
+    # Heavy import: keep out of cold-start path.
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    # Larger chunks preserve more context for semantic search
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=2000,  # Increased from 1000 to preserve more context
+        chunk_overlap=400,  # Increased overlap to ensure important info isn't split
+        length_function=len,
+    )
+    return text_splitter.split_text(text)
+
+def index_document(filename: str, text: str, chunks: Optional[List[str]] = None) -> bool:
     """
     Index document text into ChromaDB vector store.
-    Ensures all text is properly chunked and indexed.
+    Ensures all text is properly chunked and indexed. Pass pre-split `chunks` to skip chunking.
     """
     if not text or not text.strip():
         logger.warning(f"Attempted to index empty text for {filename}")
@@ -850,16 +2315,9 @@ def index_document(filename: str, text: str) -> bool:
         return False
 
     try:
-        # Heavy import: keep out of cold-start path.
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
         # Split text into chunks
-        # Larger chunks preserve more context for semantic search
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000,  # Increased from 1000 to preserve more context
-            chunk_overlap=400,  # Increased overlap to ensure important info isn't split
-            length_function=len,
-        )
-        chunks = text_splitter.split_text(text)
+        if chunks is None:
+            chunks = _chunk_text(text)
 
         if not chunks:
             logger.warning(f"No chunks created from text for {filename}")
@@ -871,6 +2329,9 @@ def index_document(filename: str, text: str) -> bool:
         ids = [f"{filename}_chunk_{i}" for i in range(len(chunks))]
         metadatas = [{"filename": filename, "chunk_index": i} for i in range(len(chunks))]
 
+        # Embed before touching existing chunks, so a failed embedding call leaves the old index intact.
+        embeddings = embed_chunks(chunks)
+
         # Delete existing chunks for this file to avoid duplication
         try:
             # Get existing chunks to check count (collection.count() doesn't support where)
@@ -879,16 +2340,31 @@ def index_document(filename: str, text: str) -> bool:
             if existing_count > 0:
                 logger.info(f"Deleting {existing_count} existing chunks for {filename}")
                 collection.delete(where={"filename": filename})
+                _int8_index.remove_file(filename)
         except Exception as e:
             logger.warning(f"Error deleting existing chunks for {filename}: {e}")
             # Continue anyway - upsert will handle duplicates
 
-        # Upsert all chunks
-        collection.upsert(
-            documents=chunks,
-            ids=ids,
-            metadatas=metadatas
-        )
+        # Upsert all chunks (with precomputed vectors when available)
+        if embeddings is not None:
+            collection.upsert(
+                documents=chunks,
+                ids=ids,
+                metadatas=metadatas,
+                embeddings=embeddings
+            )
+        else:
+            collection.upsert(
+                documents=chunks,
+                ids=ids,
+                metadatas=metadatas
+            )
+        if _int8_index.built:
+            if embeddings is not None:
+                _int8_index.remove_file(filename)
+                _int8_index.add(ids, embeddings, filename)
+            else:
+                _int8_index.reset()
 
         # Verify indexing - use get() instead of count() with where clause
         verify_result = collection.get(where={"filename": filename}, include=[])
@@ -906,169 +2382,1137 @@ def index_document(filename: str, text: str) -> bool:
         logger.error(traceback.format_exc())
         raise
 
-def process_document_sync(filename: str, filepath: str, doc_type: str):
+def process_document_sync(filename: str, filepath: str, doc_type: str) -> bool:
     """
-    Synchronous wrapper for document processing. Used by ThreadPoolExecutor for parallel processing.
+    Process one document through the staged ingestion pipeline and wait for the result.
+    Used by the ingestion job queue workers; every stage is plain synchronous code running on the
+    pipeline's own threads, so no per-document event loop is needed.
+    Returns False when processing failed unexpectedly (the job queue retries those).
     """
-    # Run the async function in a new event loop (thread-safe)
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(_process_document_async(filename, filepath, doc_type))
-        loop.close()
+        return bool(_get_ingestion_pipeline().submit(filename, filepath, doc_type).result())
     except Exception as e:
-        logger.error(f"Error in sync wrapper for {filename}: {e}")
-        # Update status to error
+        _mark_processing_error(filename, e)
+        return False
+
+# --- Competency extraction ---
+# competency_extraction.mode selects what the LLM sees for a document:
+# - full:      the extracted text, truncated at max_document_chars (the original behaviour)
+# - retrieval: for each competency question, the chunks_per_question best chunks of this document
+#              from hybrid retrieval (scoped to the filename), merged in document order. Documents
+#              shorter than retrieval_min_chars are still sent whole, as are documents that
+#              failed to index. Long contracts are no longer cut off at 100k characters, and
+#              prompts shrink to the passages that answer the questions.
+# The chosen mode and prompt size are stored in metadata (competency_extraction) for comparison.
+
+def _get_competency_questions(doc_type: str, app_config: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    doc_config = (config if app_config is None else app_config).get("document_types", {}).get(doc_type, {})
+    # Support both old and new config field names
+    return doc_config.get("competency_questions") or doc_config.get("capture_fields", []) or []
+
+def _retrieve_competency_excerpts(filename: str, questions: List[Dict[str, Any]], per_question: int) -> List[Dict[str, Any]]:
+    """Best chunks of one document for each question, deduplicated and in document order."""
+    chunks: Dict[str, Dict[str, Any]] = {}
+    for q in questions:
+        query = q.get("question") or q.get("id") or ""
+        for r in hybrid_search_rrf(query, collection, n_results=per_question, where={"filename": filename}):
+            key = hashlib.sha1((r.get("doc") or "").encode("utf-8", errors="ignore")).hexdigest()
+            if key not in chunks:
+                chunks[key] = {"doc": r.get("doc") or "", "chunk_index": (r.get("metadata") or {}).get("chunk_index", 0), "questions": []}
+            chunks[key]["questions"].append(q.get("id"))
+    return sorted(chunks.values(), key=lambda c: c["chunk_index"])
+
+def _competency_document_text(filename: str, text: str, questions: List[Dict[str, Any]],
+                              indexed: bool, mode: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """Text to put in the competency prompt for this document, plus stats describing it."""
+    mode = (mode or str(_get_config_setting("competency_extraction", "mode", "full"))).strip().lower()
+    max_chars = _get_config_setting("competency_extraction", "max_document_chars", 100000)
+    stats: Dict[str, Any] = {"mode": "full", "document_chars": len(text)}
+
+    if mode == "retrieval":
+        min_chars = _get_config_setting("competency_extraction", "retrieval_min_chars", 12000)
+        if len(text) <= min_chars:
+            stats["fallback"] = "short_document"
+        elif not indexed or collection is None:
+            stats["fallback"] = "not_indexed"
+        else:
+            try:
+                excerpts = _retrieve_competency_excerpts(
+                    filename, questions, max(1, _get_config_setting("competency_extraction", "chunks_per_question", 3))
+                )
+                if excerpts:
+                    parts = [f"[Excerpt {i + 1}]\n{c['doc']}" for i, c in enumerate(excerpts)]
+                    document_text = "\n\n".join(parts)[:max_chars]
+                    stats.update({"mode": "retrieval", "excerpts": len(excerpts), "prompt_chars": len(document_text)})
+                    return document_text, stats
+                stats["fallback"] = "no_excerpts"
+            except Exception as e:
+                logger.warning(f"Competency retrieval failed for {filename}, sending full text: {e}")
+                stats["fallback"] = "retrieval_error"
+
+    document_text = text[:max_chars]
+    stats["prompt_chars"] = len(document_text)
+    if len(text) > max_chars:
+        stats["truncated_chars"] = len(text) - max_chars
+    return document_text, stats
+
+# --- Competency result cache ---
+# Re-uploading the same contract (NDA.pdf and NDA_1.pdf) or reprocessing an unchanged one would
+# repeat the same competency call. Answers are cached on disk keyed by (hash of the document text
+# sent to the model, hash of the question set, hash of the prompt templates, model), so a hit
+# reuses them without calling the model. Failed calls are never cached.
+_competency_cache = None
+_competency_cache_lock = threading.Lock()
+
+def _get_competency_cache():
+    global _competency_cache
+    if not _get_config_setting("competency_extraction", "cache_enabled", True):
+        return None
+    if _competency_cache is None:
+        with _competency_cache_lock:
+            if _competency_cache is None:
+                try:
+                    size_limit = int(_get_config_setting("competency_extraction", "cache_size_mb", 64)) * 1024 * 1024
+                    _competency_cache = diskcache.Cache(COMPETENCY_CACHE_DIR, size_limit=size_limit, eviction_policy="least-recently-used")
+                except Exception as e:
+                    logger.warning(f"Competency cache unavailable at {COMPETENCY_CACHE_DIR}: {e}")
+                    return None
+    return _competency_cache
+
+def _sha256_text(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8", errors="ignore")).hexdigest()
+
+def _competency_prompt_fingerprint(questions: List[Dict[str, Any]], system_prompt: str,
+                                   user_prompt_template: str, model: str) -> str:
+    questions_hash = _sha256_text(json.dumps(questions, sort_keys=True, default=str))[:16]
+    template_hash = _sha256_text(system_prompt + "\x00" + user_prompt_template)[:16]
+    return f"{questions_hash}:{template_hash}:{model}"
+
+def _competency_cache_key(document_text: str, questions: List[Dict[str, Any]], system_prompt: str,
+                          user_prompt_template: str, model: str) -> str:
+    fingerprint = _competency_prompt_fingerprint(questions, system_prompt, user_prompt_template, model)
+    return f"competency:{_sha256_text(document_text)}:{fingerprint}"
+
+def _competency_answered(stats: Dict[str, Any]) -> bool:
+    """True when extract_competencies produced answers (from the model or the cache)."""
+    return "llm_seconds" in stats or stats.get("cache") == "hit"
+
+# --- Multi-document competency batching ---
+# One- and two-page NDAs are dominated by the repeated system prompt and question list. With
+# competency_extraction.batch_max_documents > 1, short documents (batch_max_document_chars or
+# less) waiting in the competencies stage at the same time are packed into one JSON request keyed
+# by filename, grouped by doc type and question set. A document that ends up alone in its batch,
+# is missing from the response, or whose batch fails is sent in its own call as before.
+# Batches are bounded by how many documents are in the stage at once (competency_workers, which
+# the pipeline autoscaler raises under backlog). Per-document latency and the estimated prompt
+# tokens saved are recorded in competency_extraction stats and GET /jobs.
+
+class CompetencyBatcher:
+    """Packs concurrent competency extractions with the same question set into one call to send_fn."""
+
+    def __init__(self, send_fn, max_documents: int = 4, max_chars: int = 32000, max_wait: float = 0.5):
+        # send_fn(questions, [(filename, document_text)]) -> (answers by filename, prompt tokens estimate)
+        self.send_fn = send_fn
+        self._cond = threading.Condition()
+        self.configure(max_documents, max_chars, max_wait)
+        self._groups: Dict[str, List[Dict[str, Any]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.batches_sent = 0
+        self.documents_batched = 0
+        self.fallbacks = 0
+        self.prompt_tokens_saved_est = 0
+
+    def configure(self, max_documents: int, max_chars: int, max_wait: float):
+        """Apply new limits; groups already waiting are flushed against them."""
+        with self._cond:
+            self.max_documents = max(1, int(max_documents))
+            self.max_chars = max(1, int(max_chars))
+            self.max_wait = max(0.0, float(max_wait))
+            self._cond.notify()
+
+    def extract(self, group_key: str, questions: List[Dict[str, Any]], filename: str, document_text: str,
+                single_tokens_est: int) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Returns (answers, batch stats), or None when the document should be sent on its own.
+        Raises when the batch call failed or did not answer this document.
+        """
+        future: Future = Future()
+        item = {"filename": filename, "document_text": document_text, "questions": questions,
+                "single_tokens_est": single_tokens_est, "future": future, "queued_at": time.monotonic()}
+        with self._cond:
+            self._groups.setdefault(group_key, []).append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="competency_batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future.result()
+
+    def _ready_group_locked(self, now: float) -> Tuple[Optional[str], Optional[float]]:
+        """(key of a group to flush now, earliest deadline among the others)."""
+        next_deadline = None
+        for key, items in self._groups.items():
+            deadline = items[0]["queued_at"] + self.max_wait
+            chars = sum(len(i["document_text"]) for i in items)
+            if len(items) >= self.max_documents or chars >= self.max_chars or deadline <= now:
+                return key, None
+            next_deadline = deadline if next_deadline is None else min(next_deadline, deadline)
+        return None, next_deadline
+
+    def _take_batch_locked(self, key: str) -> List[Dict[str, Any]]:
+        items = self._groups[key]
+        batch, chars = [], 0
+        while items and len(batch) < self.max_documents:
+            if batch and chars + len(items[0]["document_text"]) > self.max_chars:
+                break
+            item = items.pop(0)
+            batch.append(item)
+            chars += len(item["document_text"])
+        if not items:
+            del self._groups[key]
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    key, next_deadline = self._ready_group_locked(time.monotonic())
+                    if key is not None:
+                        break
+                    self._cond.wait(timeout=None if next_deadline is None else max(0.0, next_deadline - time.monotonic()))
+                batch = self._take_batch_locked(key)
+            if len(batch) == 1:
+                batch[0]["future"].set_result(None)
+                continue
+            threading.Thread(target=self._send, args=(batch,), name="competency_batch", daemon=True).start()
+
+    def _send(self, batch: List[Dict[str, Any]]):
+        started = time.monotonic()
         try:
-            metadata = load_metadata()
-            if filename in metadata:
-                metadata[filename]["status"] = "error"
-                save_metadata(metadata)
-        except:
-            pass
+            results, batch_tokens_est = self.send_fn(batch[0]["questions"], [(i["filename"], i["document_text"]) for i in batch])
+        except Exception as e:
+            with self._cond:
+                self.fallbacks += len(batch)
+            for item in batch:
+                item["future"].set_exception(e)
+            return
+        elapsed = time.monotonic() - started
+        answered = [i for i in batch if isinstance(results.get(i["filename"]), dict)]
+        n = len(batch)
+        with self._cond:
+            self.batches_sent += 1
+            self.documents_batched += len(answered)
+            self.fallbacks += n - len(answered)
+            self.prompt_tokens_saved_est += max(0, sum(i["single_tokens_est"] for i in batch) - batch_tokens_est)
+        for item in batch:
+            answers = results.get(item["filename"])
+            if not isinstance(answers, dict):
+                item["future"].set_exception(ValueError(f"Batch response has no answers for {item['filename']}"))
+                continue
+            item["future"].set_result((answers, {
+                "batch_documents": n,
+                "llm_seconds": round(elapsed, 2),
+                "llm_seconds_per_document": round(elapsed / n, 2),
+                "batch_prompt_tokens_est": batch_tokens_est,
+                "prompt_tokens_est_share": batch_tokens_est // n,
+            }))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"batches": self.batches_sent, "documents": self.documents_batched,
+                    "fallbacks": self.fallbacks, "prompt_tokens_saved_est": self.prompt_tokens_saved_est}
+
+def _questions_list_text(questions: List[Dict[str, Any]]) -> str:
+    return "\n".join([f"- {q['id']}: {q['question']}" for q in questions])
+
+def _send_competency_batch(questions: List[Dict[str, Any]], documents: List[Tuple[str, str]]) -> Tuple[Dict[str, Any], int]:
+    prompts = prompts_config.get("prompts", {})
+    system_prompt = prompts.get("competency_extraction", {}).get("system", "You are a legal document assistant. Respond in JSON.")
+    # Defined in prompts.default.yaml; a missing template fails the batch and each document is sent alone.
+    user_prompt_template = prompts["competency_extraction_batch"]["user"]
+    documents_text = "\n\n".join(f"=== DOCUMENT: {name} ===\n{text}" for name, text in documents)
+    user_prompt = user_prompt_template.format(documents=documents_text, questions_list=_questions_list_text(questions))
+    tokens = _estimate_tokens(system_prompt, user_prompt)
+    client = openai_client
+    if client is None:
+        raise RuntimeError("OpenAI client is not configured")
+    logger.info(f"Calling OpenAI API for batched competency extraction on {len(documents)} documents (~{tokens} tokens)")
+    response = openai_request(
+        lambda: client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"}
+        ),
+        tokens=tokens,
+    )
+    results = json.loads(response.choices[0].message.content or "")
+    if not isinstance(results, dict):
+        raise ValueError("Batch response is not a JSON object")
+    return results, tokens
+
+_competency_batcher: Optional[CompetencyBatcher] = None
+_competency_batcher_lock = threading.Lock()
+
+def _get_competency_batcher() -> CompetencyBatcher:
+    """The shared batcher, with limits re-read from config.yaml so edits apply without a restart."""
+    global _competency_batcher
+    limits = {
+        "max_documents": _get_config_setting("competency_extraction", "batch_max_documents", 1),
+        "max_chars": _get_config_setting("competency_extraction", "batch_max_chars", 32000),
+        "max_wait": _get_config_setting("competency_extraction", "batch_wait_ms", 500) / 1000.0,
+    }
+    with _competency_batcher_lock:
+        if _competency_batcher is None:
+            _competency_batcher = CompetencyBatcher(_send_competency_batch, **limits)
+        else:
+            _competency_batcher.configure(**limits)
+    return _competency_batcher
 
-async def _process_document_async(filename: str, filepath: str, doc_type: str):
+def _competency_batch_eligible(document_text: str) -> bool:
+    if _get_config_setting("competency_extraction", "batch_max_documents", 1) <= 1:
+        return False
+    return len(document_text) <= _get_config_setting("competency_extraction", "batch_max_document_chars", 8000)
+
+def extract_competencies(filename: str, doc_type: str, text: str, indexed: bool = False,
+                         mode: Optional[str] = None,
+                         questions: Optional[List[Dict[str, Any]]] = None,
+                         batch: bool = True) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     """
-    Internal async function for document processing.
+    Ask the document type's competency questions (or just `questions`) about one document.
+    Returns (answers, stats); answers is {} when there are no questions, no client, or the call failed.
     """
+    if questions is None:
+        questions = _get_competency_questions(doc_type)
+    answers: Dict[str, Any] = {}
+
+    # Check if OpenAI client is initialized
+    has_openai = openai_client is not None
+    logger.info(f"Questions configured: {len(questions) if questions else 0}, OpenAI client available: {has_openai}")
+
+    if not (questions and openai_client):
+        if not questions:
+            logger.info(f"No competency questions configured for doc_type '{doc_type}'")
+        if not has_openai:
+            logger.info(f"OpenAI API key not configured, skipping metadata extraction")
+        return answers, {}
+
+    system_prompt = prompts_config.get("prompts", {}).get("competency_extraction", {}).get("system", "You are a legal document assistant. Respond in JSON.")
+    user_prompt_template = prompts_config.get("prompts", {}).get("competency_extraction", {}).get("user", "Analyze the text:\n{document_text}\n\nQuestions:\n{questions_list}")
+
+    questions_list_str = _questions_list_text(questions)
+
+    document_text, stats = _competency_document_text(filename, text, questions, indexed, mode)
+    user_prompt = user_prompt_template.format(
+        document_text=document_text,
+        questions_list=questions_list_str
+    )
+    stats["prompt_tokens_est"] = _estimate_tokens(system_prompt, user_prompt)
+
+    cache = _get_competency_cache()
+    cache_key = _competency_cache_key(document_text, questions, system_prompt, user_prompt_template, LLM_MODEL)
+    if cache is not None:
+        try:
+            hit = cache.get(cache_key)
+        except Exception:
+            hit = None
+        if isinstance(hit, dict):
+            logger.info(f"Competency cache hit for {filename}, skipping OpenAI call")
+            stats["cache"] = "hit"
+            return hit, stats
+        stats["cache"] = "miss"
+
+    if batch and _competency_batch_eligible(document_text):
+        group_key = f"{doc_type}:{_competency_prompt_fingerprint(questions, system_prompt, user_prompt_template, LLM_MODEL)}"
+        try:
+            batched = _get_competency_batcher().extract(group_key, questions, filename, document_text, stats["prompt_tokens_est"])
+        except Exception as e:
+            logger.warning(f"Batched competency extraction failed for {filename}, sending it alone: {e}")
+            if _is_rate_limit_error(e):
+                _note_rate_limited("competencies")
+            stats["batch_fallback"] = True
+            batched = None
+        if batched is not None:
+            answers, batch_stats = batched
+            stats.update(batch_stats)
+            logger.info(f"Batched competency extraction completed for {filename} ({batch_stats['batch_documents']} documents)")
+            if cache is not None:
+                try:
+                    cache.set(cache_key, answers)
+                except Exception as e:
+                    logger.warning(f"Could not store competency answers for {filename} in cache: {e}")
+            return answers, stats
+
+    try:
+        logger.info(f"Calling OpenAI API for competency extraction on {filename} ({stats['mode']} mode, ~{stats['prompt_tokens_est']} tokens)")
+        started = time.monotonic()
+        client = openai_client
+        response = openai_request(
+            lambda: client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"}
+            ),
+            tokens=stats["prompt_tokens_est"],
+        )
+        elapsed = round(time.monotonic() - started, 2)
+        usage = getattr(response, "usage", None)
+        if usage is not None and isinstance(getattr(usage, "prompt_tokens", None), int):
+            stats["prompt_tokens"] = usage.prompt_tokens
+        content = response.choices[0].message.content
+        answers = json.loads(content or "")
+        if not isinstance(answers, dict):
+            raise ValueError(f"Competency response is not a JSON object: {type(answers).__name__}")
+        # Only a parsed answer object counts as answered (see _competency_answered).
+        stats["llm_seconds"] = elapsed
+        logger.info(f"OpenAI API call completed successfully for {filename}")
+        if cache is not None:
+            try:
+                cache.set(cache_key, answers)
+            except Exception as e:
+                logger.warning(f"Could not store competency answers for {filename} in cache: {e}")
+    except Exception as e:
+        logger.error(f"LLM processing failed for {filename}: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        if _is_rate_limit_error(e):
+            _note_rate_limited("competencies")
+        answers = {}
+        # Don't fail the whole process if LLM call fails - continue with empty answers
+    return answers, stats
+
+# --- Incremental competency refresh ---
+# Each processed document records a hash of every competency question it was answered with
+# (competency_question_hashes). When config.yaml is saved, documents whose doc type gained or
+# changed questions get a "competencies" job that asks only those questions against the cached
+# extracted text, merges the new answers into the existing ones and drops answers to questions
+# that were removed - no re-extraction, re-indexing or full re-run. Documents processed before
+# hashes existed are assumed to have been answered with the previous config.
+
+def _question_hash(question: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(question, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def _question_hashes(questions: List[Dict[str, Any]]) -> Dict[str, str]:
+    return {q["id"]: _question_hash(q) for q in questions if q.get("id")}
+
+def _competency_changes(entry: Dict[str, Any], questions: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """(questions to re-ask, ids of questions no longer configured) for one metadata entry."""
+    answered = entry.get("competency_question_hashes") or {}
+    stale = [q for q in questions if q.get("id") and answered.get(q["id"]) != _question_hash(q)]
+    current_ids = {q.get("id") for q in questions}
+    removed = [qid for qid in answered if qid not in current_ids]
+    return stale, removed
+
+def refresh_competencies_sync(filename: str, filepath: str, doc_type: str) -> bool:
+    """Job handler: re-ask only the changed competency questions for one processed document."""
+    metadata = load_metadata()
+    entry = metadata.get(filename)
+    if not isinstance(entry, dict):
+        logger.warning(f"Skipping competency refresh for {filename}: not in metadata")
+        return True
+    doc_type = entry.get("doc_type", doc_type)
+    questions = _get_competency_questions(doc_type)
+    stale, removed = _competency_changes(entry, questions)
+
+    answers: Dict[str, Any] = {}
+    stats: Dict[str, Any] = {}
+    if stale:
+        file_hash = _file_sha256(filepath)
+        cached = load_extracted_text(filename, file_hash)
+        if cached is not None:
+            text = cached.get("text") or ""
+        else:
+            text, page_offsets = _pages_to_text(extract_document_pages(filepath, file_hash=file_hash))
+            save_extracted_text(filename, file_hash, text, page_offsets)
+        if text.strip():
+            logger.info(f"Refreshing {len(stale)} competency question(s) for {filename}: {[q['id'] for q in stale]}")
+            answers, stats = extract_competencies(
+                filename, doc_type, text, indexed=bool(entry.get("text_extracted")), questions=stale
+            )
+            if not _competency_answered(stats):
+                # Leave the hashes stale so the job is retried (or picked up by the next config save).
+                return False
+
+    # Reload so answers edited while the LLM call ran are not lost.
+    metadata = load_metadata()
+    entry = metadata.get(filename)
+    if not isinstance(entry, dict):
+        return True
+    current_ids = {q.get("id") for q in questions}
+    merged = {k: v for k, v in (entry.get("competency_answers") or {}).items() if k in current_ids}
+    merged.update(answers)
+    hashes = {k: v for k, v in (entry.get("competency_question_hashes") or {}).items() if k in current_ids}
+    hashes.update(_question_hashes(stale))
+    entry["competency_answers"] = merged
+    entry["competency_question_hashes"] = hashes
+    if stats:
+        entry["competency_extraction"] = dict(stats, refreshed_questions=[q["id"] for q in stale])
+    _sync_aliases(metadata, filename)
+    save_metadata(metadata)
+    logger.info(f"Competency refresh for {filename}: {len(stale)} re-asked, {len(removed)} removed")
+    return True
+
+def schedule_competency_refresh(previous_config: Dict[str, Any]) -> int:
+    """Queue a competency refresh for every processed document whose questions changed. Returns the count."""
+    metadata = load_metadata()
+    baselined = False
+    queued = 0
+    for fname, entry in metadata.items():
+        if not isinstance(entry, dict) or entry.get("status") != "processed" or entry.get("duplicate_of"):
+            continue
+        doc_type = entry.get("doc_type", "nda")
+        if "competency_question_hashes" not in entry:
+            entry["competency_question_hashes"] = _question_hashes(_get_competency_questions(doc_type, previous_config))
+            baselined = True
+        stale, removed = _competency_changes(entry, _get_competency_questions(doc_type))
+        if stale and openai_client is None:
+            stale = []  # Nothing can be re-asked yet; the hashes stay stale for a later save.
+        if stale or removed:
+            job_queue.submit(fname, os.path.join(DOCUMENTS_DIR, fname), doc_type, PRIORITY_BULK, kind="competencies")
+            queued += 1
+    if baselined:
+        save_metadata(metadata)
+    if queued:
+        logger.info(f"Queued competency refresh for {queued} document(s) after config change")
+    return queued
+
+# --- Staged ingestion pipeline ---
+# Each document flows extract -> chunk -> embed -> competencies -> finalize. Every stage has its own
+# worker threads and a bounded input queue, so OCR-heavy extraction (recognition itself runs in the
+# OCR process pool) overlaps with the network-bound embedding and LLM stages of other documents,
+# and a slow stage applies backpressure instead of piling up extracted text in memory.
+# A stage function takes the document context dict and returns False when the document is
+# finished early (e.g. no extractable text); raising marks the document as 'error'.
+
+def _stage_extract(ctx: Dict[str, Any]) -> bool:
+    filename, filepath = ctx["filename"], ctx["filepath"]
     logger.info(f"=== STARTING BACKGROUND PROCESSING FOR {filename} ===")
     logger.info(f"Filepath: {filepath}")
-    logger.info(f"Doc type: {doc_type}")
+    logger.info(f"Doc type: {ctx['doc_type']}")
+
+    file_hash = _file_sha256(filepath)
 
     # Update status to processing
     metadata = load_metadata()
     if filename in metadata:
         metadata[filename]["status"] = "processing"
+        # A document processed in its own right is no longer an alias of another upload.
+        metadata[filename].pop("duplicate_of", None)
+        if file_hash:
+            metadata[filename]["file_sha256"] = file_hash
         save_metadata(metadata)
         logger.info(f"Status set to 'processing' for {filename}")
     else:
         logger.warning(f"Filename {filename} not found in metadata when starting processing")
 
+    cached = load_extracted_text(filename, file_hash)
+    if cached is not None:
+        logger.info(f"Step 1: Source unchanged, reusing cached extracted text for {filename}")
+        text = cached.get("text") or ""
+        page_offsets = cached.get("pages") or []
+    else:
+        logger.info(f"Step 1: Extracting text from {filename}")
+        text, page_offsets = _pages_to_text(extract_document_pages(filepath, file_hash=file_hash))
+        save_extracted_text(filename, file_hash, text, page_offsets)
+    ctx["text"] = text
+    ctx["ocr_pages"] = _ocr_page_stats(page_offsets)
+    logger.info(f"Step 1 complete: Extracted {len(text) if text else 0} characters")
+
+    # Initialize metadata early to ensure document is visible
+    metadata = load_metadata()
+    if filename not in metadata:
+        logger.warning(f"Metadata not found for {filename}, creating entry")
+        metadata[filename] = {
+            "filename": filename,
+            "doc_type": ctx["doc_type"],
+            "upload_date": datetime.datetime.now().isoformat(),
+            "status": "processing",  # Should already be set, but ensure it
+            "workflow_status": "in_review",
+            "competency_answers": {}
+        }
+    if ctx["ocr_pages"]:
+        metadata[filename]["ocr_pages"] = ctx["ocr_pages"]
+
+    # Track if we have extractable text - lowered threshold to allow shorter OCR results
+    # OCR can produce valid but short text, so we index anything with meaningful content
+    text_stripped = text.strip() if text else ""
+    ctx["text_stripped"] = text_stripped
+    if len(text_stripped) > 10:  # Lowered from 50 to 10
+        save_metadata(metadata)
+        return True
+
+    logger.warning(f"No meaningful text extracted from {filename} ({len(text_stripped)} chars) - document will be visible but not searchable")
+    # Still update metadata to mark as processed (even if without text)
+    metadata[filename]["status"] = "processed"
+    metadata[filename]["text_extracted"] = False
+    metadata[filename]["competency_answers"] = {}
+    save_metadata(metadata)
+    logger.info(f"Finished processing {filename} (no text extracted)")
+    return False
+
+def _stage_chunk(ctx: Dict[str, Any]) -> bool:
+    ctx["chunks"] = _chunk_text(ctx["text_stripped"])
     try:
-        logger.info(f"Step 1: Extracting text from PDF {filename}")
-        text = extract_text_from_pdf(filepath)
-        logger.info(f"Step 1 complete: Extracted {len(text) if text else 0} characters")
+        ctx["minhash"] = _document_signature(ctx["text_stripped"])
+    except Exception as e:
+        logger.warning(f"Could not compute MinHash signature for {ctx['filename']}: {e}")
+    return True
 
-        # Initialize metadata early to ensure document is visible
-        metadata = load_metadata()
-        if filename not in metadata:
-            logger.warning(f"Metadata not found for {filename}, creating entry")
-            metadata[filename] = {
-                "filename": filename,
-                "doc_type": doc_type,
-                "upload_date": datetime.datetime.now().isoformat(),
-                "status": "processing",  # Should already be set, but ensure it
-                "workflow_status": "in_review",
-                "competency_answers": {}
-            }
+def _stage_embed(ctx: Dict[str, Any]) -> bool:
+    # 1. Index into Vector Store (Chroma embeds the chunks on upsert)
+    filename = ctx["filename"]
+    logger.info(f"Step 2: Indexing {len(ctx['text_stripped'])} characters of text for {filename}")
+    try:
+        ctx["indexing_successful"] = bool(index_document(filename, ctx["text_stripped"], chunks=ctx["chunks"]))
+        logger.info(f"Step 2 complete: Successfully indexed {filename}")
+    except Exception as e:
+        logger.error(f"Indexing failed for {filename}: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        if _is_rate_limit_error(e):
+            _note_rate_limited("embed")
+        ctx["indexing_successful"] = False
+    return True
+
+def _stage_competencies(ctx: Dict[str, Any]) -> bool:
+    # 2. Run Competency Questions (only if we have text and API key)
+    questions = _get_competency_questions(ctx["doc_type"])
+    ctx["answers"], ctx["competency_stats"] = extract_competencies(
+        ctx["filename"], ctx["doc_type"], ctx["text"], indexed=bool(ctx.get("indexing_successful")),
+        questions=questions,
+    )
+    if _competency_answered(ctx["competency_stats"]):
+        ctx["question_hashes"] = _question_hashes(questions)
+    return True
+
+def _stage_finalize(ctx: Dict[str, Any]) -> bool:
+    # Update metadata - always mark as processed, even if extraction failed
+    filename = ctx["filename"]
+    logger.info(f"Step 4: Updating final status to 'processed' for {filename}")
+    # Reload metadata to ensure we have the latest version (in case it was modified elsewhere)
+    metadata = load_metadata()
+    if filename in metadata:
+        metadata[filename]["status"] = "processed"
+        metadata[filename]["competency_answers"] = ctx.get("answers", {})
+        if ctx.get("competency_stats"):
+            metadata[filename]["competency_extraction"] = ctx["competency_stats"]
+        # Empty when extraction did not run or failed, so the next config save re-asks everything.
+        metadata[filename]["competency_question_hashes"] = ctx.get("question_hashes", {})
+        if ctx.get("ocr_pages"):
+            metadata[filename]["ocr_pages"] = ctx["ocr_pages"]
+        # Set text_extracted based on whether indexing succeeded
+        metadata[filename]["text_extracted"] = bool(ctx.get("indexing_successful"))
+        if "minhash" in ctx:
+            record_near_duplicates(metadata, filename, ctx["minhash"])
+        _sync_aliases(metadata, filename)
+        save_metadata(metadata)
+        logger.info(f"=== COMPLETED PROCESSING FOR {filename} - Status set to 'processed', text_extracted={metadata[filename]['text_extracted']} ===")
+    else:
+        logger.error(f"CRITICAL: Metadata entry not found for {filename} when trying to update status")
 
-        # Track if we have extractable text - lowered threshold to allow shorter OCR results
-        # OCR can produce valid but short text, so we index anything with meaningful content
-        text_stripped = text.strip() if text else ""
-        has_text = bool(text_stripped and len(text_stripped) > 10)  # Lowered from 50 to 10
+    logger.info(f"=== FINISHED PROCESSING {filename} ===")
+    return True
 
-        if not has_text:
-            logger.warning(f"No meaningful text extracted from {filename} ({len(text_stripped)} chars) - document will be visible but not searchable")
-            # Still update metadata to mark as processed (even if without text)
-            metadata[filename]["status"] = "processed"
+def _mark_processing_error(filename: str, e: Exception):
+    # Catch any unexpected errors and ensure status is updated
+    logger.error(f"Unexpected error processing {filename}: {e}")
+    import traceback
+    logger.error(traceback.format_exc())
+    # Update status to error on unexpected errors
+    try:
+        metadata = load_metadata()
+        if filename in metadata:
+            metadata[filename]["status"] = "error"
             metadata[filename]["text_extracted"] = False
-            metadata[filename]["competency_answers"] = {}
+            _sync_aliases(metadata, filename)
             save_metadata(metadata)
-            logger.info(f"Finished processing {filename} (no text extracted)")
-            return
-
-        # 1. Index into Vector Store (only if we have text)
-        logger.info(f"Step 2: Indexing {len(text_stripped)} characters of text for {filename}")
-        indexing_successful = False
-        try:
-            indexing_successful = bool(index_document(filename, text_stripped))
-            logger.info(f"Step 2 complete: Successfully indexed {filename}")
-        except Exception as e:
-            logger.error(f"Indexing failed for {filename}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            indexing_successful = False
+    except Exception as save_error:
+        logger.error(f"Could not record error status for {filename}: {save_error}")
+
+INGESTION_STAGES = [
+    # (stage name, function, processing.<key> for its initial worker count, default workers, network-bound)
+    # A worker count of 0 means "size from the CPU count".
+    ("extract", _stage_extract, "extract_workers", 0, False),
+    ("chunk", _stage_chunk, "chunk_workers", 1, False),
+    ("embed", _stage_embed, "embed_workers", 2, True),
+    ("competencies", _stage_competencies, "competency_workers", 3, True),
+    ("finalize", _stage_finalize, "finalize_workers", 1, False),
+]
+
+def _note_rate_limited(stage_name: str):
+    """Tell the pipeline autoscaler that a stage hit an OpenAI rate limit."""
+    if _ingestion_pipeline is not None:
+        _ingestion_pipeline.note_rate_limited(stage_name)
+
+class IngestionPipeline:
+    """
+    Runs documents through INGESTION_STAGES, one thread group and one bounded queue per stage.
+    submit() returns a concurrent.futures.Future resolved with True (processed) or False (error).
+
+    With autoscale enabled, a controller thread resizes each stage between min_workers and
+    max_workers every scale_interval seconds:
+    - grow by one when the stage is saturated and its backlog (queued x observed latency / workers)
+      would take longer than one interval to drain;
+    - shrink by one after two idle intervals;
+    - halve network-bound stages when OpenAI returns 429, and hold off growing them for a minute.
+    """
 
-        # 2. Run Competency Questions (only if we have text and API key)
-        doc_config = config.get("document_types", {}).get(doc_type, {})
-        # Support both old and new config field names
-        questions = doc_config.get("competency_questions") or doc_config.get("capture_fields", [])
-        answers = {}
+    RATE_LIMIT_COOLDOWN = 60.0
+
+    def __init__(self, stages, queue_size: int = 4, autoscale: bool = False,
+                 min_workers: int = 1, max_workers: int = 8, scale_interval: float = 5.0):
+        self.scale_interval = max(0.1, float(scale_interval))
+        self.stages = []
+        for entry in stages:
+            name, fn, workers = entry[0], entry[1], entry[2]
+            io_bound = bool(entry[3]) if len(entry) > 3 else False
+            lo = max(1, int(min_workers))
+            hi = max(lo, int(max_workers))
+            if not io_bound:
+                # CPU-bound stages compete for cores (and the GIL); more threads than cores only adds contention.
+                hi = max(lo, min(hi, os.cpu_count() or 1))
+            workers = int(workers) if int(workers) > 0 else max(1, (os.cpu_count() or 2) // 2)
+            self.stages.append({
+                "name": name,
+                "fn": fn,
+                "io_bound": io_bound,
+                "min": lo,
+                "max": hi,
+                "workers": max(lo, min(hi, workers)),  # target size
+                "alive": 0,
+                "queue": queue.Queue(maxsize=max(1, int(queue_size))),
+                "busy": 0,
+                "done": 0,
+                "latency": None,  # EWMA seconds per document
+                "idle_ticks": 0,
+                "rate_limited_at": 0.0,
+                "rate_limit_handled_at": 0.0,
+            })
+        self._lock = threading.Lock()
+        for idx, stage in enumerate(self.stages):
+            with self._lock:
+                self._spawn_locked(idx, stage["workers"])
+        if autoscale:
+            threading.Thread(target=self._autoscale_loop, name="ingest_autoscaler", daemon=True).start()
+
+    def _spawn_locked(self, idx: int, count: int):
+        stage = self.stages[idx]
+        for _ in range(count):
+            stage["alive"] += 1
+            threading.Thread(target=self._worker, args=(idx,), name=f"ingest_{stage['name']}_{stage['alive']}", daemon=True).start()
+
+    def submit(self, filename: str, filepath: str, doc_type: str) -> Future:
+        future: Future = Future()
+        ctx = {"filename": filename, "filepath": filepath, "doc_type": doc_type, "future": future}
+        # Blocks while the extract queue is full: callers (job queue workers) are throttled.
+        self.stages[0]["queue"].put(ctx)
+        return future
+
+    def _should_retire(self, stage: Dict[str, Any]) -> bool:
+        with self._lock:
+            if stage["alive"] > stage["workers"]:
+                stage["alive"] -= 1
+                return True
+            return False
 
-        # Check if OpenAI client is initialized
-        has_openai = openai_client is not None
-        logger.info(f"Questions configured: {len(questions) if questions else 0}, OpenAI client available: {has_openai}")
+    def _worker(self, idx: int):
+        stage = self.stages[idx]
+        while not self._should_retire(stage):
+            try:
+                ctx = stage["queue"].get(timeout=1.0)
+            except queue.Empty:
+                continue
+            started = time.monotonic()
+            with self._lock:
+                stage["busy"] += 1
+            try:
+                proceed = stage["fn"](ctx)
+            except Exception as e:
+                if _is_rate_limit_error(e):
+                    self.note_rate_limited(stage["name"])
+                _mark_processing_error(ctx["filename"], e)
+                ctx["future"].set_result(False)
+                continue
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    stage["busy"] -= 1
+                    stage["done"] += 1
+                    stage["latency"] = elapsed if stage["latency"] is None else 0.8 * stage["latency"] + 0.2 * elapsed
+            if not proceed or idx == len(self.stages) - 1:
+                ctx["future"].set_result(True)
+            else:
+                self.stages[idx + 1]["queue"].put(ctx)
+
+    def note_rate_limited(self, stage_name: str):
+        with self._lock:
+            for stage in self.stages:
+                if stage["name"] == stage_name:
+                    stage["rate_limited_at"] = time.monotonic()
+
+    def resize(self, idx: int, workers: int):
+        with self._lock:
+            stage = self.stages[idx]
+            target = max(stage["min"], min(stage["max"], int(workers)))
+            if target != stage["workers"]:
+                logger.info(f"Ingestion stage '{stage['name']}': {stage['workers']} -> {target} workers")
+            stage["workers"] = target
+            # Surplus threads retire themselves between documents.
+            if stage["alive"] < target:
+                self._spawn_locked(idx, target - stage["alive"])
+
+    def autoscale_tick(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        for idx, stage in enumerate(self.stages):
+            with self._lock:
+                workers, busy = stage["workers"], stage["busy"]
+                queued = stage["queue"].qsize()
+                latency = stage["latency"] or 0.0
+                rate_limited_at = stage["rate_limited_at"]
+                new_429 = stage["io_bound"] and rate_limited_at > stage["rate_limit_handled_at"]
+                if new_429:
+                    stage["rate_limit_handled_at"] = rate_limited_at
+                stage["idle_ticks"] = stage["idle_ticks"] + 1 if (queued == 0 and busy < workers) else 0
+                idle_ticks = stage["idle_ticks"]
+
+            if new_429:
+                self.resize(idx, workers // 2)
+            elif (queued > 0 and busy >= workers and queued * latency / workers > self.scale_interval
+                  and not (stage["io_bound"] and now - rate_limited_at < self.RATE_LIMIT_COOLDOWN)):
+                self.resize(idx, workers + 1)
+            elif idle_ticks >= 2 and workers > stage["min"]:
+                with self._lock:
+                    stage["idle_ticks"] = 0
+                self.resize(idx, workers - 1)
+
+    def _autoscale_loop(self):
+        while True:
+            time.sleep(self.scale_interval)
+            try:
+                self.autoscale_tick()
+            except Exception as e:
+                logger.error(f"Ingestion autoscaler error: {e}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"stage": s["name"], "workers": s["workers"], "min_workers": s["min"], "max_workers": s["max"],
+                 "busy": s["busy"], "queued": s["queue"].qsize(), "completed": s["done"],
+                 "avg_seconds": round(s["latency"], 3) if s["latency"] is not None else None}
+                for s in self.stages
+            ]
+
+_ingestion_pipeline: Optional[IngestionPipeline] = None
+_ingestion_pipeline_lock = threading.Lock()
+
+def _get_ingestion_pipeline() -> IngestionPipeline:
+    global _ingestion_pipeline
+    if _ingestion_pipeline is None:
+        with _ingestion_pipeline_lock:
+            if _ingestion_pipeline is None:
+                _ingestion_pipeline = IngestionPipeline(
+                    [(name, fn, _get_config_setting("processing", key, default), io_bound)
+                     for name, fn, key, default, io_bound in INGESTION_STAGES],
+                    queue_size=_get_config_setting("processing", "stage_queue_size", 4),
+                    autoscale=_get_config_setting("processing", "autoscale", True),
+                    min_workers=_get_config_setting("processing", "min_workers", 1),
+                    max_workers=_get_config_setting("processing", "max_workers", 8),
+                    scale_interval=_get_config_setting("processing", "scale_interval_seconds", 5.0),
+                )
+    return _ingestion_pipeline
 
-        if questions and openai_client:
-            system_prompt = prompts_config.get("prompts", {}).get("competency_extraction", {}).get("system", "You are a legal document assistant. Respond in JSON.")
-            user_prompt_template = prompts_config.get("prompts", {}).get("competency_extraction", {}).get("user", "Analyze the text:\n{document_text}\n\nQuestions:\n{questions_list}")
+# --- Ingestion job queue ---
+# Replaces the bare in-memory ThreadPoolExecutor: jobs are persisted to USER_DATA_DIR/jobs.json on
+# every state change, so work submitted by /upload, /start-processing, /reprocess and
+# /rag/rebuild-missing survives restarts instead of leaving documents stuck in "processing".
+PRIORITY_INTERACTIVE = 0  # single uploads / user-triggered reprocess
+PRIORITY_BULK = 10        # bulk processing, self-heal re-indexing
 
-            questions_list_str = "\n".join([f"- {q['id']}: {q['question']}" for q in questions])
+class IngestionJobQueue:
+    """
+    Durable, prioritized document-processing queue with retry/backoff and per-file dedupe.
+
+    - Lower priority value runs first; ties run in submission order.
+    - Submitting a file that already has a queued job returns that job (bumped to the more urgent
+      priority). A running job only absorbs a full-processing submit with the same doc_type; any other
+      submit queues a follow-up job that starts once the running one finishes.
+    - Jobs for the same file never run concurrently.
+    - Failed jobs are retried with exponential backoff up to processing.max_attempts.
+    - start() re-queues jobs that were running when the app stopped.
+    """
 
-            user_prompt = user_prompt_template.format(
-                document_text=text[:100000],
-                questions_list=questions_list_str
-            )
+    def __init__(self, path: str, handler, workers: int = 3, handlers: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.handler = handler  # callable(filename, filepath, doc_type) -> bool
+        # Handlers for other job kinds (same signature); "process" is full document processing.
+        self.handlers = dict(handlers or {}, process=handler)
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self._threads: List[threading.Thread] = []
+        self._loaded = False
+        self._paused = False
+
+    # Persistence (callers hold self._cond)
+    def _load_locked(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            for job in data.get("jobs", []):
+                self._jobs[job["id"]] = job
+                self._seq = max(self._seq, int(job.get("seq", 0)))
+        except Exception as e:
+            logger.error(f"Error loading job queue from {self.path}: {e}")
 
+    def _save_locked(self):
+        # Keep the file bounded: drop the oldest finished jobs beyond the history limit.
+        finished = sorted(
+            (j for j in self._jobs.values() if j["status"] in ("done", "failed", "cancelled")),
+            key=lambda j: j.get("updated_at", 0),
+        )
+        for j in finished[:max(0, len(finished) - 200)]:
+            del self._jobs[j["id"]]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"jobs": sorted(self._jobs.values(), key=lambda j: j["seq"])}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving job queue to {self.path}: {e}")
+
+    def _active_job_locked(self, filename: str, kind: Optional[str] = None,
+                           statuses: Tuple[str, ...] = ("queued", "running")) -> Optional[Dict[str, Any]]:
+        for job in self._jobs.values():
+            if job["filename"] == filename and job["status"] in statuses:
+                if kind is None or job.get("kind", "process") == kind:
+                    return job
+        return None
+
+    def submit(self, filename: str, filepath: str, doc_type: str, priority: int = PRIORITY_BULK,
+               kind: str = "process") -> Dict[str, Any]:
+        with self._cond:
+            self._load_locked()
+            queued = self._active_job_locked(filename, kind, ("queued",))
+            if queued is None and kind != "process":
+                # Full processing re-runs every step, so it covers any partial job for the same file.
+                queued = self._active_job_locked(filename, "process", ("queued",))
+            if queued is not None:
+                queued["priority"] = min(queued["priority"], priority)
+                queued["doc_type"] = doc_type
+                queued["next_attempt_at"] = min(queued.get("next_attempt_at", 0), time.time())
+                queued["updated_at"] = time.time()
+                self._save_locked()
+                self._cond.notify()
+                logger.info(f"Job for {filename} already queued ({queued['id']}); not queuing a duplicate")
+                return dict(queued)
+
+            running = self._active_job_locked(filename, statuses=("running",))
+            if running is not None and kind == "process" and running.get("kind", "process") == "process" \
+                    and running["doc_type"] == doc_type:
+                logger.info(f"Job for {filename} already running ({running['id']}); not queuing a duplicate")
+                return dict(running)
+            if running is not None:
+                # The running job started from older inputs (doc_type, competency questions); run again after it.
+                logger.info(f"Job for {filename} is running ({running['id']}); queuing a follow-up {kind} job")
+
+            self._seq += 1
+            now = time.time()
+            job = {
+                "id": uuid.uuid4().hex,
+                "seq": self._seq,
+                "kind": kind,
+                "filename": filename,
+                "filepath": filepath,
+                "doc_type": doc_type,
+                "priority": priority,
+                "status": "queued",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+                "updated_at": now,
+                "last_error": None,
+            }
+            self._jobs[job["id"]] = job
+            self._save_locked()
+            self._cond.notify()
+            return dict(job)
+
+    def cancel(self, filename: str) -> int:
+        """Cancel queued (not running) jobs for a file, e.g. when the document is deleted."""
+        with self._cond:
+            self._load_locked()
+            cancelled = 0
+            for job in self._jobs.values():
+                if job["filename"] == filename and job["status"] == "queued":
+                    job["status"] = "cancelled"
+                    job["updated_at"] = time.time()
+                    cancelled += 1
+            if cancelled:
+                self._save_locked()
+            return cancelled
+
+    def start(self):
+        """Resume interrupted jobs and start the worker threads (idempotent)."""
+        with self._cond:
+            self._load_locked()
+            if self._threads:
+                return
+            self._resume_interrupted_locked()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"doc_processor_{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            pending = sum(1 for j in self._jobs.values() if j["status"] == "queued")
+            logger.info(f"Ingestion job queue started: {self.workers} workers, {pending} queued job(s)")
+
+    def _resume_interrupted_locked(self):
+        resumed = 0
+        for job in self._jobs.values():
+            if job["status"] == "running":
+                job["status"] = "queued"
+                job["next_attempt_at"] = time.time()
+                resumed += 1
+        if resumed:
+            logger.info(f"Resuming {resumed} interrupted processing job(s)")
+            self._save_locked()
+
+    def active_count(self) -> int:
+        """Jobs queued or running."""
+        with self._cond:
+            self._load_locked()
+            return sum(1 for j in self._jobs.values() if j["status"] in ("queued", "running"))
+
+    def pause(self):
+        """Stop workers from claiming jobs (jobs already running finish normally)."""
+        with self._cond:
+            self._paused = True
+
+    def resume(self, reload: bool = False):
+        """Let workers claim jobs again; with reload, first re-read jobs.json (e.g. after a restore replaced it)."""
+        with self._cond:
+            self._paused = False
+            if reload:
+                self._jobs, self._seq, self._loaded = {}, 0, False
+                self._load_locked()
+                self._resume_interrupted_locked()
+            self._cond.notify_all()
+
+    def _claim_next_locked(self) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """Return (job to run, None) or (None, seconds until the next delayed job is due)."""
+        if self._paused:
+            return None, None
+        now = time.time()
+        busy = {j["filename"] for j in self._jobs.values() if j["status"] == "running"}
+        waiting = [j for j in self._jobs.values() if j["status"] == "queued" and j["filename"] not in busy]
+        ready = [j for j in waiting if j.get("next_attempt_at", 0) <= now]
+        if ready:
+            job = min(ready, key=lambda j: (j["priority"], j["seq"]))
+            job["status"] = "running"
+            job["attempts"] += 1
+            job["started_at"] = now
+            job["updated_at"] = now
+            self._save_locked()
+            return job, None
+        # Follow-ups blocked by a running job are woken by notify_all() in _finish.
+        delayed = [j["next_attempt_at"] for j in waiting]
+        return None, (max(0.0, min(delayed) - now) if delayed else None)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job, wait_for = self._claim_next_locked()
+                while job is None:
+                    self._cond.wait(timeout=wait_for)
+                    job, wait_for = self._claim_next_locked()
+                job_id, filename, filepath, doc_type = job["id"], job["filename"], job["filepath"], job["doc_type"]
+                handler = self.handlers.get(job.get("kind", "process"))
+
+            error: Optional[str] = None
             try:
-                logger.info(f"Calling OpenAI API for competency extraction on {filename}")
-                response = openai_client.chat.completions.create(
-                    model=LLM_MODEL,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                content = response.choices[0].message.content
-                answers = json.loads(content)
-                logger.info(f"OpenAI API call completed successfully for {filename}")
+                if handler is None:
+                    raise RuntimeError(f"No handler for job kind '{job.get('kind')}'")
+                ok = bool(handler(filename, filepath, doc_type))
+                if not ok:
+                    error = "processing failed"
             except Exception as e:
-                logger.error(f"LLM processing failed for {filename}: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-                answers = {}
-                # Don't fail the whole process if LLM call fails - continue with empty answers
-        else:
-            if not questions:
-                logger.info(f"No competency questions configured for doc_type '{doc_type}'")
-            if not has_openai:
-                logger.info(f"OpenAI API key not configured, skipping metadata extraction")
-
-        # Update metadata - always mark as processed, even if extraction failed
-        logger.info(f"Step 4: Updating final status to 'processed' for {filename}")
-        # Reload metadata to ensure we have the latest version (in case it was modified elsewhere)
-        metadata = load_metadata()
-        if filename in metadata:
-            metadata[filename]["status"] = "processed"
-            metadata[filename]["competency_answers"] = answers
-            # Set text_extracted based on whether indexing succeeded
-            metadata[filename]["text_extracted"] = indexing_successful and has_text
-            save_metadata(metadata)
-            logger.info(f"=== COMPLETED PROCESSING FOR {filename} - Status set to 'processed', text_extracted={metadata[filename]['text_extracted']} ===")
-        else:
-            logger.error(f"CRITICAL: Metadata entry not found for {filename} when trying to update status")
-
-        logger.info(f"=== FINISHED PROCESSING {filename} ===")
-
-    except Exception as e:
-        # Catch any unexpected errors and ensure status is updated
-        logger.error(f"Unexpected error processing {filename}: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-        # Update status to error on unexpected errors
-        metadata = load_metadata()
-        if filename in metadata:
-            metadata[filename]["status"] = "error"
-            metadata[filename]["text_extracted"] = False
-            save_metadata(metadata)
+                error = str(e)
+                logger.error(f"Job {job_id} for {filename} raised: {e}")
+            self._finish(job_id, error)
+
+    def _finish(self, job_id: str, error: Optional[str]):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            now = time.time()
+            job["updated_at"] = now
+            if error is None:
+                job["status"] = "done"
+                job["last_error"] = None
+            else:
+                job["last_error"] = error
+                max_attempts = int(_get_config_setting("processing", "max_attempts", 3))
+                if job["attempts"] < max_attempts:
+                    base = float(_get_config_setting("processing", "retry_backoff_seconds", 10.0))
+                    delay = min(base * (2 ** (job["attempts"] - 1)), 600.0)
+                    job["status"] = "queued"
+                    job["next_attempt_at"] = now + delay
+                    logger.warning(f"Job for {job['filename']} failed (attempt {job['attempts']}/{max_attempts}); retrying in {delay:.0f}s")
+                else:
+                    job["status"] = "failed"
+                    logger.error(f"Job for {job['filename']} failed permanently after {job['attempts']} attempts: {error}")
+            self._save_locked()
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            self._load_locked()
+            jobs = sorted((dict(j) for j in self._jobs.values()), key=lambda j: (j["status"] != "running", j["priority"], j["seq"]))
+        counts: Dict[str, int] = {}
+        for j in jobs:
+            counts[j["status"]] = counts.get(j["status"], 0) + 1
+        return {"workers": self.workers, "counts": counts, "jobs": jobs}
+
+    def has_active_job(self, filename: str, kind: Optional[str] = None) -> bool:
+        with self._cond:
+            self._load_locked()
+            return self._active_job_locked(filename, kind) is not None
+
+job_queue = IngestionJobQueue(
+    JOBS_FILE,
+    process_document_sync,
+    handlers={"competencies": refresh_competencies_sync},
+    workers=max(1, int(_get_config_setting("processing", "workers", 8))),
+)
 
-async def process_document_background(filename: str, filepath: str, doc_type: str):
+def _resume_stuck_documents() -> List[str]:
     """
-    Process document in background. FastAPI BackgroundTasks handles async functions correctly.
-    This is kept for backwards compatibility with single file uploads.
+    Documents left in 'processing' with no job (e.g. from versions before the durable queue, or a crash
+    between metadata and queue writes) are re-queued at bulk priority instead of needing /fix-stuck.
     """
-    await _process_document_async(filename, filepath, doc_type)
+    queued = []
+    md = load_metadata()
+    for fname, d in (md.items() if isinstance(md, dict) else []):
+        if not isinstance(d, dict) or d.get("status") != "processing" or d.get("duplicate_of") \
+                or job_queue.has_active_job(fname, "process"):
+            continue
+        fpath = os.path.join(DOCUMENTS_DIR, fname)
+        if os.path.exists(fpath):
+            job_queue.submit(fname, fpath, d.get("doc_type", "nda"), PRIORITY_BULK)
+            queued.append(fname)
+    if queued:
+        logger.info(f"Re-queued {len(queued)} document(s) stuck in 'processing': {queued}")
+    return queued
 
 # --- Models ---
 
@@ -1101,6 +3545,8 @@ def health_check():
         "version": "1.0.1",
         "rag": rag_init_state,
         "rag_error": rag_init_error,
+        "ocr": ocr_warmup_state,
+        "ocr_error": ocr_warmup_error,
     }
 
 
@@ -1152,7 +3598,7 @@ def get_rag_status() -> Dict[str, Any]:
     md = load_metadata()
     md_items = list(md.values()) if isinstance(md, dict) else []
 
-    desired_collection = _get_collection_name()
+    desired_collection = _get_active_collection_name()
     distance_threshold = _get_distance_threshold()
 
     total_chunks = _safe_collection_count(collection) if collection is not None else 0
@@ -1190,6 +3636,7 @@ def get_rag_status() -> Dict[str, Any]:
         "documents_dir": DOCUMENTS_DIR,
         "metadata_file": METADATA_FILE,
         "collection_name": desired_collection,
+        "embedding_provider": _get_embedding_provider_tag(),
         "collections": _list_collections_with_counts(),
         "total_chunks": total_chunks,
         "distance_threshold": distance_threshold,
@@ -1258,6 +3705,43 @@ def rag_debug_search(q: str):
     }
 
 
+class CompressionReportRequest(BaseModel):
+    questions: List[str]
+    k: int = 5
+    dimensions: List[int] = [256, 512]
+
+@app.post("/rag/compression-report")
+def rag_compression_report(request: CompressionReportRequest):
+    """
+    Storage savings and recall@k of int8 (with/without rescoring) and shortened-dimension search,
+    measured against exact search over the current collection for the given questions
+    (tests/test_rag_golden_questions.py sends the golden questions).
+    """
+    if collection is None or embedding_fn is None:
+        raise HTTPException(status_code=500, detail="Chroma collection not initialized")
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    got = collection.get(include=["embeddings"])
+    if not got or not got.get("ids"):
+        raise HTTPException(status_code=400, detail="Collection is empty")
+    report = compression_report(
+        got["embeddings"],
+        embedding_fn(request.questions),
+        k=request.k,
+        rescore_factor=_get_config_setting("rag", "rescore_factor", 4),
+        dimensions=request.dimensions,
+    )
+    report["embedding_provider"] = _get_embedding_provider_tag()
+    report["quantized_search"] = _quantized_search_enabled()
+    report["int8_index"] = _int8_index.stats()
+    try:
+        report["db_dir_bytes"] = sum(
+            os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(DB_DIR) for f in files
+        )
+    except Exception:
+        report["db_dir_bytes"] = None
+    return report
+
 @app.get("/rag/chunks")
 def rag_chunks(filename: str, limit: int = 5):
     """
@@ -1291,7 +3775,7 @@ async def rag_rebuild_missing():
     Rebuild the vector index for documents that are marked searchable but have no chunks in Chroma.
     This is the primary "self-heal" mechanism to prevent flaky RAG after restarts.
     """
-    if not openai_client or collection is None:
+    if collection is None:
         raise HTTPException(status_code=500, detail="RAG not configured (OpenAI key missing or collection not initialized)")
 
     status = get_rag_status()
@@ -1323,7 +3807,7 @@ async def rag_rebuild_missing():
         except Exception:
             pass
         queued.append(fname)
-        processing_executor.submit(process_document_sync, fname, file_path, doc_type)
+        job_queue.submit(fname, file_path, doc_type, PRIORITY_BULK)
 
     try:
         if isinstance(md, dict):
@@ -1429,14 +3913,17 @@ async def save_config_file(filename: str, request: Dict[str, str]):
 
     # Reload configs in-memory
     global config, prompts_config
+    result: Dict[str, Any] = {"status": "saved"}
     if filename == "config.yaml":
+        previous_config = config
         config = load_app_config()
         # Reinitialize OpenAI client with potentially new API key
         initialize_openai_client()
+        result["competency_refresh_queued"] = schedule_competency_refresh(previous_config)
     elif filename == "prompts.yaml":
         prompts_config = load_prompts_config()
 
-    return {"status": "saved"}
+    return result
 
 @app.post("/settings/restore_last_good/{filename}")
 def restore_last_good_config(filename: str):
@@ -1451,8 +3938,11 @@ def restore_last_good_config(filename: str):
 
         # Reload
         global config, prompts_config
+        previous_config = config
         config = load_app_config()
         prompts_config = load_prompts_config()
+        if filename == "config.yaml":
+            schedule_competency_refresh(previous_config)
 
         with open(filepath, "r") as f:
             return {"content": f.read(), "status": "restored"}
@@ -1472,69 +3962,397 @@ def reset_config_file(filename: str):
         shutil.copy(default_path, user_path)
         # Reload
         global config, prompts_config
+        previous_config = config
         config = load_app_config()
         prompts_config = load_prompts_config()
+        if filename == "config.yaml":
+            schedule_competency_refresh(previous_config)
 
         with open(user_path, "r") as f:
             return {"content": f.read(), "status": "reset"}
 
     raise HTTPException(status_code=500, detail="Default file not found")
 
-@app.get("/backup")
-async def backup_data():
-    # Create zip of USER_DATA_DIR
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    zip_filename = f"nda_backup_{timestamp}.zip"
-    # Create the zip in OS temp (NOT repo root) to avoid cluttering BASE_DIR.
-    temp_dir = tempfile.mkdtemp(prefix="docusenselm_backup_")
-    zip_path = os.path.join(temp_dir, zip_filename)
+# --- Streaming backup ---
+# /backup streams the zip while it is being built instead of writing it to a temp file first:
+# zipfile writes to a non-seekable sink (sizes go in data descriptors after each member), and the
+# generator hands out whatever has been produced after each block of input. Files that are
+# already compressed (PDF, DOCX, images, archives) are stored as-is; compressing them again
+# costs CPU for almost no size reduction.
+# A member's header is sent before its data, so a file that fails to read part-way can't be dropped
+# from the zip any more. Files up to BACKUP_BUFFER_SIZE are therefore read whole before their member
+# is started (a read error skips them, as with locked files). A larger file that fails mid-read is
+# ended where the error happened and listed in BACKUP_INCOMPLETE_NAME, and /restore skips it.
+BACKUP_SKIP_DIRS = ['Cache', 'GPUCache', 'Code Cache']
+STORED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".pptx", ".zip", ".gz", ".7z", ".png", ".jpg", ".jpeg", ".gif", ".webp"}
+BACKUP_READ_SIZE = 1024 * 1024
+BACKUP_BUFFER_SIZE = 16 * 1024 * 1024
+BACKUP_INCOMPLETE_NAME = "BACKUP_INCOMPLETE.txt"
+
+def _backup_skip_paths() -> List[str]:
+    """App-managed USER_DATA_DIR subtrees left out of backups and snapshots: in-progress resumable
+    uploads (preallocated, up to uploads.max_resumable_size_mb each) and the OCR/competency caches,
+    which are rebuilt on demand."""
+    return [UPLOAD_SESSIONS_DIR, CACHE_DIR]
+
+def _iter_backup_files(root: str, skip_dirs: Optional[List[str]] = None, skip_paths: Optional[List[str]] = None):
+    """Paths of files under root, pruning directories named in skip_dirs and the trees in skip_paths."""
+    skip_abs = {os.path.abspath(p) for p in (skip_paths or [])}
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in (skip_dirs or [])
+                   and os.path.abspath(os.path.join(dirpath, d)) not in skip_abs]
+        for file in files:
+            yield os.path.join(dirpath, file)
+
+class _ZipStreamSink:
+    """Write-only file object that buffers zip output until the generator drains it."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
 
-    # Create zip manually, skipping locked/cache files
+    def close(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _zip_compress_type(path: str) -> int:
     import zipfile
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(USER_DATA_DIR):
-            # Skip Cache directories (locked by Electron)
-            dirs[:] = [d for d in dirs if d not in ['Cache', 'GPUCache', 'Code Cache']]
-
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, USER_DATA_DIR)
-                try:
-                    zipf.write(file_path, arcname)
-                except (PermissionError, OSError) as e:
-                    logger.warning(f"Skipping locked file in backup: {arcname} ({e})")
-                    continue
+    return zipfile.ZIP_STORED if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
 
-    # Stream the file and delete it after streaming completes
-    def generate():
-        try:
-            with open(zip_path, 'rb') as f:
-                while True:
-                    chunk = f.read(64 * 1024)  # 64KB chunks
-                    if not chunk:
-                        break
-                    yield chunk
-        finally:
-            # Delete file after streaming is complete
+def iter_zip_stream(root: str, skip_dirs: Optional[List[str]] = None, skip_paths: Optional[List[str]] = None):
+    """Yield a zip of everything under root as it is built, skipping locked/unreadable files."""
+    import zipfile
+    sink = _ZipStreamSink()
+    incomplete: List[str] = []
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for file_path in _iter_backup_files(root, skip_dirs, skip_paths):
+            arcname = os.path.relpath(file_path, root)
+            src = None
             try:
-                if os.path.exists(zip_path):
-                    os.remove(zip_path)
-                    logger.info(f"Cleaned up backup file: {zip_path}")
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-            except Exception as e:
-                logger.error(f"Error cleaning up backup file {zip_path}: {e}")
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                src = open(file_path, "rb")
+                first = src.read(BACKUP_BUFFER_SIZE)
+            except (PermissionError, OSError) as e:
+                if src:
+                    src.close()
+                logger.warning(f"Skipping locked file in backup: {arcname} ({e})")
+                continue
+            zinfo.compress_type = _zip_compress_type(file_path)
+            with src, zipf.open(zinfo, 'w') as dest:
+                block = first
+                while block:
+                    dest.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+                    try:
+                        block = src.read(BACKUP_READ_SIZE)
+                    except (PermissionError, OSError) as e:
+                        logger.error(f"Read failed part-way through {arcname}; it is marked incomplete in the backup ({e})")
+                        incomplete.append(arcname.replace(os.sep, "/"))
+                        break
+            data = sink.drain()
+            if data:
+                yield data
+        if incomplete:
+            zipf.writestr(BACKUP_INCOMPLETE_NAME, "\n".join(incomplete) + "\n")
+    data = sink.drain()  # last members and central directory
+    if data:
+        yield data
+
+@app.get("/backup")
+def backup_data():
+    # Stream a zip of USER_DATA_DIR, skipping Electron cache directories (locked while the app runs)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    zip_filename = f"nda_backup_{timestamp}.zip"
 
     headers = {
         "Content-Disposition": f'attachment; filename="{zip_filename}"'
     }
 
     return StreamingResponse(
-        generate(),
+        iter_zip_stream(USER_DATA_DIR, BACKUP_SKIP_DIRS, _backup_skip_paths()),
         media_type='application/zip',
         headers=headers
     )
 
+# --- Incremental snapshots ---
+# POST /backup/snapshots records USER_DATA_DIR in a content-addressed store instead of a full zip:
+#   <snapshot_dir>/objects/ab/abcdef...      file contents, named by SHA-256 (stored once)
+#   <snapshot_dir>/snapshots/<id>.json       manifest: relative path -> sha256, size, mtime_ns
+# Files whose size and mtime match the previous manifest reuse its hash without being read, and
+# only contents not already in objects/ are copied, so a daily snapshot of a large, mostly
+# unchanged archive touches just the new and changed files. restore_snapshot() rebuilds any
+# snapshot (POST /backup/snapshots/{id}/restore, or offline:
+# `python server.py restore-snapshot <snapshot_dir> <id> <target_dir>`).
+# The store defaults to a sibling of USER_DATA_DIR so /restore, which wipes USER_DATA_DIR,
+# never deletes it; a backup.snapshot_dir inside USER_DATA_DIR is refused by the endpoints.
+# A snapshot restore checks every object against its hash before anything is wiped.
+_snapshot_lock = threading.Lock()
+
+def _get_snapshot_dir() -> str:
+    configured = str(_get_config_setting("backup", "snapshot_dir", "")).strip()
+    snapshot_dir = configured or f"{USER_DATA_DIR.rstrip(os.sep)}_snapshots"
+    data_abs = os.path.abspath(USER_DATA_DIR)
+    if os.path.commonpath([os.path.abspath(snapshot_dir), data_abs]) == data_abs:
+        raise HTTPException(status_code=400, detail="backup.snapshot_dir must be outside the data directory")
+    return snapshot_dir
+
+def _snapshot_object_path(snapshot_dir: str, digest: str) -> str:
+    return os.path.join(snapshot_dir, "objects", digest[:2], digest)
+
+def _load_snapshot_manifest(snapshot_dir: str, snapshot_id: str) -> Dict[str, Any]:
+    if not re.fullmatch(r"[\w\-]+", snapshot_id or ""):
+        raise FileNotFoundError(snapshot_id)
+    with open(os.path.join(snapshot_dir, "snapshots", f"{snapshot_id}.json"), "r") as f:
+        return json.load(f)
+
+def list_snapshots(snapshot_dir: str) -> List[Dict[str, Any]]:
+    """Snapshot summaries (without file lists), oldest first."""
+    manifests_dir = os.path.join(snapshot_dir, "snapshots")
+    if not os.path.isdir(manifests_dir):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(manifests_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            manifest = _load_snapshot_manifest(snapshot_dir, name[:-5])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot manifest {name}: {e}")
+            continue
+        summaries.append({k: v for k, v in manifest.items() if k != "files"})
+    return sorted(summaries, key=lambda m: m.get("created_at", ""))
+
+def _store_snapshot_object(snapshot_dir: str, file_path: str) -> Tuple[str, bool]:
+    """Copy file_path into the object store while hashing it. Returns (sha256, newly stored)."""
+    os.makedirs(os.path.join(snapshot_dir, "objects"), exist_ok=True)
+    tmp_path = os.path.join(snapshot_dir, "objects", f".incoming-{uuid.uuid4().hex}")
+    hasher = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as src, open(tmp_path, "wb") as dest:
+            while block := src.read(BACKUP_READ_SIZE):
+                hasher.update(block)
+                dest.write(block)
+        digest = hasher.hexdigest()
+        object_path = _snapshot_object_path(snapshot_dir, digest)
+        if os.path.exists(object_path):
+            return digest, False
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(tmp_path, object_path)
+        return digest, True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def create_snapshot(root: str, snapshot_dir: str, skip_dirs: Optional[List[str]] = None,
+                    skip_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Record root in the snapshot store; returns the new snapshot's summary."""
+    started = time.monotonic()
+    with _snapshot_lock:
+        previous = list_snapshots(snapshot_dir)
+        parent = _load_snapshot_manifest(snapshot_dir, previous[-1]["id"]) if previous else {"files": {}}
+        files: Dict[str, Dict[str, Any]] = {}
+        stats = {"files": 0, "bytes": 0, "unchanged": 0, "hashed": 0, "new_objects": 0, "new_bytes": 0, "skipped": []}
+        for file_path in _iter_backup_files(root, skip_dirs, list(skip_paths or []) + [snapshot_dir]):
+            rel = os.path.relpath(file_path, root).replace(os.sep, "/")
+            try:
+                st = os.stat(file_path)
+                known = parent["files"].get(rel)
+                if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns \
+                        and os.path.exists(_snapshot_object_path(snapshot_dir, known["sha256"])):
+                    digest = known["sha256"]
+                    stats["unchanged"] += 1
+                else:
+                    digest, new = _store_snapshot_object(snapshot_dir, file_path)
+                    stats["hashed"] += 1
+                    if new:
+                        stats["new_objects"] += 1
+                        stats["new_bytes"] += st.st_size
+            except (PermissionError, OSError) as e:
+                logger.warning(f"Skipping locked file in snapshot: {rel} ({e})")
+                stats["skipped"].append(rel)
+                continue
+            files[rel] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            stats["files"] += 1
+            stats["bytes"] += st.st_size
+
+        snapshot_id = f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        stats["seconds"] = round(time.monotonic() - started, 2)
+        manifest = {
+            "id": snapshot_id,
+            "created_at": datetime.datetime.now().isoformat(),
+            "parent": previous[-1]["id"] if previous else None,
+            "stats": stats,
+            "files": files,
+        }
+        manifests_dir = os.path.join(snapshot_dir, "snapshots")
+        os.makedirs(manifests_dir, exist_ok=True)
+        tmp_path = os.path.join(manifests_dir, f".{snapshot_id}.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(manifests_dir, f"{snapshot_id}.json"))
+        logger.info(f"Snapshot {snapshot_id}: {stats['files']} files, {stats['new_objects']} new objects "
+                    f"({stats['new_bytes']} bytes) in {stats['seconds']}s")
+        return {k: v for k, v in manifest.items() if k != "files"}
+
+def prune_snapshots(snapshot_dir: str, keep: int) -> Dict[str, int]:
+    """Delete all but the newest keep snapshots and any objects no remaining snapshot references."""
+    with _snapshot_lock:
+        snapshots = list_snapshots(snapshot_dir)
+        removed = 0
+        for summary in snapshots[:max(0, len(snapshots) - max(1, keep))]:
+            os.remove(os.path.join(snapshot_dir, "snapshots", f"{summary['id']}.json"))
+            removed += 1
+        referenced = set()
+        for summary in list_snapshots(snapshot_dir):
+            manifest = _load_snapshot_manifest(snapshot_dir, summary["id"])
+            referenced.update(entry["sha256"] for entry in manifest["files"].values())
+        deleted_objects = 0
+        objects_dir = os.path.join(snapshot_dir, "objects")
+        for dirpath, _, names in os.walk(objects_dir):
+            for name in names:
+                if name not in referenced and not name.startswith(".incoming-"):
+                    os.remove(os.path.join(dirpath, name))
+                    deleted_objects += 1
+        return {"snapshots_removed": removed, "objects_removed": deleted_objects}
+
+def verify_snapshot(snapshot_dir: str, snapshot_id: str) -> List[str]:
+    """Files of a snapshot whose stored object is missing, unreadable or doesn't match its SHA-256."""
+    manifest = _load_snapshot_manifest(snapshot_dir, snapshot_id)
+    valid: Dict[str, bool] = {}
+    bad = []
+    for rel, entry in manifest["files"].items():
+        digest = entry["sha256"]
+        if digest not in valid:
+            valid[digest] = _file_sha256(_snapshot_object_path(snapshot_dir, digest)) == digest
+        if not valid[digest]:
+            bad.append(rel)
+    return bad
+
+def restore_snapshot(snapshot_dir: str, snapshot_id: str, target_dir: str, verify: bool = True) -> Dict[str, Any]:
+    """
+    Rebuild a snapshot's files under target_dir (existing files at the same paths are replaced,
+    others are left alone). With verify, every file's SHA-256 is checked against the manifest.
+    """
+    manifest = _load_snapshot_manifest(snapshot_dir, snapshot_id)
+    restored, failed = 0, []
+    for rel, entry in manifest["files"].items():
+        dest_path = os.path.join(target_dir, *rel.split("/"))
+        if os.path.commonpath([os.path.abspath(dest_path), os.path.abspath(target_dir)]) != os.path.abspath(target_dir):
+            failed.append(rel)
+            continue
+        try:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            tmp_path = f"{dest_path}.restore-tmp"
+            hasher = hashlib.sha256()
+            with open(_snapshot_object_path(snapshot_dir, entry["sha256"]), "rb") as src, open(tmp_path, "wb") as dest:
+                while block := src.read(BACKUP_READ_SIZE):
+                    hasher.update(block)
+                    dest.write(block)
+            if verify and hasher.hexdigest() != entry["sha256"]:
+                os.remove(tmp_path)
+                raise ValueError("content does not match manifest hash")
+            os.replace(tmp_path, dest_path)
+            # Keep the recorded mtime so the next snapshot recognises the file as unchanged.
+            os.utime(dest_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            restored += 1
+        except (PermissionError, OSError, ValueError) as e:
+            logger.warning(f"Could not restore {rel} from snapshot {snapshot_id}: {e}")
+            failed.append(rel)
+    return {"snapshot": snapshot_id, "restored": restored, "failed": failed}
+
+@app.post("/backup/snapshots")
+def create_backup_snapshot():
+    snapshot_dir = _get_snapshot_dir()
+    summary = create_snapshot(USER_DATA_DIR, snapshot_dir, BACKUP_SKIP_DIRS, _backup_skip_paths())
+    keep = int(_get_config_setting("backup", "keep_snapshots", 0))
+    if keep > 0:
+        summary["pruned"] = prune_snapshots(snapshot_dir, keep)
+    return summary
+
+@app.get("/backup/snapshots")
+def get_backup_snapshots():
+    snapshot_dir = _get_snapshot_dir()
+    return {"snapshot_dir": snapshot_dir, "snapshots": list_snapshots(snapshot_dir)}
+
+def _reset_user_data_state():
+    """
+    Drop in-memory state backed by files in USER_DATA_DIR after a restore replaced them: the disk
+    caches and near-duplicate index are reopened on next use, and Chroma is reopened on the restored
+    database (which also resets the int8 index and query embedding cache).
+    """
+    global _ocr_cache, _competency_cache, _near_duplicate_index, chroma_client
+    with _ocr_cache_lock, _competency_cache_lock:
+        for cache in (_ocr_cache, _competency_cache):
+            if cache is not None:
+                try:
+                    cache.close()
+                except Exception:
+                    pass
+        _ocr_cache = _competency_cache = None
+    with _near_duplicate_index_lock:
+        _near_duplicate_index = None
+    with _chroma_init_lock:
+        client, chroma_client = chroma_client, None
+    if client is not None and hasattr(client, "clear_system_cache"):
+        try:
+            # PersistentClient shares one system per path; without this the new client reuses the old handles.
+            client.clear_system_cache()
+        except Exception as e:
+            logger.warning(f"Could not reset the Chroma client cache: {e}")
+    initialize_openai_client()
+
+@app.post("/backup/snapshots/{snapshot_id}/restore")
+def restore_backup_snapshot(snapshot_id: str):
+    """
+    Replace USER_DATA_DIR with a snapshot (like /restore, locked files are skipped).
+    Refused while ingestion jobs are queued or running; job queue, caches, indexes and Chroma are
+    reloaded from the restored files afterwards.
+    """
+    snapshot_dir = _get_snapshot_dir()
+    try:
+        bad = verify_snapshot(snapshot_dir, snapshot_id)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    if bad:
+        # Refuse before wiping anything: restoring would lose these files.
+        logger.error(f"Snapshot {snapshot_id} is damaged ({len(bad)} file(s) missing or corrupt); not restoring")
+        raise HTTPException(status_code=409, detail={"message": "Snapshot is missing or has corrupt files", "files": bad[:50]})
+    # Workers would write their in-memory view (jobs, metadata, Chroma, caches) over the restored files.
+    active = job_queue.active_count()
+    if active:
+        raise HTTPException(status_code=409, detail=f"{active} document processing job(s) are queued or running; "
+                                                    "wait for them to finish (see /jobs) or restart the app, then restore")
+
+    logger.info(f"Restoring snapshot {snapshot_id} into {USER_DATA_DIR}")
+    job_queue.pause()
+    try:
+        if os.path.exists(USER_DATA_DIR):
+            def handle_remove_error(func, path, exc_info):
+                """Skip locked files during restore"""
+                logger.warning(f"Skipping locked file during restore: {path}")
+
+            shutil.rmtree(USER_DATA_DIR, onerror=handle_remove_error)
+        os.makedirs(USER_DATA_DIR, exist_ok=True)
+        result = restore_snapshot(snapshot_dir, snapshot_id, USER_DATA_DIR)
+        _reset_user_data_state()
+    finally:
+        job_queue.resume(reload=True)
+    result.update({"status": "restored", "message": "Data restored successfully. Please restart the application if you see issues."})
+    return result
+
 def cleanup_root_zip_artifacts():
     """
     Safety cleanup: legacy versions created backup/restore zips in BASE_DIR (repo root).
@@ -1596,7 +4414,16 @@ async def restore_data(file: UploadFile = File(...)):
         logger.info("Unpacking archive...")
         import zipfile
         with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
-            for member in zip_ref.namelist():
+            members = zip_ref.namelist()
+            # Files whose read failed part-way through while the backup was streamed (see iter_zip_stream).
+            incomplete = set()
+            if BACKUP_INCOMPLETE_NAME in members:
+                incomplete = set(zip_ref.read(BACKUP_INCOMPLETE_NAME).decode("utf-8").splitlines())
+                incomplete.add(BACKUP_INCOMPLETE_NAME)
+                logger.warning(f"Backup lists {len(incomplete) - 1} incomplete file(s); they are not restored")
+            for member in members:
+                if member in incomplete:
+                    continue
                 try:
                     zip_ref.extract(member, USER_DATA_DIR)
                 except (PermissionError, OSError) as e:
@@ -1623,60 +4450,168 @@ async def restore_data(file: UploadFile = File(...)):
 
     return {"status": "restored", "message": "Data restored successfully. Please restart the application if you see issues."}
 
-@app.post("/upload")
-async def upload_document(file: UploadFile = File(...), doc_type: str = "nda", skip_processing: bool = False, background_tasks: BackgroundTasks = None):
+# --- Upload content deduplication ---
+# Every document records the SHA-256 of its file (file_sha256), computed while the upload streams
+# to disk. Before a new upload gets a metadata entry, the content-hash index built from those
+# hashes is checked; a byte-identical upload is linked to the existing document instead of being
+# extracted, OCR'd, embedded and analyzed again:
+# - link (default): the new copy is discarded and the existing document is returned.
+# - alias: the copy is kept under its own name with duplicate_of pointing at the existing
+#          document; it shares that document's answers and status instead of being processed.
+# - process: the pre-dedup behaviour, the copy is processed as an independent document.
+# Copies of documents that failed processing are always processed.
+UPLOAD_DUPLICATE_MODES = ("link", "alias", "process")
+
+def _content_hash_index(metadata: Dict[str, Any]) -> Dict[str, str]:
+    """{file_sha256: filename} over non-alias documents that have a recorded hash."""
+    index: Dict[str, str] = {}
+    for fname, entry in metadata.items():
+        if isinstance(entry, dict) and entry.get("file_sha256") and not entry.get("duplicate_of"):
+            index.setdefault(entry["file_sha256"], fname)
+    return index
+
+def backfill_content_hashes() -> int:
     """
-    Upload a document file. Optionally skip immediate processing for bulk uploads.
+    Hash documents uploaded before file_sha256 was recorded and persist the hashes. Runs once in a
+    background thread at startup; until it finishes, uploads are only deduplicated against documents
+    that already have a hash. Returns the number of documents backfilled.
+    """
+    missing = [fname for fname, entry in load_metadata().items()
+               if isinstance(entry, dict) and not entry.get("file_sha256") and not entry.get("duplicate_of")]
+    hashes = {}
+    for fname in missing:
+        file_hash = _file_sha256(os.path.join(DOCUMENTS_DIR, fname))
+        if file_hash:
+            hashes[fname] = file_hash
+    if not hashes:
+        return 0
+    # Hashing can take a while on a large library; apply to fresh metadata so concurrent edits are kept.
+    metadata = load_metadata()
+    count = 0
+    for fname, file_hash in hashes.items():
+        entry = metadata.get(fname)
+        if isinstance(entry, dict) and not entry.get("file_sha256"):
+            entry["file_sha256"] = file_hash
+            count += 1
+    if count:
+        save_metadata(metadata)
+        logger.info(f"Backfilled content hashes for {count} document(s)")
+    return count
 
-    Best Practices Implemented:
-    - File validation (type, size, name sanitization)
-    - Streaming upload for large files
-    - Secure file storage with sanitized names
-    - Separate upload and processing phases
+def _alias_fields(canonical: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields an alias mirrors from the document it duplicates."""
+    return {
+        "status": canonical.get("status", "pending"),
+        "text_extracted": canonical.get("text_extracted", False),
+        "competency_answers": dict(canonical.get("competency_answers") or {}),
+    }
+
+def _sync_aliases(metadata: Dict[str, Any], filename: str) -> int:
+    """Copy filename's processing results to every alias of it. Returns the number updated."""
+    canonical = metadata.get(filename)
+    if not isinstance(canonical, dict):
+        return 0
+    count = 0
+    for entry in metadata.values():
+        if isinstance(entry, dict) and entry.get("duplicate_of") == filename:
+            entry.update(_alias_fields(canonical))
+            count += 1
+    return count
+
+def _unique_document_path(safe_filename: str) -> Tuple[str, str]:
+    """(filename, path) in DOCUMENTS_DIR, adding _1, _2... when the name is taken."""
+    name_part, ext_part = os.path.splitext(safe_filename)
+    candidate = safe_filename
+    counter = 1
+    while os.path.exists(os.path.join(DOCUMENTS_DIR, candidate)):
+        candidate = f"{name_part}_{counter}{ext_part}"
+        counter += 1
+    return candidate, os.path.join(DOCUMENTS_DIR, candidate)
+
+def _register_upload(metadata: Dict[str, Any], content_index: Dict[str, str], safe_filename: str,
+                     original_filename: str, doc_type: str, file_size: int, file_hash: str,
+                     on_duplicate: str = "link") -> Dict[str, Any]:
+    """
+    Record a stored upload in metadata (not saved) and return its result.
+    result["process"] tells the caller whether the document still needs a processing job.
     """
+    filepath = os.path.join(DOCUMENTS_DIR, safe_filename)
+    existing = content_index.get(file_hash)
+    existing_entry = metadata.get(existing) if existing else None
+    if on_duplicate != "process" and isinstance(existing_entry, dict) and existing_entry.get("status") != "error":
+        if on_duplicate == "link":
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            logger.info(f"Upload {original_filename} is identical to {existing}; linked instead of reprocessing")
+            return {"status": "duplicate", "filename": existing, "original_filename": original_filename,
+                    "file_size": file_size, "duplicate_of": existing, "process": False}
+
+    # Get show_on_dashboard default from config, default to True if not specified
+    doc_type_config = config.get("document_types", {}).get(doc_type, {})
+    show_on_dashboard = doc_type_config.get("show_on_dashboard", True)
+
+    metadata[safe_filename] = {
+        "filename": safe_filename,
+        "original_filename": original_filename,  # Track original name
+        "doc_type": doc_type,
+        "upload_date": datetime.datetime.now().isoformat(),
+        "file_size": file_size,
+        "file_sha256": file_hash,
+        "status": "pending",
+        "workflow_status": "in_review",
+        "show_on_dashboard": show_on_dashboard,
+        "competency_answers": {}
+    }
+    result = {"status": "uploaded", "filename": safe_filename, "original_filename": original_filename, "file_size": file_size}
+    if on_duplicate == "alias" and isinstance(existing_entry, dict) and existing_entry.get("status") != "error":
+        metadata[safe_filename]["duplicate_of"] = existing
+        metadata[safe_filename].update(_alias_fields(existing_entry))
+        logger.info(f"Upload {safe_filename} is identical to {existing}; stored as an alias")
+        result.update({"status": "alias", "duplicate_of": existing, "process": False})
+        return result
+    content_index.setdefault(file_hash, safe_filename)
+    result["process"] = True
+    return result
+
+MAX_UPLOAD_SIZE = 100 * 1024 * 1024  # 100 MB limit
+# Read uploads in 1 MB chunks: Starlette has already spooled the multipart part, so small reads only
+# add per-call overhead.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def _sanitize_upload_filename(filename: Optional[str]) -> str:
+    """Validated, path-safe document filename for an upload; raises HTTPException(400) when not allowed."""
     # Validate file type
-    if not file.filename:
+    if not filename:
         raise HTTPException(status_code=400, detail="No filename provided")
 
-    file_ext = file.filename.lower().split('.')[-1]
+    file_ext = filename.lower().split('.')[-1]
     if file_ext not in ['pdf', 'docx']:
         raise HTTPException(status_code=400, detail="Only PDF and DOCX files are allowed")
 
     # Sanitize filename to prevent path traversal attacks
     # Remove any path components and use only the basename
-    import os.path
-    import re
-    safe_filename = os.path.basename(file.filename)
+    safe_filename = os.path.basename(filename)
     # Remove any non-alphanumeric characters except .-_
     safe_filename = re.sub(r'[^\w\s\-\.]', '', safe_filename)
     # Ensure filename is not empty after sanitization
     if not safe_filename or safe_filename == '.':
         safe_filename = f"document_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_ext}"
+    return safe_filename
 
-    # Check for duplicate filename
-    original_safe_filename = safe_filename
-    counter = 1
-    filepath = os.path.join(DOCUMENTS_DIR, safe_filename)
-    while os.path.exists(filepath):
-        name_part, ext_part = os.path.splitext(original_safe_filename)
-        safe_filename = f"{name_part}_{counter}{ext_part}"
-        filepath = os.path.join(DOCUMENTS_DIR, safe_filename)
-        counter += 1
-
-    # Validate file size (streaming - don't load entire file into memory)
-    MAX_FILE_SIZE = 100 * 1024 * 1024  # 100 MB limit
+async def _stream_upload(file: UploadFile, filepath: str) -> Tuple[int, str]:
+    """
+    Stream an upload to filepath, enforcing MAX_UPLOAD_SIZE and hashing as it goes.
+    Returns (size, sha256); the partial file is removed and HTTPException raised on failure.
+    """
     file_size = 0
-
+    hasher = hashlib.sha256()
     try:
-        # Stream file to disk in chunks (best practice for large files)
         with open(filepath, "wb") as buffer:
-            while chunk := await file.read(8192):  # Read in 8KB chunks
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
                 file_size += len(chunk)
-                if file_size > MAX_FILE_SIZE:
-                    # Clean up partial file
-                    buffer.close()
-                    os.remove(filepath)
-                    raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)} MB")
+                if file_size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024*1024)} MB")
+                hasher.update(chunk)
                 buffer.write(chunk)
     except Exception as e:
         # Clean up on error
@@ -1686,41 +4621,339 @@ async def upload_document(file: UploadFile = File(...), doc_type: str = "nda", s
             raise
         logger.error(f"Error uploading file: {e}")
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
+    return file_size, hasher.hexdigest()
+
+@app.post("/upload")
+async def upload_document(file: UploadFile = File(...), doc_type: str = "nda", skip_processing: bool = False,
+                          on_duplicate: str = "link"):
+    """
+    Upload a document file. Optionally skip immediate processing for bulk uploads.
+
+    Best Practices Implemented:
+    - File validation (type, size, name sanitization)
+    - Streaming upload for large files
+    - Secure file storage with sanitized names
+    - Separate upload and processing phases
+    - Content-hash deduplication (on_duplicate: link, alias or process)
+    """
+    if on_duplicate not in UPLOAD_DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"on_duplicate must be one of {', '.join(UPLOAD_DUPLICATE_MODES)}")
+    safe_filename = _sanitize_upload_filename(file.filename)
+
+    # Check for duplicate filename
+    safe_filename, filepath = _unique_document_path(safe_filename)
+
+    # Stream file to disk (don't load entire file into memory), validating size and hashing as we go
+    file_size, file_hash = await _stream_upload(file, filepath)
 
     # Init metadata
     metadata = load_metadata()
-    # Get show_on_dashboard default from config, default to True if not specified
-    doc_type_config = config.get("document_types", {}).get(doc_type, {})
-    show_on_dashboard = doc_type_config.get("show_on_dashboard", True)
+    result = _register_upload(metadata, _content_hash_index(metadata), safe_filename, file.filename or safe_filename,
+                              doc_type, file_size, file_hash, on_duplicate)
+    if result["status"] != "duplicate":
+        save_metadata(metadata)
 
-    metadata[safe_filename] = {
-        "filename": safe_filename,
-        "original_filename": file.filename,  # Track original name
-        "doc_type": doc_type,
-        "upload_date": datetime.datetime.now().isoformat(),
-        "file_size": file_size,
-        "status": "pending",
-        "workflow_status": "in_review",
-        "show_on_dashboard": show_on_dashboard,
-        "competency_answers": {}
-    }
-    save_metadata(metadata)
+    logger.info(f"File uploaded successfully: {result['filename']} (size: {file_size} bytes, {result['status']})")
+
+    # Process immediately only if skip_processing is False (interactive uploads jump ahead of bulk work)
+    if result.pop("process") and not skip_processing:
+        job_queue.submit(safe_filename, filepath, doc_type, PRIORITY_INTERACTIVE)
+
+    return result
+
+@app.post("/upload/batch")
+async def upload_documents_batch(files: List[UploadFile] = File(...), doc_type: str = "nda",
+                                 skip_processing: bool = False, on_duplicate: str = "link"):
+    """
+    Upload many documents in one multipart request (repeat the "files" field).
 
-    logger.info(f"File uploaded successfully: {safe_filename} (size: {file_size} bytes)")
+    Each file is validated and streamed to disk on its own, so one bad file doesn't fail the batch.
+    All metadata entries are written in a single save, and unless skip_processing is set the new
+    documents are queued at bulk priority. Returns one result per file, in request order.
+    """
+    if on_duplicate not in UPLOAD_DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"on_duplicate must be one of {', '.join(UPLOAD_DUPLICATE_MODES)}")
+
+    stored = []  # (index, safe_filename, original_filename, size, sha256)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+    for i, file in enumerate(files):
+        try:
+            safe_filename, filepath = _unique_document_path(_sanitize_upload_filename(file.filename))
+            file_size, file_hash = await _stream_upload(file, filepath)
+            stored.append((i, safe_filename, file.filename, file_size, file_hash))
+        except HTTPException as e:
+            results[i] = {"status": "error", "original_filename": file.filename, "detail": e.detail}
+
+    metadata = load_metadata()
+    content_index = _content_hash_index(metadata)
+    to_process = []
+    for i, safe_filename, original_filename, file_size, file_hash in stored:
+        result = _register_upload(metadata, content_index, safe_filename, original_filename, doc_type,
+                                  file_size, file_hash, on_duplicate)
+        if result.pop("process"):
+            to_process.append(safe_filename)
+        results[i] = result
+    if stored:
+        save_metadata(metadata)
 
-    # Process immediately only if skip_processing is False
     if not skip_processing:
-        background_tasks.add_task(process_document_background, safe_filename, filepath, doc_type)
+        for safe_filename in to_process:
+            job_queue.submit(safe_filename, os.path.join(DOCUMENTS_DIR, safe_filename), doc_type, PRIORITY_BULK)
+
+    filled = [r for r in results if r is not None]  # every file got a result above
+    counts: Dict[str, int] = {}
+    for r in filled:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    logger.info(f"Batch upload of {len(files)} files: {counts}")
+    return {"results": filled, "counts": counts, "queued": 0 if skip_processing else len(to_process)}
+
+# --- Resumable uploads ---
+# Large scanned PDFs can be uploaded in parts that survive a dropped connection:
+#   POST   /upload/sessions                   {filename, size, doc_type, sha256?} -> session id
+#   PUT    /upload/sessions/{id}?offset=N     raw bytes written at offset N (parts may arrive in
+#                                             any order or in parallel, and may be re-sent)
+#   GET    /upload/sessions/{id}              received byte ranges and the missing ones, to resume
+#   POST   /upload/sessions/{id}/commit       {sha256?} verifies size and SHA-256, then the file is
+#                                             registered exactly like a /upload (dedup, queueing)
+#   DELETE /upload/sessions/{id}              abort
+# Each session is a preallocated data file plus session.json under USER_DATA_DIR/uploads/<id>.
+# Sessions not touched for uploads.session_ttl_hours are removed when a new one is created.
+# Parts of one session may be written concurrently; _upload_sessions_lock only guards the short
+# bookkeeping steps (session.json, parts in flight, commit/abort state), never the data writes.
+_upload_sessions_lock = threading.Lock()
+_upload_session_parts: Dict[str, int] = {}   # session id -> parts being written
+_upload_session_states: Dict[str, str] = {}  # session id -> "committing", "committed" or "aborted"
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+    doc_type: str = "nda"
+    sha256: Optional[str] = None
+
+class UploadCommitRequest(BaseModel):
+    sha256: Optional[str] = None
+    skip_processing: bool = False
+    on_duplicate: str = "link"
+
+def _set_upload_session_state(session_id: str, state: Optional[str]):
+    """Record a session's commit/abort state (caller holds _upload_sessions_lock); keeps the last 1000."""
+    _upload_session_states.pop(session_id, None)
+    if state:
+        _upload_session_states[session_id] = state
+    while len(_upload_session_states) > 1000:
+        del _upload_session_states[next(iter(_upload_session_states))]
+
+def _upload_session_dir(session_id: str) -> str:
+    if not re.fullmatch(r"[0-9a-f]{32}", session_id or ""):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return os.path.join(UPLOAD_SESSIONS_DIR, session_id)
+
+def _load_upload_session(session_id: str) -> Dict[str, Any]:
+    path = os.path.join(_upload_session_dir(session_id), "session.json")
+    state = _upload_session_states.get(session_id)
+    if state == "committing":
+        raise HTTPException(status_code=409, detail="Upload session is being committed")
+    if state is not None:
+        raise HTTPException(status_code=410, detail=f"Upload session was {state}")
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+
+def _save_upload_session(session: Dict[str, Any]):
+    session["updated_at"] = time.time()
+    path = os.path.join(_upload_session_dir(session["id"]), "session.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(session, f)
+    os.replace(tmp_path, path)
+
+def _merge_ranges(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add [start, end) to a sorted list of disjoint byte ranges, merging overlaps and neighbours."""
+    merged: List[List[int]] = []
+    for r_start, r_end in sorted(ranges + [[start, end]]):
+        if merged and r_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r_end)
+        else:
+            merged.append([r_start, r_end])
+    return merged
+
+def _missing_ranges(ranges: List[List[int]], size: int) -> List[List[int]]:
+    missing, position = [], 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+def _upload_session_status(session: Dict[str, Any]) -> Dict[str, Any]:
+    received = sum(end - start for start, end in session["ranges"])
+    missing = _missing_ranges(session["ranges"], session["size"])
+    return {
+        "session_id": session["id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "received": received,
+        "ranges": session["ranges"],
+        "missing": missing,
+        "next_offset": missing[0][0] if missing else session["size"],
+        "complete": not missing,
+    }
+
+def _purge_stale_upload_sessions():
+    ttl = float(_get_config_setting("uploads", "session_ttl_hours", 24)) * 3600
+    if not os.path.isdir(UPLOAD_SESSIONS_DIR):
+        return
+    now = time.time()
+    for session_id in os.listdir(UPLOAD_SESSIONS_DIR):
+        session_dir = os.path.join(UPLOAD_SESSIONS_DIR, session_id)
+        with _upload_sessions_lock:
+            busy = _upload_session_parts.get(session_id) or _upload_session_states.get(session_id) == "committing"
+        if busy:
+            continue
+        try:
+            with open(os.path.join(session_dir, "session.json"), "r") as f:
+                updated_at = json.load(f).get("updated_at", 0)
+        except Exception:
+            updated_at = os.path.getmtime(session_dir)
+        if now - updated_at > ttl:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            logger.info(f"Removed stale upload session {session_id}")
+
+@app.post("/upload/sessions")
+def create_upload_session(request: UploadSessionRequest):
+    safe_filename = _sanitize_upload_filename(request.filename)
+    max_size = int(_get_config_setting("uploads", "max_resumable_size_mb", 1024)) * 1024 * 1024
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    if request.size > max_size:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_size // (1024*1024)} MB")
+    _purge_stale_upload_sessions()
+
+    session = {
+        "id": uuid.uuid4().hex,
+        "filename": safe_filename,
+        "original_filename": request.filename,
+        "doc_type": request.doc_type,
+        "size": request.size,
+        "sha256": (request.sha256 or "").lower() or None,
+        "ranges": [],
+        "created_at": time.time(),
+    }
+    session_dir = _upload_session_dir(session["id"])
+    os.makedirs(session_dir, exist_ok=True)
+    with open(os.path.join(session_dir, "data"), "wb") as f:
+        f.truncate(request.size)
+    _save_upload_session(session)
+    logger.info(f"Upload session {session['id']} created for {safe_filename} ({request.size} bytes)")
+    status = _upload_session_status(session)
+    status["chunk_size"] = int(_get_config_setting("uploads", "chunk_size_mb", 8)) * 1024 * 1024
+    return status
+
+@app.put("/upload/sessions/{session_id}")
+async def upload_session_part(session_id: str, offset: int, request: Request):
+    with _upload_sessions_lock:
+        session = _load_upload_session(session_id)
+        if offset < 0 or offset >= session["size"]:
+            raise HTTPException(status_code=416, detail=f"offset must be between 0 and {session['size'] - 1}")
+        # A commit waits until no part is in flight, so it never hashes or moves a file being written.
+        _upload_session_parts[session_id] = _upload_session_parts.get(session_id, 0) + 1
+
+    data_path = os.path.join(_upload_session_dir(session_id), "data")
+    position = offset
+    closed: Optional[HTTPException] = None
+    try:
+        with open(data_path, "r+b") as f:
+            f.seek(offset)
+            async for chunk in request.stream():
+                if position + len(chunk) > session["size"]:
+                    raise HTTPException(status_code=416, detail="Part extends past the declared file size")
+                f.write(chunk)
+                position += len(chunk)
+    finally:
+        # Record whatever reached the disk, so a dropped part resumes from where it stopped.
+        with _upload_sessions_lock:
+            remaining = _upload_session_parts.pop(session_id, 1) - 1
+            if remaining:
+                _upload_session_parts[session_id] = remaining
+            try:
+                session = _load_upload_session(session_id)
+            except HTTPException as e:
+                # Aborted (or expired) while this part was arriving; reported below unless the write failed.
+                closed = e
+            else:
+                if position > offset:
+                    session["ranges"] = _merge_ranges(session["ranges"], offset, position)
+                _save_upload_session(session)
+    if closed is not None:
+        raise HTTPException(status_code=410, detail=f"Upload session closed while this part was being written ({closed.detail})")
+    return _upload_session_status(session)
+
+@app.get("/upload/sessions/{session_id}")
+def get_upload_session(session_id: str):
+    return _upload_session_status(_load_upload_session(session_id))
+
+@app.delete("/upload/sessions/{session_id}")
+def abort_upload_session(session_id: str):
+    with _upload_sessions_lock:
+        _load_upload_session(session_id)
+        shutil.rmtree(_upload_session_dir(session_id), ignore_errors=True)
+        _set_upload_session_state(session_id, "aborted")
+    return {"status": "aborted", "session_id": session_id}
+
+@app.post("/upload/sessions/{session_id}/commit")
+def commit_upload_session(session_id: str, request: UploadCommitRequest):
+    if request.on_duplicate not in UPLOAD_DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"on_duplicate must be one of {', '.join(UPLOAD_DUPLICATE_MODES)}")
+    with _upload_sessions_lock:
+        session = _load_upload_session(session_id)
+        if _upload_session_parts.get(session_id):
+            raise HTTPException(status_code=409, detail="Parts of this upload are still being written")
+        status = _upload_session_status(session)
+        if not status["complete"]:
+            raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "missing": status["missing"]})
+        # New parts and aborts are refused (409) while the file is hashed outside the lock.
+        _set_upload_session_state(session_id, "committing")
+
+    session_dir = _upload_session_dir(session_id)
+    data_path = os.path.join(session_dir, "data")
+    try:
+        file_hash = _file_sha256(data_path)
+        expected = (request.sha256 or session.get("sha256") or "").lower()
+        if not expected:
+            raise HTTPException(status_code=400, detail="sha256 is required to commit an upload")
+        if not file_hash or file_hash != expected:
+            raise HTTPException(status_code=422, detail={"message": "SHA-256 mismatch", "expected": expected, "actual": file_hash})
+        safe_filename, filepath = _unique_document_path(session["filename"])
+        os.replace(data_path, filepath)
+    except Exception:
+        with _upload_sessions_lock:
+            _set_upload_session_state(session_id, None)
+        raise
+    with _upload_sessions_lock:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        _set_upload_session_state(session_id, "committed")
 
-    return {"status": "uploaded", "filename": safe_filename, "original_filename": file.filename, "file_size": file_size}
+    metadata = load_metadata()
+    result = _register_upload(metadata, _content_hash_index(metadata), safe_filename, session["original_filename"], session["doc_type"],
+                              session["size"], file_hash, request.on_duplicate)
+    save_metadata(metadata)
+    logger.info(f"Resumable upload {session_id} committed as {result['filename']} ({session['size']} bytes, {result['status']})")
+
+    if result.pop("process") and not request.skip_processing:
+        job_queue.submit(safe_filename, filepath, session["doc_type"], PRIORITY_INTERACTIVE)
+    return result
 
 @app.post("/start-processing")
 async def start_processing():
     """
     Start processing all documents with 'pending' status in PARALLEL.
 
-    Best Practice: Uses ThreadPoolExecutor to process multiple documents simultaneously
-    rather than sequentially. This is much faster for bulk uploads.
+    Documents are queued at bulk priority on the durable ingestion job queue, whose workers
+    process several documents simultaneously.
 
     This endpoint is used after bulk upload to trigger processing of all uploaded files.
     """
@@ -1731,7 +4964,7 @@ async def start_processing():
     pending_files = [
         (filename, data)
         for filename, data in metadata.items()
-        if data.get("status") == "pending"
+        if data.get("status") == "pending" and not data.get("duplicate_of")
     ]
 
     if not pending_files:
@@ -1740,8 +4973,7 @@ async def start_processing():
 
     logger.info(f"Starting parallel processing of {len(pending_files)} documents")
 
-    # Submit all pending files to thread pool for PARALLEL processing
-    # Best Practice: Process documents in parallel using thread pool
+    # Queue all pending files for PARALLEL processing
     futures = []
     for filename, data in pending_files:
         filepath = os.path.join(DOCUMENTS_DIR, filename)
@@ -1749,9 +4981,8 @@ async def start_processing():
 
         if os.path.exists(filepath):
             logger.info(f"Submitting {filename} for parallel processing (doc_type: {doc_type})")
-            # Submit to thread pool - will process in parallel up to max_workers
-            future = processing_executor.submit(process_document_sync, filename, filepath, doc_type)
-            futures.append((filename, future))
+            job = job_queue.submit(filename, filepath, doc_type, PRIORITY_BULK)
+            futures.append((filename, job))
         else:
             logger.warning(f"File not found, skipping: {filepath}")
             # Mark as error in metadata
@@ -1770,8 +5001,8 @@ async def start_processing():
 @app.post("/reprocess/{filename}")
 async def reprocess_document(filename: str):
     """
-    Reprocess a single document using the parallel processing executor.
-    This allows reprocessing to happen alongside bulk processing operations.
+    Reprocess a single document via the ingestion job queue.
+    User-triggered reprocessing runs at interactive priority, ahead of queued bulk work.
     """
     logger.info(f"=== REPROCESS ENDPOINT CALLED FOR {filename} ===")
     filepath = os.path.join(DOCUMENTS_DIR, filename)
@@ -1789,15 +5020,84 @@ async def reprocess_document(filename: str):
     metadata[filename]["status"] = "processing"
     save_metadata(metadata)
 
-    # Re-run processing using ThreadPoolExecutor for parallel execution
     doc_type = metadata[filename].get("doc_type", "nda")
     logger.info(f"Submitting {filename} for parallel reprocessing (doc_type: {doc_type})")
+    job = job_queue.submit(filename, filepath, doc_type, PRIORITY_INTERACTIVE)
+
+    logger.info(f"Document {filename} submitted to processing queue (job {job['id']})")
+    return {"status": "reprocessing_started", "filename": filename, "job_id": job["id"]}
 
-    # Submit to thread pool - will process in parallel with other documents
-    future = processing_executor.submit(process_document_sync, filename, filepath, doc_type)
+@app.post("/competencies/compare/{filename}")
+def compare_competency_modes(filename: str):
+    """
+    Run competency extraction for one processed document in both full and retrieval mode and
+    return the answers side by side with prompt sizes (does not modify metadata).
+    """
+    metadata = load_metadata()
+    if filename not in metadata:
+        raise HTTPException(status_code=404, detail="File not found")
+    if openai_client is None:
+        raise HTTPException(status_code=500, detail="OpenAI API Key not configured")
+    cached = load_extracted_text(filename, _file_sha256(os.path.join(DOCUMENTS_DIR, filename)))
+    if cached is None or not (cached.get("text") or "").strip():
+        raise HTTPException(status_code=400, detail="No extracted text for this document; reprocess it first")
+    text = cached["text"]
+    doc_type = metadata[filename].get("doc_type", "nda")
+    indexed = bool(metadata[filename].get("text_extracted"))
+    result = {}
+    for mode in ("full", "retrieval"):
+        answers, stats = extract_competencies(filename, doc_type, text, indexed=indexed, mode=mode, batch=False)
+        result[mode] = {"answers": answers, "stats": stats}
+    full_tokens = result["full"]["stats"].get("prompt_tokens_est") or 0
+    retrieval_tokens = result["retrieval"]["stats"].get("prompt_tokens_est") or 0
+    result["token_savings"] = round(1.0 - retrieval_tokens / full_tokens, 4) if full_tokens else None
+    return result
+
+@app.post("/near-duplicates/rebuild")
+def rebuild_near_duplicates():
+    """
+    Compute MinHash signatures for every processed document from its cached extracted text
+    (e.g. documents processed before near-duplicate detection existed) and refresh near_duplicates.
+    """
+    if not _near_duplicates_enabled():
+        raise HTTPException(status_code=400, detail="Near-duplicate detection is disabled (near_duplicates.enabled)")
+    metadata = load_metadata()
+    signatures = {}
+    skipped = []
+    for fname, entry in metadata.items():
+        if not isinstance(entry, dict) or entry.get("status") != "processed" or entry.get("duplicate_of"):
+            continue
+        cached = load_extracted_text(fname, _file_sha256(os.path.join(DOCUMENTS_DIR, fname)))
+        if cached is None:
+            skipped.append(fname)
+            continue
+        signatures[fname] = _document_signature(cached.get("text") or "")
 
-    logger.info(f"Document {filename} submitted to parallel processing queue")
-    return {"status": "reprocessing_started", "filename": filename}
+    # Start from an empty index so signatures of deleted or no longer processed documents (and lists
+    # pointing at them) don't survive the rebuild. Reload so the lists are written against the latest metadata.
+    _get_near_duplicate_index().clear()
+    metadata = load_metadata()
+    for entry in metadata.values():
+        if isinstance(entry, dict):
+            entry.pop("near_duplicates", None)
+    flagged = 0
+    for fname, signature in signatures.items():
+        if fname in metadata and record_near_duplicates(metadata, fname, signature):
+            flagged += 1
+    save_metadata(metadata)
+    return {"indexed": len(signatures), "with_near_duplicates": flagged, "skipped_no_extracted_text": skipped}
+
+@app.get("/jobs")
+def list_jobs():
+    """Ingestion job queue contents, pipeline stage load and OpenAI limiter state for diagnostics."""
+    snapshot = job_queue.snapshot()
+    snapshot["stages"] = _ingestion_pipeline.stats() if _ingestion_pipeline is not None else []
+    snapshot["openai_limiter"] = openai_limiter.stats()
+    if _embedding_batcher is not None:
+        snapshot["embedding_batches"] = {"batches": _embedding_batcher.batches_sent, "inputs": _embedding_batcher.inputs_sent}
+    if _competency_batcher is not None:
+        snapshot["competency_batches"] = _competency_batcher.stats()
+    return snapshot
 
 @app.post("/fix-stuck/{filename}")
 async def fix_stuck_document(filename: str):
@@ -1879,15 +5179,29 @@ async def delete_document(filename: str):
     if os.path.exists(filepath):
         os.remove(filepath)
 
-    # Remove metadata
+    # Remove metadata; aliases of this document become documents of their own and are processed
+    promoted = []
     if filename in metadata:
         del metadata[filename]
+        _forget_near_duplicate(metadata, filename)
+        for fname, entry in metadata.items():
+            if isinstance(entry, dict) and entry.get("duplicate_of") == filename:
+                entry.pop("duplicate_of", None)
+                entry["status"] = "pending"
+                promoted.append((fname, entry.get("doc_type", "nda")))
         save_metadata(metadata)
+    for fname, doc_type in promoted:
+        job_queue.submit(fname, os.path.join(DOCUMENTS_DIR, fname), doc_type, PRIORITY_BULK)
+
+    delete_extracted_text(filename)
+    job_queue.cancel(filename)
+    _get_near_duplicate_index().remove(filename)
 
     # Remove from Vector DB
     try:
         if collection is not None:
             collection.delete(where={"filename": filename})
+            _int8_index.remove_file(filename)
             logger.info(f"Removed {filename} from vector database")
         else:
             logger.warning(f"Collection not initialized, skipping vector DB deletion for {filename}")
@@ -1930,6 +5244,7 @@ async def delete_template(filename: str):
 async def generate_report():
     if not openai_client:
         raise HTTPException(status_code=500, detail="OpenAI API Key not configured")
+    _openai_interactive.set(True)
 
     metadata = load_metadata()
     docs = list(metadata.values())
@@ -2057,12 +5372,18 @@ async def generate_report():
         data_context=email_context
     )
 
-    response = openai_client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+    # Runs off the event loop: the limiter may wait for capacity or a Retry-After.
+    client = openai_client
+    response = await asyncio.to_thread(
+        openai_request,
+        lambda: client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+        ),
+        _estimate_tokens(system_prompt, user_prompt),
     )
 
     return {"report": response.choices[0].message.content}
@@ -2071,6 +5392,8 @@ async def generate_report():
 async def chat(request: ChatRequest):
     if not openai_client:
         raise HTTPException(status_code=500, detail="OpenAI API Key not configured")
+    # Chat draws on the limiter's reserved interactive capacity (query embeddings included).
+    _openai_interactive.set(True)
 
     # 1. Retrieve relevant chunks from Chroma
     # Hybrid Search Approach:
@@ -2246,8 +5569,9 @@ async def chat(request: ChatRequest):
     is_pricing_query = any(word in query_lower for word in ['pay', 'cost', 'price', 'fee', 'charge', 'hour', 'rate', 'per'])
     n_results = 8 if is_pricing_query else 5  # Get more results for pricing queries
 
-    # Run hybrid search with the (possibly expanded) query
-    hybrid_results = hybrid_search_rrf(search_query, collection, n_results=n_results * 2)
+    # Run hybrid search with the (possibly expanded) query. The query embedding may wait on the
+    # OpenAI limiter (Retry-After pause, exhausted reserve), so it runs off the event loop.
+    hybrid_results = await asyncio.to_thread(hybrid_search_rrf, search_query, collection, n_results=n_results * 2)
 
     # 2. Build Context from hybrid search results
     context_text = ""
@@ -2382,9 +5706,15 @@ async def chat(request: ChatRequest):
         logger.info(f"  Total messages: {len(messages)} (1 system + {len(messages)-2} history + 1 current)")
         logger.info(f"=== END LLM REQUEST PREVIEW ===")
 
-    response = openai_client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=messages
+    # Runs off the event loop: the limiter may wait for capacity or a Retry-After.
+    client = openai_client
+    response = await asyncio.to_thread(
+        openai_request,
+        lambda: client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages
+        ),
+        _estimate_tokens(*[m["content"] for m in messages]),
     )
 
     content = response.choices[0].message.content
@@ -2431,6 +5761,8 @@ async def startup_event():
     global rag_init_state, rag_init_error
     cleanup_root_zip_artifacts()
     logger.info("Cleaned up any legacy zip files from repo root")
+    # Hash documents from before upload dedup existed, off the event loop.
+    asyncio.create_task(asyncio.to_thread(backfill_content_hashes))
     # Kick off RAG initialization in a background thread so Uvicorn can start responding immediately.
     # This prevents the Electron UI from appearing "stuck" while heavy imports (chromadb) run.
     if rag_init_state == "not_started":
@@ -2438,7 +5770,7 @@ async def startup_event():
         rag_init_error = None
 
         async def _init_rag_async():
-            global rag_init_state, rag_init_error
+            global rag_init_state, rag_init_error, ocr_warmup_state
             try:
                 ok = await asyncio.to_thread(initialize_openai_client)
                 # Missing API key isn't an error; it simply disables RAG.
@@ -2448,9 +5780,34 @@ async def startup_event():
                 rag_init_error = str(e)
                 logger.error(f"RAG initialization failed: {e}")
 
+            # Start processing only once RAG is initialized, so resumed jobs can index into Chroma.
+            try:
+                job_queue.start()
+                await asyncio.to_thread(_resume_stuck_documents)
+            except Exception as e:
+                logger.error(f"Failed to start ingestion job queue: {e}")
+
+            # Warm OCR only after RAG is up so the two heavy imports don't compete during startup.
+            if ocr_warmup_state == "not_started":
+                if _should_warm_up_ocr():
+                    await asyncio.to_thread(warm_up_ocr)
+                else:
+                    ocr_warmup_state = "skipped"
+
         asyncio.create_task(_init_rag_async())
 
 if __name__ == "__main__":
+    # Required for the spawn-based OCR worker pool in frozen (PyInstaller) builds.
+    import multiprocessing
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == "restore-snapshot":
+        # Offline restore: server restore-snapshot <snapshot_dir> <snapshot_id> <target_dir>
+        if len(sys.argv) != 5:
+            print("Usage: server restore-snapshot <snapshot_dir> <snapshot_id> <target_dir>")
+            sys.exit(2)
+        outcome = restore_snapshot(sys.argv[2], sys.argv[3], sys.argv[4])
+        print(json.dumps(outcome, indent=2))
+        sys.exit(1 if outcome["failed"] else 0)
     print("Starting FastAPI server...")
     port = int(os.environ.get("PORT", 8000))
     # Keep our application logs, but avoid spamming stdout with access logs
@@ -658,8 +658,11 @@ function DocumentsView({ config, documents, refresh, initialPreview, onClearPrev
                     });
 
                     if (response.ok) {
+                        // The backend may store the file under another name (sanitized, "_1" suffix), or
+                        // link a byte-identical upload to an existing document (status "duplicate").
+                        const result = await response.json();
                         setUploadProgress(prev => ({ ...prev, [file.name]: 'uploaded' }));
-                        return { success: true, filename: file.name };
+                        return { success: true, filename: file.name, storedName: result.filename || file.name };
                     } else {
                         setUploadProgress(prev => ({ ...prev, [file.name]: 'error' }));
                         return { success: false, filename: file.name };
@@ -674,6 +677,10 @@ function DocumentsView({ config, documents, refresh, initialPreview, onClearPrev
             // Wait for all uploads to complete
             const uploadResults = await Promise.all(uploadPromises);
             const successfulUploads = uploadResults.filter(r => r.success);
+            const storedNames: Record<string, string> = {};
+            successfulUploads.forEach(r => {
+                storedNames[r.filename] = r.storedName || r.filename;
+            });
             console.log(`[Upload] Completed ${successfulUploads.length}/${filesToUpload.length} uploads`);
 
             if (successfulUploads.length === 0) {
@@ -730,7 +737,7 @@ function DocumentsView({ config, documents, refresh, initialPreview, onClearPrev
                         const statuses: Record<string, string> = {};
 
                         filesToUpload.forEach(file => {
-                            const doc = docs[file.name];
+                            const doc = docs[storedNames[file.name] || file.name];
                             if (!doc) {
                                 // Document not found yet, still processing
                                 allProcessed = false;
@@ -0,0 +1,61 @@
+"""
+Shared pytest setup.
+
+server.py has import-time side effects (config loading, data dirs, FastAPI/MCP app creation) and
+pulls in native extensions that cannot be re-imported within one interpreter. Unit-test modules
+import it inside `patch.dict('sys.modules', ...)`, which would drop it again afterwards, so import
+it once here and let every test module share that instance. Fixtures shared by the unit tests
+live here as well.
+"""
+import copy
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+_CHROMA_MOCKS = {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}
+
+if 'server' not in sys.modules:
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+    _added = [k for k in _CHROMA_MOCKS if k not in sys.modules]
+    sys.modules.update({k: _CHROMA_MOCKS[k] for k in _added})
+    try:
+        import server  # noqa: F401
+    except ImportError:
+        # E2E-only environments (pytest + requests) don't install backend deps; those tests talk HTTP.
+        pass
+    finally:
+        for k in _added:
+            sys.modules.pop(k, None)
+
+
+class MetadataStore:
+    """In-memory stand-in for metadata.json that counts writes."""
+
+    def __init__(self, data=None):
+        self.data = data or {}
+        self.saves = 0
+
+    def load(self):
+        return copy.deepcopy(self.data)
+
+    def save(self, metadata):
+        self.saves += 1
+        self.data = copy.deepcopy(metadata)
+
+
+@pytest.fixture
+def metadata_store():
+    """Patch server.load_metadata/save_metadata with a MetadataStore for the test's duration."""
+    import server
+    store = MetadataStore()
+    with patch.multiple(server, load_metadata=store.load, save_metadata=store.save):
+        yield store
@@ -0,0 +1,122 @@
+"""
+Unit tests for the streaming /backup zip.
+These tests don't require OpenAI or ChromaDB.
+"""
+import pytest
+import sys
+import os
+import io
+import zipfile
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "documents").mkdir()
+    (tmp_path / "documents" / "nda.pdf").write_bytes(b"%PDF-1.4 " + os.urandom(3000))
+    (tmp_path / "documents" / "metadata.json").write_text('{"nda.pdf": {"status": "processed"}}' * 50)
+    (tmp_path / "chroma_db").mkdir()
+    (tmp_path / "chroma_db" / "chroma.sqlite3").write_bytes(b"\0" * 5000)
+    (tmp_path / "GPUCache").mkdir()
+    (tmp_path / "GPUCache" / "data_0").write_bytes(b"locked")
+    return tmp_path
+
+
+class TestStreamingBackup:
+    """Test that the backup zip is streamed, complete and stores compressed files as-is."""
+
+    def test_zip_contents_and_compression(self, data_dir):
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(server.iter_zip_stream(str(data_dir), server.BACKUP_SKIP_DIRS))))
+        assert archive.testzip() is None
+        names = sorted(archive.namelist())
+        assert names == ["chroma_db/chroma.sqlite3", "documents/metadata.json", "documents/nda.pdf"]
+        assert archive.getinfo("documents/nda.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("chroma_db/chroma.sqlite3").compress_type == zipfile.ZIP_DEFLATED
+        assert archive.read("documents/nda.pdf") == (data_dir / "documents" / "nda.pdf").read_bytes()
+
+    def test_output_starts_before_all_files_are_read(self, data_dir):
+        with patch.object(server, 'BACKUP_READ_SIZE', 1024):
+            stream = server.iter_zip_stream(str(data_dir))
+            first = next(stream)
+            assert first.startswith(b"PK")
+            rest = b"".join(stream)
+        assert zipfile.ZipFile(io.BytesIO(first + rest)).testzip() is None
+
+    def test_upload_sessions_and_caches_are_left_out(self, data_dir):
+        (data_dir / "uploads").mkdir()
+        (data_dir / "uploads" / "abc.part").write_bytes(b"\0" * 100)
+        (data_dir / "cache").mkdir()
+        (data_dir / "cache" / "ocr.db").write_bytes(b"cached")
+        with patch.object(server, 'UPLOAD_SESSIONS_DIR', str(data_dir / "uploads")), \
+             patch.object(server, 'CACHE_DIR', str(data_dir / "cache")):
+            stream = server.iter_zip_stream(str(data_dir), server.BACKUP_SKIP_DIRS, server._backup_skip_paths())
+            names = zipfile.ZipFile(io.BytesIO(b"".join(stream))).namelist()
+        assert sorted(names) == ["chroma_db/chroma.sqlite3", "documents/metadata.json", "documents/nda.pdf"]
+
+    def test_read_error_mid_file(self, data_dir):
+        real_open = open
+
+        def flaky_open(path, *args, **kwargs):
+            f = real_open(path, *args, **kwargs)
+            fail_after = {"nda.pdf": 1024, "chroma.sqlite3": 4096}.get(os.path.basename(str(path)))
+            if fail_after:
+                read = f.read
+
+                def failing_read(n=-1):
+                    block = read(n)
+                    if f.tell() > fail_after:
+                        raise OSError("I/O error")
+                    return block
+                f.read = failing_read
+            return f
+
+        # Small files are read whole first, so a failure skips them; a large one is kept but marked incomplete.
+        with patch.object(server, 'BACKUP_BUFFER_SIZE', 4096), patch('builtins.open', flaky_open):
+            data = b"".join(server.iter_zip_stream(str(data_dir)))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert archive.testzip() is None
+        assert "documents/nda.pdf" not in archive.namelist()
+        assert "documents/metadata.json" in archive.namelist()
+        assert archive.read(server.BACKUP_INCOMPLETE_NAME).decode().splitlines() == ["chroma_db/chroma.sqlite3"]
+
+    def test_restore_skips_incomplete_files(self, tmp_path):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            zf.writestr("documents/nda copy.pdf", b"%PDF-1.4 ok")
+            zf.writestr("chroma_db/chroma.sqlite3", b"trunc")
+            zf.writestr(server.BACKUP_INCOMPLETE_NAME, "chroma_db/chroma.sqlite3\n")
+        restored = tmp_path / "restored"
+        with patch.object(server, 'USER_DATA_DIR', str(restored)):
+            response = TestClient(server.app).post("/restore", files={"file": ("backup.zip", buf.getvalue(), "application/zip")})
+        assert response.status_code == 200
+        assert (restored / "documents" / "nda copy.pdf").read_bytes() == b"%PDF-1.4 ok"
+        assert not (restored / "chroma_db" / "chroma.sqlite3").exists()
+        assert not (restored / server.BACKUP_INCOMPLETE_NAME).exists()
+
+    def test_backup_endpoint_streams_zip(self, data_dir):
+        with patch.object(server, 'USER_DATA_DIR', str(data_dir)):
+            response = TestClient(server.app).get("/backup")
+        assert response.status_code == 200
+        assert response.headers["content-disposition"].startswith('attachment; filename="nda_backup_')
+        assert "documents/nda.pdf" in zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
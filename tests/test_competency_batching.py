@@ -0,0 +1,180 @@
+"""
+Unit tests for multi-document competency batching.
+These tests don't require OpenAI or ChromaDB - the batched and single LLM calls are mocked.
+"""
+import pytest
+import sys
+import os
+import json
+import threading
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import CompetencyBatcher
+
+
+QUESTIONS = [{"id": "term", "question": "What is the term of the agreement?"}]
+
+
+def _extract_concurrently(batcher, docs, group_key="nda:q"):
+    results = {}
+    errors = {}
+
+    def run(name, text):
+        try:
+            results[name] = batcher.extract(group_key, QUESTIONS, name, text, 100)
+        except Exception as e:
+            errors[name] = e
+
+    threads = [threading.Thread(target=run, args=doc) for doc in docs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return results, errors
+
+
+class TestCompetencyBatcher:
+    """Test how concurrent extractions are packed and split back."""
+
+    def test_concurrent_documents_share_one_call(self):
+        calls = []
+
+        def send(questions, documents):
+            calls.append([name for name, _ in documents])
+            return {name: {"term": f"{name} term"} for name, _ in documents}, 180
+
+        batcher = CompetencyBatcher(send, max_documents=3, max_wait=2.0)
+        results, errors = _extract_concurrently(batcher, [("a.pdf", "A"), ("b.pdf", "B"), ("c.pdf", "C")])
+
+        assert errors == {}
+        assert len(calls) == 1 and sorted(calls[0]) == ["a.pdf", "b.pdf", "c.pdf"]
+        answers, stats = results["b.pdf"]
+        assert answers == {"term": "b.pdf term"}
+        assert stats["batch_documents"] == 3
+        assert stats["prompt_tokens_est_share"] == 60
+        assert batcher.stats() == {"batches": 1, "documents": 3, "fallbacks": 0, "prompt_tokens_saved_est": 120}
+
+    def test_lone_document_is_sent_alone(self):
+        send = MagicMock()
+        batcher = CompetencyBatcher(send, max_documents=4, max_wait=0.01)
+        assert batcher.extract("nda:q", QUESTIONS, "a.pdf", "A", 100) is None
+        send.assert_not_called()
+
+    def test_missing_document_raises_for_fallback(self):
+        def send(questions, documents):
+            return {"a.pdf": {"term": "1 year"}, "b.pdf": "not an object"}, 150
+
+        batcher = CompetencyBatcher(send, max_documents=2, max_wait=2.0)
+        results, errors = _extract_concurrently(batcher, [("a.pdf", "A"), ("b.pdf", "B")])
+
+        assert results["a.pdf"][0] == {"term": "1 year"}
+        assert isinstance(errors["b.pdf"], ValueError)
+        assert batcher.stats()["fallbacks"] == 1
+
+    def test_groups_are_not_mixed(self):
+        calls = []
+
+        def send(questions, documents):
+            calls.append(documents)
+            return {}, 0
+
+        batcher = CompetencyBatcher(send, max_documents=2, max_wait=0.05)
+        results = {}
+
+        def run(key, name):
+            results[name] = batcher.extract(key, QUESTIONS, name, "text", 10)
+
+        threads = [threading.Thread(target=run, args=("nda:q", "a.pdf")),
+                   threading.Thread(target=run, args=("msa:q", "b.pdf"))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+        assert calls == []
+        assert results == {"a.pdf": None, "b.pdf": None}
+
+    def test_config_changes_apply_to_shared_batcher(self):
+        settings = {"batch_max_documents": 2, "batch_max_chars": 1000, "batch_wait_ms": 100}
+        with patch.object(server, '_competency_batcher', None), \
+             patch.dict(server.config, {"competency_extraction": settings}):
+            batcher = server._get_competency_batcher()
+            assert (batcher.max_documents, batcher.max_chars, batcher.max_wait) == (2, 1000, 0.1)
+            settings.update(batch_max_documents=6, batch_wait_ms=250)
+            assert server._get_competency_batcher() is batcher
+            assert (batcher.max_documents, batcher.max_wait) == (6, 0.25)
+
+
+class TestBatchedExtraction:
+    """Test extract_competencies with batching enabled."""
+
+    def _config(self, **extra):
+        return patch.dict(server.config, {
+            "document_types": {"nda": {"competency_questions": QUESTIONS}},
+            "competency_extraction": dict({"mode": "full", "batch_max_documents": 4, "batch_max_document_chars": 1000}, **extra),
+        })
+
+    def test_failed_batch_falls_back_to_single_call(self):
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=json.dumps({"term": "2 years"})))]
+        batcher = MagicMock()
+        batcher.extract.side_effect = ValueError("unparseable")
+        with self._config(), \
+             patch.object(server, 'openai_client', client), \
+             patch.object(server, '_get_competency_cache', return_value=None), \
+             patch.object(server, '_get_competency_batcher', return_value=batcher), \
+             patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()):
+            answers, stats = server.extract_competencies("a.pdf", "nda", "Term: 2 years.")
+
+        assert answers == {"term": "2 years"}
+        assert stats["batch_fallback"] is True
+        client.chat.completions.create.assert_called_once()
+
+    def test_long_documents_are_not_batched(self):
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content="{}"))]
+        with self._config(batch_max_document_chars=10), \
+             patch.object(server, 'openai_client', client), \
+             patch.object(server, '_get_competency_cache', return_value=None), \
+             patch.object(server, '_get_competency_batcher') as get_batcher, \
+             patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()):
+            server.extract_competencies("a.pdf", "nda", "A much longer contract body.")
+        get_batcher.assert_not_called()
+
+    def test_batch_prompt_keys_documents_by_filename(self):
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=json.dumps({"a.pdf": {}, "b.pdf": {}})))]
+        with patch.object(server, 'openai_client', client), \
+             patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()):
+            results, tokens = server._send_competency_batch(QUESTIONS, [("a.pdf", "Alpha text"), ("b.pdf", "Beta text")])
+
+        prompt = client.chat.completions.create.call_args[1]["messages"][1]["content"]
+        assert "=== DOCUMENT: a.pdf ===\nAlpha text" in prompt
+        assert "- term: What is the term of the agreement?" in prompt
+        assert results == {"a.pdf": {}, "b.pdf": {}}
+        assert tokens > 0
+
+    def test_batch_prompt_comes_from_prompts_file(self, tmp_path):
+        # A prompts.yaml saved before the batch prompt existed still gets it from prompts.default.yaml.
+        (tmp_path / "prompts.yaml").write_text("prompts:\n  chat:\n    system: Custom chat\n")
+        with patch.object(server, 'USER_DATA_DIR', str(tmp_path)):
+            prompts = server.load_prompts_config()["prompts"]
+        assert prompts["chat"]["system"] == "Custom chat"
+        assert "{documents}" in prompts["competency_extraction_batch"]["user"]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
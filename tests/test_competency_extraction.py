@@ -0,0 +1,183 @@
+"""
+Unit tests for competency extraction prompt building (full vs retrieval mode).
+These tests don't require OpenAI or ChromaDB - retrieval and the LLM are mocked.
+"""
+import pytest
+import sys
+import os
+import json
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+
+QUESTIONS = [
+    {"id": "governing_law", "question": "Which state's law governs?"},
+    {"id": "term", "question": "What is the term of the agreement?"},
+]
+LONG_TEXT = "Boilerplate clause. " * 2000  # ~40k chars
+
+
+def _hit(doc, chunk_index):
+    return {"doc": doc, "metadata": {"filename": "long.pdf", "chunk_index": chunk_index}}
+
+
+def _mode(mode, **extra):
+    return patch.dict(server.config, {"competency_extraction": dict({"mode": mode}, **extra)})
+
+
+class TestCompetencyDocumentText:
+    """Test which text goes into the competency prompt."""
+
+    def test_full_mode_truncates(self):
+        with _mode("full", max_document_chars=1000):
+            text, stats = server._competency_document_text("long.pdf", LONG_TEXT, QUESTIONS, indexed=True)
+        assert text == LONG_TEXT[:1000]
+        assert stats["mode"] == "full"
+        assert stats["truncated_chars"] == len(LONG_TEXT) - 1000
+
+    def test_retrieval_mode_sends_excerpts_in_document_order(self):
+        def search(query, col, n_results, where):
+            assert where == {"filename": "long.pdf"}
+            if "law" in query:
+                return [_hit("Governed by Delaware law.", 7), _hit("Signature block.", 9)]
+            return [_hit("Term: three years.", 2), _hit("Governed by Delaware law.", 7)]
+
+        with _mode("retrieval", retrieval_min_chars=100), \
+             patch.object(server, 'collection', MagicMock()), \
+             patch.object(server, 'hybrid_search_rrf', side_effect=search):
+            text, stats = server._competency_document_text("long.pdf", LONG_TEXT, QUESTIONS, indexed=True)
+
+        assert text == "[Excerpt 1]\nTerm: three years.\n\n[Excerpt 2]\nGoverned by Delaware law.\n\n[Excerpt 3]\nSignature block."
+        assert stats["mode"] == "retrieval"
+        assert stats["excerpts"] == 3
+        assert stats["prompt_chars"] < stats["document_chars"]
+
+    def test_retrieval_mode_falls_back_to_full_text(self):
+        with _mode("retrieval", retrieval_min_chars=100000):
+            _, stats = server._competency_document_text("short.pdf", LONG_TEXT, QUESTIONS, indexed=True)
+        assert stats == {"mode": "full", "document_chars": len(LONG_TEXT), "fallback": "short_document", "prompt_chars": len(LONG_TEXT)}
+
+        with _mode("retrieval", retrieval_min_chars=100):
+            _, stats = server._competency_document_text("long.pdf", LONG_TEXT, QUESTIONS, indexed=False)
+        assert stats["fallback"] == "not_indexed"
+
+        with _mode("retrieval", retrieval_min_chars=100), \
+             patch.object(server, 'collection', MagicMock()), \
+             patch.object(server, 'hybrid_search_rrf', side_effect=RuntimeError("chroma down")):
+            text, stats = server._competency_document_text("long.pdf", LONG_TEXT, QUESTIONS, indexed=True)
+        assert stats["fallback"] == "retrieval_error"
+        assert text == LONG_TEXT
+
+
+class TestExtractCompetencies:
+    """Test the LLM call wrapper."""
+
+    def test_answers_and_stats(self):
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=json.dumps({"term": "3 years"})))]
+        client.chat.completions.create.return_value.usage.prompt_tokens = 321
+        with _mode("full"), \
+             patch.dict(server.config, {"document_types": {"nda": {"competency_questions": QUESTIONS}}}), \
+             patch.object(server, 'openai_client', client), \
+             patch.object(server, '_get_competency_cache', return_value=None), \
+             patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()):
+            answers, stats = server.extract_competencies("a.pdf", "nda", "Term: 3 years. " * 10)
+
+        assert answers == {"term": "3 years"}
+        assert stats["mode"] == "full"
+        assert stats["prompt_tokens"] == 321
+        assert "Term: 3 years." in client.chat.completions.create.call_args[1]["messages"][1]["content"]
+
+    def test_unparseable_response_is_not_answered(self):
+        for content in ("not json", json.dumps(["3 years"])):
+            client = MagicMock()
+            client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=content))]
+            with _mode("full"), \
+                 patch.dict(server.config, {"document_types": {"nda": {"competency_questions": QUESTIONS}}}), \
+                 patch.object(server, 'openai_client', client), \
+                 patch.object(server, '_get_competency_cache', return_value=None), \
+                 patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()):
+                answers, stats = server.extract_competencies("a.pdf", "nda", "Term: 3 years.")
+
+            assert answers == {}
+            assert "llm_seconds" not in stats
+            assert server._competency_answered(stats) is False
+
+    def test_no_client_returns_empty(self):
+        with patch.dict(server.config, {"document_types": {"nda": {"competency_questions": QUESTIONS}}}), \
+             patch.object(server, 'openai_client', None):
+            assert server.extract_competencies("a.pdf", "nda", "text") == ({}, {})
+
+
+
+class TestCompetencyCache:
+    """Test that identical extractions are served from the competency cache."""
+
+    def _client(self, answers):
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=json.dumps(answers)))]
+        return client
+
+    def test_duplicate_text_skips_model(self, tmp_path):
+        import diskcache
+
+        cache = diskcache.Cache(str(tmp_path / "competencies"))
+        client = self._client({"term": "3 years"})
+        try:
+            with _mode("full"), \
+                 patch.dict(server.config, {"document_types": {"nda": {"competency_questions": QUESTIONS}}}), \
+                 patch.object(server, 'openai_client', client), \
+                 patch.object(server, '_get_competency_cache', return_value=cache), \
+                 patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()):
+                first, first_stats = server.extract_competencies("NDA.pdf", "nda", "Term: 3 years.")
+                second, second_stats = server.extract_competencies("NDA_1.pdf", "nda", "Term: 3 years.")
+                assert client.chat.completions.create.call_count == 1
+                assert first == second == {"term": "3 years"}
+                assert first_stats["cache"] == "miss" and second_stats["cache"] == "hit"
+                assert server._competency_answered(second_stats)
+
+                # Different text, questions or model are different keys.
+                server.extract_competencies("other.pdf", "nda", "Term: 5 years.")
+                server.extract_competencies("NDA.pdf", "nda", "Term: 3 years.", questions=QUESTIONS[:1])
+                with patch.object(server, 'LLM_MODEL', "gpt-4o-mini"):
+                    server.extract_competencies("NDA.pdf", "nda", "Term: 3 years.")
+                assert client.chat.completions.create.call_count == 4
+        finally:
+            cache.close()
+
+    def test_failed_call_not_cached(self, tmp_path):
+        import diskcache
+
+        cache = diskcache.Cache(str(tmp_path / "competencies"))
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content="not json"))]
+        try:
+            with _mode("full"), \
+                 patch.dict(server.config, {"document_types": {"nda": {"competency_questions": QUESTIONS}}}), \
+                 patch.object(server, 'openai_client', client), \
+                 patch.object(server, '_get_competency_cache', return_value=cache), \
+                 patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()):
+                assert server.extract_competencies("a.pdf", "nda", "text")[0] == {}
+                assert server.extract_competencies("a.pdf", "nda", "text")[0] == {}
+            assert client.chat.completions.create.call_count == 2
+            assert list(cache) == []
+        finally:
+            cache.close()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
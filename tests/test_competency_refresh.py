@@ -0,0 +1,160 @@
+"""
+Unit tests for incremental competency re-extraction after config changes.
+These tests don't require OpenAI or ChromaDB - metadata, the job queue and the LLM are mocked.
+"""
+import pytest
+import sys
+import os
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+
+LAW = {"id": "governing_law", "question": "Which state's law governs?"}
+TERM = {"id": "term", "question": "What is the term of the agreement?"}
+TERM_V2 = {"id": "term", "question": "What is the term, in months?"}
+PARTY = {"id": "parties", "question": "Who are the parties?"}
+
+
+def _config(*questions):
+    return {"document_types": {"nda": {"competency_questions": list(questions)}}}
+
+
+class TestCompetencyChanges:
+    """Test how stale and removed questions are detected."""
+
+    def test_changed_added_and_removed(self):
+        entry = {"competency_question_hashes": server._question_hashes([LAW, TERM])}
+        stale, removed = server._competency_changes(entry, [LAW, TERM_V2, PARTY])
+        assert [q["id"] for q in stale] == ["term", "parties"]
+        assert removed == []
+
+        stale, removed = server._competency_changes(entry, [LAW])
+        assert stale == []
+        assert removed == ["term"]
+
+    def test_hash_ignores_key_order(self):
+        assert server._question_hash({"id": "a", "question": "q"}) == server._question_hash({"question": "q", "id": "a"})
+
+
+class TestScheduleRefresh:
+    """Test which documents get a competencies job when config.yaml is saved."""
+
+    def test_legacy_documents_baseline_from_previous_config(self, metadata_store):
+        metadata_store.data = {
+            "a.pdf": {"filename": "a.pdf", "doc_type": "nda", "status": "processed"},
+            "b.pdf": {"filename": "b.pdf", "doc_type": "nda", "status": "processing"},
+        }
+        queue = MagicMock()
+        with patch.object(server, 'job_queue', queue), \
+             patch.object(server, 'openai_client', MagicMock()), \
+             patch.object(server, 'config', _config(LAW, TERM_V2)):
+            assert server.schedule_competency_refresh(_config(LAW, TERM)) == 1
+
+        queue.submit.assert_called_once()
+        args, kwargs = queue.submit.call_args
+        assert args[0] == "a.pdf" and kwargs["kind"] == "competencies"
+        assert metadata_store.data["a.pdf"]["competency_question_hashes"] == server._question_hashes([LAW, TERM])
+
+    def test_unchanged_questions_queue_nothing(self, metadata_store):
+        metadata_store.data = {"a.pdf": {"doc_type": "nda", "status": "processed",
+                                         "competency_question_hashes": server._question_hashes([LAW])}}
+        queue = MagicMock()
+        with patch.object(server, 'job_queue', queue), \
+             patch.object(server, 'config', _config(LAW)):
+            assert server.schedule_competency_refresh(_config(LAW)) == 0
+        queue.submit.assert_not_called()
+
+
+class TestRefreshCompetencies:
+    """Test the partial re-extraction job handler."""
+
+    def _entry(self):
+        return {"filename": "a.pdf", "doc_type": "nda", "status": "processed", "text_extracted": True,
+                "competency_answers": {"governing_law": "Delaware", "term": "2 years"},
+                "competency_question_hashes": server._question_hashes([LAW, TERM])}
+
+    def test_only_changed_questions_are_asked(self, metadata_store):
+        metadata_store.data = {"a.pdf": self._entry()}
+        with patch.object(server, 'config', _config(LAW, TERM_V2, PARTY)), \
+             patch.object(server, '_file_sha256', return_value="abc"), \
+             patch.object(server, 'load_extracted_text', return_value={"text": "Full NDA text"}), \
+             patch.object(server, 'extract_competencies',
+                          return_value=({"term": 24, "parties": "Acme, Beta"}, {"mode": "full", "llm_seconds": 1.0})) as extract:
+            assert server.refresh_competencies_sync("a.pdf", "/docs/a.pdf", "nda") is True
+
+        asked = extract.call_args.kwargs["questions"]
+        assert [q["id"] for q in asked] == ["term", "parties"]
+        entry = metadata_store.data["a.pdf"]
+        assert entry["competency_answers"] == {"governing_law": "Delaware", "term": 24, "parties": "Acme, Beta"}
+        assert entry["competency_question_hashes"] == server._question_hashes([LAW, TERM_V2, PARTY])
+        assert entry["competency_extraction"]["refreshed_questions"] == ["term", "parties"]
+
+    def test_removed_questions_drop_answers_without_llm_call(self, metadata_store):
+        metadata_store.data = {"a.pdf": self._entry()}
+        with patch.object(server, 'config', _config(LAW)), \
+             patch.object(server, 'extract_competencies') as extract:
+            assert server.refresh_competencies_sync("a.pdf", "/docs/a.pdf", "nda") is True
+
+        extract.assert_not_called()
+        assert metadata_store.data["a.pdf"]["competency_answers"] == {"governing_law": "Delaware"}
+        assert list(metadata_store.data["a.pdf"]["competency_question_hashes"]) == ["governing_law"]
+
+    def test_failed_call_keeps_hashes_stale(self, metadata_store):
+        metadata_store.data = {"a.pdf": self._entry()}
+        with patch.object(server, 'config', _config(LAW, TERM_V2)), \
+             patch.object(server, '_file_sha256', return_value="abc"), \
+             patch.object(server, 'load_extracted_text', return_value={"text": "Full NDA text"}), \
+             patch.object(server, 'extract_competencies', return_value=({}, {"mode": "full"})):
+            assert server.refresh_competencies_sync("a.pdf", "/docs/a.pdf", "nda") is False
+
+        assert metadata_store.data["a.pdf"]["competency_answers"]["term"] == "2 years"
+        assert metadata_store.data["a.pdf"]["competency_question_hashes"] == server._question_hashes([LAW, TERM])
+
+    def test_invalid_json_response_keeps_hashes_stale(self, metadata_store):
+        metadata_store.data = {"a.pdf": self._entry()}
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content="{not json"))]
+        with patch.object(server, 'config', dict(_config(LAW, TERM_V2), competency_extraction={"mode": "full"})), \
+             patch.object(server, 'openai_client', client), \
+             patch.object(server, '_get_competency_cache', return_value=None), \
+             patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()), \
+             patch.object(server, '_file_sha256', return_value="abc"), \
+             patch.object(server, 'load_extracted_text', return_value={"text": "Full NDA text"}):
+            assert server.refresh_competencies_sync("a.pdf", "/docs/a.pdf", "nda") is False
+
+        client.chat.completions.create.assert_called_once()
+        assert metadata_store.data["a.pdf"]["competency_answers"]["term"] == "2 years"
+        assert metadata_store.data["a.pdf"]["competency_question_hashes"] == server._question_hashes([LAW, TERM])
+
+
+class TestJobKinds:
+    """Test that competency jobs share the queue with full processing jobs."""
+
+    def test_process_job_covers_competency_job(self, tmp_path):
+        q = server.IngestionJobQueue(str(tmp_path / "jobs.json"), MagicMock(return_value=True),
+                                     handlers={"competencies": MagicMock(return_value=True)})
+        process = q.submit("a.pdf", "/docs/a.pdf", "nda")
+        assert q.submit("a.pdf", "/docs/a.pdf", "nda", kind="competencies")["id"] == process["id"]
+
+        refresh = q.submit("b.pdf", "/docs/b.pdf", "nda", kind="competencies")
+        assert refresh["kind"] == "competencies"
+        assert q.submit("b.pdf", "/docs/b.pdf", "nda")["id"] != refresh["id"]
+        assert q.has_active_job("b.pdf", "process") is True
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
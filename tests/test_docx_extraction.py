@@ -0,0 +1,94 @@
+"""
+Unit tests for the streaming DOCX extractor.
+These tests build small DOCX zips by hand - no python-docx, OpenAI or ChromaDB required.
+"""
+import pytest
+import sys
+import os
+import zipfile
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def _p(text):
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def _write_docx(path, body, headers=None, footers=None):
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("word/document.xml", f"<w:document {W}><w:body>{body}</w:body></w:document>")
+        for i, h in enumerate(headers or [], start=1):
+            zf.writestr(f"word/header{i}.xml", f"<w:hdr {W}>{h}</w:hdr>")
+        for i, f in enumerate(footers or [], start=1):
+            zf.writestr(f"word/footer{i}.xml", f"<w:ftr {W}>{f}</w:ftr>")
+    return str(path)
+
+
+class TestDocxExtraction:
+    """Test paragraphs, tables, headers and footers are extracted in order."""
+
+    def test_paragraphs_and_runs(self, tmp_path):
+        body = (
+            "<w:p><w:r><w:t>This Agreement is made between </w:t></w:r><w:r><w:t>Acme Corp</w:t></w:r></w:p>"
+            + _p("and Beta LLC.")
+        )
+        pages = server.extract_docx_pages(_write_docx(tmp_path / "nda.docx", body))
+        assert len(pages) == 1
+        assert pages[0]["source"] == "native"
+        assert pages[0]["text"] == "This Agreement is made between Acme Corp\nand Beta LLC."
+
+    def test_tables_become_rows(self, tmp_path):
+        body = (
+            _p("Pricing:")
+            + "<w:tbl>"
+            + "<w:tr><w:tc>" + _p("Service") + "</w:tc><w:tc>" + _p("Rate") + "</w:tc></w:tr>"
+            + "<w:tr><w:tc>" + _p("Weeding") + "</w:tc><w:tc>" + _p("$55.00 per man hour") + "</w:tc></w:tr>"
+            + "</w:tbl>"
+            + _p("End of schedule.")
+        )
+        text = server.extract_docx_pages(_write_docx(tmp_path / "pricing.docx", body))[0]["text"]
+        assert text.splitlines() == ["Pricing:", "Service | Rate", "Weeding | $55.00 per man hour", "End of schedule."]
+
+    def test_headers_deduplicated_and_footers_last(self, tmp_path):
+        path = _write_docx(
+            tmp_path / "hdr.docx",
+            _p("Body text."),
+            headers=[_p("CONFIDENTIAL"), _p("CONFIDENTIAL")],
+            footers=[_p("Page footer")],
+        )
+        text = server.extract_docx_pages(path)[0]["text"]
+        assert text.splitlines() == ["CONFIDENTIAL", "Body text.", "Page footer"]
+
+    def test_invalid_docx_returns_no_pages(self, tmp_path):
+        bad = tmp_path / "bad.docx"
+        bad.write_bytes(b"not a zip")
+        assert server.extract_docx_pages(str(bad)) == []
+
+    def test_dispatch_by_extension(self, tmp_path):
+        path = _write_docx(tmp_path / "Contract.DOCX", _p("Hello"))
+        with patch.object(server, 'extract_pdf_pages') as pdf:
+            pages = server.extract_document_pages(path)
+        pdf.assert_not_called()
+        assert pages[0]["text"] == "Hello"
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,128 @@
+"""
+Unit tests for cross-document embedding batching.
+These tests don't require OpenAI or ChromaDB - the embedding function is a stub.
+"""
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import EmbeddingBatcher
+
+
+class RecordingEmbedder:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self.lock:
+            self.calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+
+class TestEmbeddingBatcher:
+    """Test coalescing, limits, deadlines and error propagation."""
+
+    def test_concurrent_documents_share_one_request(self):
+        embedder = RecordingEmbedder()
+        batcher = EmbeddingBatcher(embedder, max_inputs=100, max_wait=0.2)
+        results = {}
+
+        def job(name, texts):
+            results[name] = batcher.embed(texts)
+
+        threads = [threading.Thread(target=job, args=(f"doc{i}", ["x" * (i + 1)] * 3)) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        assert len(embedder.calls) == 1
+        assert len(embedder.calls[0]) == 15
+        for i in range(5):
+            assert results[f"doc{i}"] == [[float(i + 1)]] * 3
+
+    def test_full_batch_is_sent_without_waiting_for_deadline(self):
+        embedder = RecordingEmbedder()
+        batcher = EmbeddingBatcher(embedder, max_inputs=4, max_wait=10.0)
+        start = time.monotonic()
+        assert len(batcher.embed(["a", "b", "c", "d"])) == 4
+        assert time.monotonic() - start < 1.0
+
+    def test_large_document_is_split_across_requests(self):
+        embedder = RecordingEmbedder()
+        batcher = EmbeddingBatcher(embedder, max_inputs=3, max_wait=0.0)
+        vectors = batcher.embed([str(i) * (i + 1) for i in range(7)])
+        assert vectors == [[float(i + 1)] for i in range(7)]
+        assert all(len(c) <= 3 for c in embedder.calls)
+        assert sum(len(c) for c in embedder.calls) == 7
+
+    def test_token_limit_bounds_a_request(self):
+        embedder = RecordingEmbedder()
+        batcher = EmbeddingBatcher(embedder, max_inputs=100, max_tokens=300, max_wait=0.0)
+        batcher.embed(["x" * 800] * 4)  # ~201 estimated tokens each
+        assert all(len(c) == 1 for c in embedder.calls)
+
+    def test_single_upload_flushes_on_deadline(self):
+        embedder = RecordingEmbedder()
+        batcher = EmbeddingBatcher(embedder, max_inputs=1000, max_wait=0.05)
+        start = time.monotonic()
+        batcher.embed(["only chunk"])
+        elapsed = time.monotonic() - start
+        assert 0.04 <= elapsed < 1.0
+
+    def test_config_changes_apply_to_shared_batcher(self):
+        settings = {"embed_batch_size": 64, "embed_batch_tokens": 5000, "embed_batch_wait_ms": 100}
+        with patch.object(server, '_embedding_batcher', None), \
+             patch.dict(server.config, {"processing": settings, "api": {"tokens_per_minute": 0}}):
+            batcher = server._get_embedding_batcher()
+            assert (batcher.max_inputs, batcher.max_tokens, batcher.max_wait) == (64, 5000, 0.1)
+            settings.update(embed_batch_size=16, embed_batch_wait_ms=20)
+            assert server._get_embedding_batcher() is batcher
+            assert (batcher.max_inputs, batcher.max_wait) == (16, 0.02)
+
+    def test_errors_reach_every_waiting_caller(self):
+        batcher = EmbeddingBatcher(MagicMock(side_effect=RuntimeError("429")), max_wait=0.0)
+        with pytest.raises(RuntimeError):
+            batcher.embed(["a"])
+
+
+class TestIndexDocumentEmbeddings:
+    """Test that indexing hands precomputed vectors to Chroma."""
+
+    def test_upsert_receives_batched_embeddings(self):
+        collection = MagicMock()
+        collection.get.return_value = {"ids": []}
+        with patch.object(server, 'collection', collection), \
+             patch.object(server, 'embed_chunks', return_value=[[1.0], [2.0]]):
+            assert server.index_document("a.pdf", "some text", chunks=["c1", "c2"]) is True
+        assert collection.upsert.call_args[1]["embeddings"] == [[1.0], [2.0]]
+
+    def test_embedding_failure_keeps_existing_chunks(self):
+        collection = MagicMock()
+        with patch.object(server, 'collection', collection), \
+             patch.object(server, 'embed_chunks', side_effect=RuntimeError("api down")):
+            with pytest.raises(RuntimeError):
+                server.index_document("a.pdf", "some text", chunks=["c1"])
+        collection.delete.assert_not_called()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,128 @@
+"""
+Unit tests for embedding provider selection.
+These tests don't require OpenAI or ChromaDB - Chroma is mocked.
+"""
+import pytest
+import sys
+import os
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import _hashing_embed
+
+
+def _embeddings(**settings):
+    return patch.dict(server.config, {"embeddings": settings, "rag": {"collection_name": "nda_documents"}})
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+class TestHashingEmbeddings:
+    """Test the offline hashing stand-in."""
+
+    def test_deterministic_and_normalized(self):
+        a, b = _hashing_embed(["Mutual NDA governed by Delaware law"] * 2, 256)
+        assert a == b
+        assert len(a) == 256
+        assert abs(_cosine(a, a) - 1.0) < 1e-9
+
+    def test_related_texts_score_higher(self):
+        query, related, unrelated = _hashing_embed([
+            "governing law of the agreement",
+            "This agreement is governed by the law of Delaware",
+            "Pricing schedule for consulting services",
+        ], 512)
+        assert _cosine(query, related) > _cosine(query, unrelated)
+
+    def test_empty_text(self):
+        assert _hashing_embed([""], 16) == [[0.0] * 16]
+
+
+class TestProviderSelection:
+    """Test provider tags and per-provider collections."""
+
+    def test_default_openai_keeps_existing_collection(self):
+        with _embeddings(provider="openai"):
+            assert server._get_embedding_provider_tag() == "openai:text-embedding-3-small"
+            assert server._get_active_collection_name() == "nda_documents"
+
+    def test_other_providers_get_their_own_collection(self):
+        with _embeddings(provider="hashing", hashing_dimensions=256):
+            assert server._get_active_collection_name() == "nda_documents__hashing-256"
+        with _embeddings(provider="local"):
+            assert server._get_active_collection_name() == "nda_documents__local-onnx-all-MiniLM-L6-v2"
+        with _embeddings(provider="openai", openai_model="text-embedding-3-large"):
+            assert server._get_active_collection_name() == "nda_documents__openai-text-embedding-3-large"
+
+    def test_unknown_provider_falls_back_to_openai(self):
+        with _embeddings(provider="word2vec"):
+            assert server._get_embedding_provider() == "openai"
+
+    def test_hashing_provider_works_without_api_key(self):
+        chroma = MagicMock()
+        chroma_client = MagicMock()
+        chroma.PersistentClient.return_value = chroma_client
+        col = MagicMock()
+        col.metadata = {"embedding_provider": "hashing:64"}
+        col.count.return_value = 3
+        chroma_client.get_or_create_collection.return_value = col
+
+        with _embeddings(provider="hashing", hashing_dimensions=64), \
+             patch.object(server, 'get_api_key', return_value=None), \
+             patch.object(server, '_ensure_chromadb_modules', return_value=(chroma, MagicMock())), \
+             patch.object(server, 'chroma_client', None), \
+             patch.object(server, 'collection', None), \
+             patch.object(server, 'embedding_fn', None), \
+             patch.object(server, 'openai_client', None):
+            assert server.initialize_openai_client() is True
+            assert server.collection is col
+            assert len(server.embedding_fn(["hello"])[0]) == 64
+            assert server.openai_client is None
+
+        kwargs = chroma_client.get_or_create_collection.call_args[1]
+        assert kwargs["name"] == "nda_documents__hashing-64"
+        assert kwargs["metadata"] == {"embedding_provider": "hashing:64"}
+
+    def test_refuses_collection_tagged_with_another_provider(self):
+        chroma = MagicMock()
+        col = MagicMock()
+        col.metadata = {"embedding_provider": "local:onnx-all-MiniLM-L6-v2"}
+        chroma.PersistentClient.return_value.get_or_create_collection.return_value = col
+
+        with _embeddings(provider="hashing", hashing_dimensions=64), \
+             patch.object(server, 'get_api_key', return_value=None), \
+             patch.object(server, '_ensure_chromadb_modules', return_value=(chroma, MagicMock())), \
+             patch.object(server, 'chroma_client', None), \
+             patch.object(server, 'collection', None), \
+             patch.object(server, 'embedding_fn', None), \
+             patch.object(server, 'openai_client', None):
+            assert server.initialize_openai_client() is False
+            assert server.collection is None
+
+    def test_openai_provider_without_key_disables_rag(self):
+        with _embeddings(provider="openai"), \
+             patch.object(server, 'get_api_key', return_value=None), \
+             patch.object(server, 'collection', MagicMock()), \
+             patch.object(server, 'embedding_fn', MagicMock()), \
+             patch.object(server, 'openai_client', None):
+            assert server.initialize_openai_client() is False
+            assert server.collection is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
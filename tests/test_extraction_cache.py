@@ -0,0 +1,91 @@
+"""
+Unit tests for the extracted-text cache used to skip re-extraction on reprocess.
+These tests don't require OCR, OpenAI or ChromaDB.
+"""
+import pytest
+import sys
+import os
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+
+PAGES = [
+    {"page": 1, "text": "Native first page", "source": "native"},
+    {"page": 2, "text": "Scanned signature", "source": "ocr", "ocr": {"dpi": 150, "confidence": 0.9, "blank": False}},
+    {"page": 3, "text": "", "source": "native"},
+]
+ONE_PAGE = [{"page": 1, "source": "native", "start": 0, "end": 4}]
+
+
+class TestPagesToText:
+    """Test page joining and per-page offsets."""
+
+    def test_offsets_point_at_page_text(self):
+        text, offsets = server._pages_to_text(PAGES)
+        for page, off in zip(PAGES, offsets):
+            assert text[off["start"]:off["end"]] == page["text"]
+        assert "--- Page 2 ---" in text
+        assert offsets[1]["ocr"]["dpi"] == 150
+        assert server._ocr_page_stats(offsets) == [{"page": 2, "dpi": 150, "confidence": 0.9, "blank": False}]
+
+
+class TestExtractedTextCache:
+    """Test that cached text is reused only for identical content and extractor."""
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path):
+        with patch.object(server, 'EXTRACTED_TEXT_DIR', str(tmp_path / ".extracted")):
+            yield
+
+    def test_round_trip(self):
+        text, offsets = server._pages_to_text(PAGES)
+        server.save_extracted_text("nda.pdf", "hash1", text, offsets)
+
+        cached = server.load_extracted_text("nda.pdf", "hash1")
+        assert cached is not None
+        assert cached["text"] == text
+        assert cached["pages"] == offsets
+
+    def test_changed_content_is_a_miss(self):
+        server.save_extracted_text("nda.pdf", "hash1", "text", ONE_PAGE)
+        assert server.load_extracted_text("nda.pdf", "hash2") is None
+        assert server.load_extracted_text("nda.pdf", None) is None
+
+    def test_extractor_change_is_a_miss(self):
+        server.save_extracted_text("nda.pdf", "hash1", "text", ONE_PAGE)
+        with patch.object(server, 'EXTRACTOR_VERSION', server.EXTRACTOR_VERSION + 1):
+            assert server.load_extracted_text("nda.pdf", "hash1") is None
+
+    def test_pages_missing_ocr_are_not_cached(self):
+        pages = [{"page": 1, "text": "Native cover", "source": "native"},
+                 {"page": 2, "text": "", "source": "native", "ocr_missing": True}]
+        text, offsets = server._pages_to_text(pages)
+        assert offsets[1]["ocr_missing"] is True
+        server.save_extracted_text("nda.pdf", "hash1", text, offsets)
+        assert server.load_extracted_text("nda.pdf", "hash1") is None
+
+        server.save_extracted_text("nda.pdf", "hash1", "", [])
+        assert server.load_extracted_text("nda.pdf", "hash1") is None
+
+    def test_delete(self):
+        server.save_extracted_text("nda.pdf", "hash1", "text", ONE_PAGE)
+        server.delete_extracted_text("nda.pdf")
+        assert server.load_extracted_text("nda.pdf", "hash1") is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,180 @@
+"""
+Unit tests for the staged ingestion pipeline.
+These tests don't require OpenAI or ChromaDB - stage functions are stubs.
+"""
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import IngestionPipeline
+
+
+class TestIngestionPipeline:
+    """Test stage ordering, early exit, error handling and stage overlap."""
+
+    def test_document_passes_through_all_stages_in_order(self):
+        seen = []
+
+        def stage(name):
+            def fn(ctx):
+                seen.append((ctx["filename"], name))
+                return True
+            return fn
+
+        pipeline = IngestionPipeline([(n, stage(n), 1) for n in ("a", "b", "c")])
+        assert pipeline.submit("doc.pdf", "/x/doc.pdf", "nda").result(timeout=5) is True
+        assert seen == [("doc.pdf", "a"), ("doc.pdf", "b"), ("doc.pdf", "c")]
+        assert [s["completed"] for s in pipeline.stats()] == [1, 1, 1]
+
+    def test_stage_returning_false_finishes_document_early(self):
+        later = MagicMock(return_value=True)
+        pipeline = IngestionPipeline([("extract", lambda ctx: False, 1), ("embed", later, 1)])
+        assert pipeline.submit("empty.pdf", "/x/empty.pdf", "nda").result(timeout=5) is True
+        later.assert_not_called()
+
+    def test_stage_error_marks_document_as_error(self):
+        def boom(ctx):
+            raise RuntimeError("bad pdf")
+
+        with patch.object(server, '_mark_processing_error') as mark_error:
+            pipeline = IngestionPipeline([("extract", boom, 1), ("embed", MagicMock(), 1)])
+            assert pipeline.submit("bad.pdf", "/x/bad.pdf", "nda").result(timeout=5) is False
+        assert mark_error.call_args[0][0] == "bad.pdf"
+
+    def test_stages_overlap_across_documents(self):
+        """While one document is in the slow network stage, the next one is being extracted."""
+        events = []
+        lock = threading.Lock()
+
+        def record(name, delay):
+            def fn(ctx):
+                with lock:
+                    events.append((name, "start", ctx["filename"], time.time()))
+                time.sleep(delay)
+                with lock:
+                    events.append((name, "end", ctx["filename"], time.time()))
+                return True
+            return fn
+
+        pipeline = IngestionPipeline([("extract", record("extract", 0.05), 1), ("llm", record("llm", 0.1), 1)])
+        futures = [pipeline.submit(f"doc{i}.pdf", "/x", "nda") for i in range(3)]
+        assert all(f.result(timeout=5) for f in futures)
+
+        llm_doc0 = [e for e in events if e[0] == "llm" and e[2] == "doc0.pdf"]
+        extract_doc1 = [e for e in events if e[0] == "extract" and e[2] == "doc1.pdf"]
+        # doc1 extraction started before doc0's LLM stage finished.
+        assert extract_doc1[0][3] < llm_doc0[1][3]
+
+    def test_bounded_queue_applies_backpressure(self):
+        release = threading.Event()
+
+        def blocked(ctx):
+            release.wait(timeout=5)
+            return True
+
+        pipeline = IngestionPipeline([("extract", blocked, 1)], queue_size=1)
+        pipeline.submit("doc0.pdf", "/x", "nda")  # taken by the worker
+        time.sleep(0.05)
+        pipeline.submit("doc1.pdf", "/x", "nda")  # fills the queue
+
+        submitted = threading.Event()
+        threading.Thread(target=lambda: (pipeline.submit("doc2.pdf", "/x", "nda"), submitted.set()), daemon=True).start()
+        assert not submitted.wait(timeout=0.1)
+        release.set()
+        assert submitted.wait(timeout=5)
+
+
+class TestPipelineAutoscaling:
+    """Test the worker-count controller (ticks are driven by hand)."""
+
+    def _saturated_stage(self, io_bound=True, max_workers=4):
+        release = threading.Event()
+
+        def slow(ctx):
+            release.wait(timeout=5)
+            return True
+
+        pipeline = IngestionPipeline([("llm", slow, 1, io_bound)], queue_size=10,
+                                     min_workers=1, max_workers=max_workers, scale_interval=1.0)
+        for i in range(4):
+            pipeline.submit(f"doc{i}.pdf", "/x", "nda")
+        time.sleep(0.05)
+        pipeline.stages[0]["latency"] = 2.0
+        return pipeline, release
+
+    def test_grows_when_backlog_outlasts_interval(self):
+        pipeline, release = self._saturated_stage()
+        try:
+            pipeline.autoscale_tick()
+            assert pipeline.stats()[0]["workers"] == 2
+        finally:
+            release.set()
+
+    def test_rate_limit_halves_and_blocks_growth(self):
+        pipeline, release = self._saturated_stage()
+        try:
+            pipeline.resize(0, 4)
+            pipeline.note_rate_limited("llm")
+            pipeline.autoscale_tick()
+            assert pipeline.stats()[0]["workers"] == 2
+            # Still backed up, but within the 429 cooldown: no growth.
+            pipeline.autoscale_tick()
+            assert pipeline.stats()[0]["workers"] == 2
+        finally:
+            release.set()
+
+    def test_idle_stage_shrinks_to_min(self):
+        pipeline = IngestionPipeline([("llm", lambda ctx: True, 3, True)], min_workers=1, max_workers=4)
+        pipeline.autoscale_tick()
+        assert pipeline.stats()[0]["workers"] == 3
+        pipeline.autoscale_tick()
+        assert pipeline.stats()[0]["workers"] == 2
+
+    def test_cpu_stage_capped_by_core_count(self):
+        with patch.object(server.os, 'cpu_count', return_value=2):
+            pipeline = IngestionPipeline([("extract", lambda ctx: True, 0, False)], min_workers=1, max_workers=16)
+        assert pipeline.stats()[0]["max_workers"] == 2
+        assert pipeline.stats()[0]["workers"] == 1
+
+    def test_rate_limit_error_detection(self):
+        err = RuntimeError("Error code: 429 - Rate limit reached")
+        assert server._is_rate_limit_error(err) is True
+        assert server._is_rate_limit_error(RuntimeError("connection reset")) is False
+
+
+class TestProcessDocumentSync:
+    """Test the job queue entry point into the pipeline."""
+
+    def test_waits_on_pipeline_without_event_loop(self):
+        from concurrent.futures import Future
+
+        done = Future()
+        done.set_result(True)
+        pipeline = MagicMock()
+        pipeline.submit.return_value = done
+        with patch.object(server, '_get_ingestion_pipeline', return_value=pipeline), \
+             patch.object(server.asyncio, 'new_event_loop') as new_loop:
+            assert server.process_document_sync("doc.pdf", "/x/doc.pdf", "nda") is True
+        new_loop.assert_not_called()
+        pipeline.submit.assert_called_once_with("doc.pdf", "/x/doc.pdf", "nda")
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
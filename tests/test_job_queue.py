@@ -0,0 +1,156 @@
+"""
+Unit tests for the persistent ingestion job queue.
+These tests don't require OpenAI or ChromaDB - the processing handler is a stub.
+"""
+import pytest
+import sys
+import os
+import json
+import threading
+import time
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import IngestionJobQueue, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _statuses(queue):
+    return {j["filename"]: j["status"] for j in queue.snapshot()["jobs"]}
+
+
+class TestJobQueueOrdering:
+    """Test priorities and dedupe without running workers."""
+
+    def test_interactive_jobs_run_before_bulk(self, tmp_path):
+        q = IngestionJobQueue(str(tmp_path / "jobs.json"), handler=MagicMock(), workers=1)
+        q.submit("bulk1.pdf", "/x/bulk1.pdf", "nda", PRIORITY_BULK)
+        q.submit("bulk2.pdf", "/x/bulk2.pdf", "nda", PRIORITY_BULK)
+        q.submit("upload.pdf", "/x/upload.pdf", "nda", PRIORITY_INTERACTIVE)
+
+        order = []
+        with q._cond:
+            for _ in range(3):
+                job, _ = q._claim_next_locked()
+                order.append(job["filename"])
+        assert order == ["upload.pdf", "bulk1.pdf", "bulk2.pdf"]
+
+    def test_duplicate_submit_is_deduped_and_bumped(self, tmp_path):
+        q = IngestionJobQueue(str(tmp_path / "jobs.json"), handler=MagicMock(), workers=1)
+        first = q.submit("a.pdf", "/x/a.pdf", "nda", PRIORITY_BULK)
+        second = q.submit("a.pdf", "/x/a.pdf", "nda", PRIORITY_INTERACTIVE)
+
+        assert second["id"] == first["id"]
+        jobs = q.snapshot()["jobs"]
+        assert len(jobs) == 1
+        assert jobs[0]["priority"] == PRIORITY_INTERACTIVE
+
+    def test_submit_while_running_queues_follow_up(self, tmp_path):
+        q = IngestionJobQueue(str(tmp_path / "jobs.json"), handler=MagicMock(), workers=1)
+        first = q.submit("a.pdf", "/x/a.pdf", "nda")
+        with q._cond:
+            q._claim_next_locked()
+
+        assert q.submit("a.pdf", "/x/a.pdf", "nda")["id"] == first["id"]
+        follow_up = q.submit("a.pdf", "/x/a.pdf", "msa", PRIORITY_INTERACTIVE)
+        assert follow_up["id"] != first["id"]
+        assert q.submit("a.pdf", "/x/a.pdf", "nda")["id"] == follow_up["id"]
+
+        # The follow-up waits for the running job instead of processing the same file concurrently.
+        with q._cond:
+            assert q._claim_next_locked() == (None, None)
+        q._finish(first["id"], None)
+        with q._cond:
+            job, _ = q._claim_next_locked()
+        assert job["id"] == follow_up["id"]
+        assert job["doc_type"] == "nda"
+
+    def test_cancel_queued_job(self, tmp_path):
+        q = IngestionJobQueue(str(tmp_path / "jobs.json"), handler=MagicMock(), workers=1)
+        q.submit("a.pdf", "/x/a.pdf", "nda")
+        assert q.cancel("a.pdf") == 1
+        assert _statuses(q) == {"a.pdf": "cancelled"}
+        assert q.has_active_job("a.pdf") is False
+
+
+class TestJobQueuePersistence:
+    """Test that jobs survive a restart."""
+
+    def test_running_jobs_are_resumed_after_restart(self, tmp_path):
+        path = str(tmp_path / "jobs.json")
+        q = IngestionJobQueue(path, handler=MagicMock(), workers=1)
+        q.submit("a.pdf", "/x/a.pdf", "nda")
+        q.submit("b.pdf", "/x/b.pdf", "nda")
+        with q._cond:
+            q._claim_next_locked()  # a.pdf is "running" when the app dies
+
+        with open(path) as f:
+            persisted = {j["filename"]: j["status"] for j in json.load(f)["jobs"]}
+        assert persisted == {"a.pdf": "running", "b.pdf": "queued"}
+
+        done = []
+        handler = lambda filename, filepath, doc_type: done.append(filename) or True
+        restarted = IngestionJobQueue(path, handler=handler, workers=1)
+        restarted.start()
+        assert _wait_for(lambda: _statuses(restarted) == {"a.pdf": "done", "b.pdf": "done"})
+        assert sorted(done) == ["a.pdf", "b.pdf"]
+
+
+class TestJobQueueRetry:
+    """Test retry with backoff and permanent failure."""
+
+    def test_failed_job_is_retried_then_succeeds(self, tmp_path):
+        calls = []
+
+        def flaky(filename, filepath, doc_type):
+            calls.append(time.time())
+            return len(calls) >= 2
+
+        q = IngestionJobQueue(str(tmp_path / "jobs.json"), handler=flaky, workers=1)
+        with patch.dict(server.config, {"processing": {"max_attempts": 3, "retry_backoff_seconds": 0.05}}):
+            q.start()
+            q.submit("a.pdf", "/x/a.pdf", "nda")
+            assert _wait_for(lambda: _statuses(q) == {"a.pdf": "done"})
+
+        assert len(calls) == 2
+        assert calls[1] - calls[0] >= 0.05
+        assert q.snapshot()["jobs"][0]["attempts"] == 2
+
+    def test_job_fails_after_max_attempts(self, tmp_path):
+        def boom(filename, filepath, doc_type):
+            raise RuntimeError("extraction crashed")
+
+        q = IngestionJobQueue(str(tmp_path / "jobs.json"), handler=boom, workers=1)
+        with patch.dict(server.config, {"processing": {"max_attempts": 2, "retry_backoff_seconds": 0.01}}):
+            q.start()
+            q.submit("a.pdf", "/x/a.pdf", "nda")
+            assert _wait_for(lambda: _statuses(q) == {"a.pdf": "failed"})
+
+        job = q.snapshot()["jobs"][0]
+        assert job["attempts"] == 2
+        assert job["last_error"] == "extraction crashed"
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
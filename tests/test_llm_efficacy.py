@@ -80,6 +80,21 @@ def test_competency_extraction_accuracy(setup_document):
             break
     assert found_party, f"Could not find expected parties {EXPECTED_FACTS['parties']} in extracted metadata"
 
+def test_competency_retrieval_mode_accuracy(setup_document):
+    """Retrieval-driven extraction should find the same facts as sending the full text."""
+    res = requests.post(f"{API_URL}/competencies/compare/{FILENAME}", timeout=180)
+    assert res.status_code == 200, res.text
+    data = res.json()
+    for mode in ("full", "retrieval"):
+        stats = data[mode]["stats"]
+        print(f"\n{mode}: ~{stats.get('prompt_tokens_est')} prompt tokens, {stats.get('llm_seconds')}s, mode used={stats.get('mode')}, fallback={stats.get('fallback')}")
+    print(f"Token savings: {data['token_savings']}")
+
+    for mode in ("full", "retrieval"):
+        answers = data[mode]["answers"]
+        assert EXPECTED_FACTS["expiration_date"] in str(answers.get("expiration_date", "")), \
+            f"{mode} mode missed the expiration date: {answers.get('expiration_date')}"
+
 def test_rag_retrieval_efficacy(setup_document):
     # Use specific query to target this document in a potentially shared vector DB
     query = "What is the termination clause in the Green NDA?"
@@ -0,0 +1,137 @@
+"""
+Unit tests for MinHash/LSH near-duplicate detection and search-result collapsing.
+These tests don't require OpenAI or ChromaDB.
+"""
+import pytest
+import sys
+import os
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import NearDuplicateIndex, minhash_signature, minhash_similarity
+
+
+TEMPLATE = (
+    "This Mutual Non-Disclosure Agreement is entered into by {a} and {b}. Each party may disclose "
+    "confidential information to the other for the purpose of evaluating a potential business relationship. "
+    "The receiving party shall hold confidential information in strict confidence and shall not disclose it "
+    "to any third party without prior written consent. This agreement is governed by the laws of Delaware "
+    "and remains in effect for three years from the effective date. Confidential information does not include "
+    "information that is publicly available, already known to the receiving party, or independently developed "
+    "without use of the disclosing party's information. Upon written request the receiving party shall return "
+    "or destroy all copies of confidential information within thirty days. Nothing in this agreement grants "
+    "either party any license under any patent, copyright or other intellectual property right. Neither party "
+    "is obligated to enter into any further agreement. The parties acknowledge that unauthorized disclosure may "
+    "cause irreparable harm for which monetary damages would be an inadequate remedy, and that injunctive relief "
+    "may be sought in addition to any other remedy available at law or in equity."
+)
+NDA_ACME = TEMPLATE.format(a="Acme Corp", b="Beta LLC")
+NDA_GAMMA = TEMPLATE.format(a="Gamma Inc", b="Delta Ltd")
+LEASE = (
+    "The landlord leases the premises at 12 Main Street to the tenant for a monthly rent of two thousand "
+    "dollars, payable on the first business day of each month, with a security deposit held in escrow."
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = NearDuplicateIndex(str(tmp_path / "minhash.json"), num_perm=128, bands=16, threshold=0.8)
+    with patch.object(server, '_near_duplicate_index', idx):
+        yield idx
+
+
+class TestMinHash:
+    """Test signature similarity estimates."""
+
+    def test_templated_documents_are_similar(self):
+        assert minhash_similarity(minhash_signature(NDA_ACME), minhash_signature(NDA_GAMMA)) >= 0.8
+        assert minhash_similarity(minhash_signature(NDA_ACME), minhash_signature(LEASE)) < 0.2
+
+    def test_deterministic_and_empty(self):
+        assert minhash_signature(NDA_ACME) == minhash_signature(NDA_ACME)
+        assert minhash_signature("  ... ") is None
+
+
+class TestNearDuplicateIndex:
+    """Test LSH lookups, persistence and metadata bookkeeping."""
+
+    def test_add_finds_near_duplicates_and_persists(self, index, tmp_path):
+        assert index.add("acme.pdf", minhash_signature(NDA_ACME)) == {}
+        assert index.add("lease.pdf", minhash_signature(LEASE)) == {}
+        matches = index.add("gamma.pdf", minhash_signature(NDA_GAMMA))
+        assert list(matches) == ["acme.pdf"]
+
+        reloaded = NearDuplicateIndex(str(tmp_path / "minhash.json"))
+        assert set(reloaded.neighbors("acme.pdf")) == {"gamma.pdf"}
+
+        index.remove("acme.pdf")
+        assert index.neighbors("gamma.pdf") == {}
+
+    def test_changed_shingle_size_discards_stored_signatures(self, index, tmp_path):
+        index.add("acme.pdf", minhash_signature(NDA_ACME))
+        assert len(NearDuplicateIndex(str(tmp_path / "minhash.json"))) == 1
+        assert len(NearDuplicateIndex(str(tmp_path / "minhash.json"), shingle_words=3)) == 0
+
+    def test_rebuild_drops_documents_no_longer_processed(self, index, metadata_store):
+        index.add("deleted.pdf", minhash_signature(NDA_GAMMA))
+        metadata_store.data = {"acme.pdf": {"status": "processed", "near_duplicates": [{"filename": "deleted.pdf"}]}}
+        with patch.object(server, '_file_sha256', return_value="abc"), \
+             patch.object(server, 'load_extracted_text', return_value={"text": NDA_ACME}):
+            assert server.rebuild_near_duplicates()["indexed"] == 1
+
+        assert index.neighbors("acme.pdf") == {}
+        assert len(index) == 1
+        assert metadata_store.data["acme.pdf"]["near_duplicates"] == []
+
+    def test_record_near_duplicates_updates_both_documents(self, index):
+        metadata = {"acme.pdf": {}, "gamma.pdf": {}}
+        server.record_near_duplicates(metadata, "acme.pdf", minhash_signature(NDA_ACME))
+        entries = server.record_near_duplicates(metadata, "gamma.pdf", minhash_signature(NDA_GAMMA))
+
+        assert [e["filename"] for e in entries] == ["acme.pdf"]
+        assert [e["filename"] for e in metadata["acme.pdf"]["near_duplicates"]] == ["gamma.pdf"]
+
+        # Reprocessing gamma does not duplicate the back-reference.
+        server.record_near_duplicates(metadata, "gamma.pdf", minhash_signature(NDA_GAMMA))
+        assert len(metadata["acme.pdf"]["near_duplicates"]) == 1
+
+
+class TestCollapse:
+    """Test that repeated boilerplate from near-duplicate documents is collapsed in search results."""
+
+    def _result(self, filename, doc, score):
+        return {"filename": filename, "doc": doc, "score": score, "metadata": {"filename": filename}}
+
+    def test_collapses_only_near_duplicate_documents(self, index):
+        index.add("acme.pdf", minhash_signature(NDA_ACME))
+        index.add("gamma.pdf", minhash_signature(NDA_GAMMA))
+        index.add("lease.pdf", minhash_signature(LEASE))
+        clause = "The receiving party shall hold confidential information in strict confidence."
+        results = [
+            self._result("acme.pdf", clause, 0.9),
+            self._result("gamma.pdf", clause, 0.8),
+            self._result("lease.pdf", clause, 0.7),
+            self._result("gamma.pdf", "Gamma Inc and Delta Ltd signature block.", 0.6),
+        ]
+
+        collapsed = server.collapse_near_duplicate_chunks(results, n_results=3)
+
+        assert [r["filename"] for r in collapsed] == ["acme.pdf", "lease.pdf", "gamma.pdf"]
+        assert collapsed[0]["near_duplicate_files"] == ["gamma.pdf"]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
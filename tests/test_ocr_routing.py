@@ -0,0 +1,269 @@
+"""
+Unit tests for per-page OCR routing.
+These tests don't require EasyOCR, PyMuPDF, OpenAI or ChromaDB - OCR and PDF parsing are mocked.
+"""
+import pytest
+import sys
+import os
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import _page_needs_ocr, extract_pdf_pages, extract_text_from_pdf
+
+
+NOISY_PAGE = bytes(range(0, 256, 4)) * 8
+NATIVE_PAGE = "This Mutual Non-Disclosure Agreement is entered into by Acme Corp and Beta LLC. " * 3
+
+
+def _ocr(text, confidence=0.9, dpi=150):
+    return {"text": text, "confidence": confidence, "dpi": dpi, "blank": False}
+
+
+def _fake_reader(page_texts):
+    reader = MagicMock()
+    pages = []
+    for t in page_texts:
+        page = MagicMock()
+        page.extract_text.return_value = t
+        pages.append(page)
+    reader.pages = pages
+    return reader
+
+
+class TestPageNeedsOcr:
+    """Test the single-page routing heuristic."""
+
+    def test_empty_page_needs_ocr(self):
+        assert _page_needs_ocr("", 100) is True
+        assert _page_needs_ocr(None, 100) is True
+
+    def test_native_page_does_not_need_ocr(self):
+        assert _page_needs_ocr(NATIVE_PAGE, 100) is False
+
+    def test_docusign_stamp_only_needs_ocr(self):
+        """A scanned page carrying only the DocuSign envelope stamp is image-only."""
+        stamp = "DocuSign Envelope ID: 1A2B3C4D-5E6F-7A8B-9C0D-1E2F3A4B5C6D"
+        assert _page_needs_ocr(stamp, 100) is True
+
+    def test_docusign_stamp_with_body_text_is_native(self):
+        stamp = "DocuSign Envelope ID: 1A2B3C4D-5E6F-7A8B-9C0D-1E2F3A4B5C6D"
+        assert _page_needs_ocr(stamp + "\n" + NATIVE_PAGE, 100) is False
+
+    def test_threshold_is_respected(self):
+        assert _page_needs_ocr("short text", 5) is False
+        assert _page_needs_ocr("short text", 50) is True
+
+
+class TestExtractPdfPages:
+    """Test that only image-only pages are sent to OCR."""
+
+    def test_native_pdf_never_loads_ocr(self):
+        reader = _fake_reader([NATIVE_PAGE, NATIVE_PAGE])
+        with patch.object(server, 'PdfReader', return_value=reader), \
+             patch.object(server, 'ensure_ocr_loaded') as ensure_ocr:
+            pages = extract_pdf_pages("native.pdf")
+
+        ensure_ocr.assert_not_called()
+        assert [p["source"] for p in pages] == ["native", "native"]
+
+    def test_mixed_pdf_ocrs_only_image_pages(self):
+        reader = _fake_reader([NATIVE_PAGE, "", NATIVE_PAGE, "DocuSign Envelope ID: X"])
+        with patch.object(server, 'PdfReader', return_value=reader), \
+             patch.object(server, 'ensure_ocr_loaded', return_value=True), \
+             patch.object(server, '_ocr_pdf_pages', return_value={1: _ocr("Signature page text"), 3: _ocr("Exhibit A pricing")}) as ocr:
+            pages = extract_pdf_pages("mixed.pdf")
+
+        ocr.assert_called_once_with("mixed.pdf", [1, 3], file_hash=None)
+        assert [p["source"] for p in pages] == ["native", "ocr", "native", "ocr"]
+        assert pages[1]["text"] == "Signature page text"
+        assert pages[1]["ocr"] == {"dpi": 150, "confidence": 0.9, "blank": False}
+        assert not any(p.get("ocr_missing") for p in pages)
+        assert [p["page"] for p in server._ocr_page_stats(pages)] == [2, 4]
+
+    def test_ocr_unavailable_keeps_native_text(self):
+        reader = _fake_reader([NATIVE_PAGE, ""])
+        with patch.object(server, 'PdfReader', return_value=reader), \
+             patch.object(server, 'ensure_ocr_loaded', return_value=False):
+            pages = extract_pdf_pages("mixed.pdf")
+
+        assert [p["source"] for p in pages] == ["native", "native"]
+        assert pages[0]["text"] == NATIVE_PAGE
+        assert pages[1]["ocr_missing"] is True
+
+    def test_text_marks_ocr_pages(self):
+        reader = _fake_reader([NATIVE_PAGE, ""])
+        with patch.object(server, 'PdfReader', return_value=reader), \
+             patch.object(server, 'ensure_ocr_loaded', return_value=True), \
+             patch.object(server, '_ocr_pdf_pages', return_value={1: _ocr("Scanned signature block")}):
+            text = extract_text_from_pdf("mixed.pdf")
+
+        assert NATIVE_PAGE in text
+        assert "--- Page 2 ---\nScanned signature block" in text
+
+
+class TestOcrPagePipeline:
+    """Test the render-ahead / pooled recognition pipeline (a thread pool stands in for worker processes)."""
+
+    def _fake_render(self, rendered, in_memory, peak):
+        def render(filepath, page_indices, dpi=300, before_render=None, on_render_error=None):
+            for page_num in page_indices:
+                if before_render is not None:
+                    before_render()
+                with in_memory["lock"]:
+                    in_memory["count"] += 1
+                    peak["value"] = max(peak["value"], in_memory["count"])
+                rendered.append(page_num)
+                yield page_num, (NOISY_PAGE, 1, len(NOISY_PAGE), 1)
+        return render
+
+    def test_pool_results_and_inflight_bound(self):
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        rendered = []
+        in_memory = {"count": 0, "lock": threading.Lock()}
+        peak = {"value": 0}
+
+        def fake_readtext(samples, height, width, channels):
+            time.sleep(0.01)
+            with in_memory["lock"]:
+                in_memory["count"] -= 1
+            return "page text", 0.9
+
+        pool = ThreadPoolExecutor(max_workers=4)
+        try:
+            with patch.object(server, '_get_ocr_pool', return_value=pool), \
+                 patch.object(server, '_ocr_inflight', threading.BoundedSemaphore(2)), \
+                 patch.object(server, '_render_pdf_pages', self._fake_render(rendered, in_memory, peak)), \
+                 patch.object(server, '_ocr_worker_readtext', fake_readtext):
+                results = server._ocr_pdf_pages("scan.pdf", list(range(10)))
+        finally:
+            pool.shutdown(wait=True)
+
+        assert {i: r["text"] for i, r in results.items()} == {i: "page text" for i in range(10)}
+        assert rendered == list(range(10))
+        assert peak["value"] <= 2
+
+    def test_no_pool_runs_in_process(self):
+        with patch.object(server, '_get_ocr_pool', return_value=None), \
+             patch.object(server, '_ocr_pass_inprocess', return_value={0: _ocr("x", dpi=300)}) as inprocess:
+            assert server._ocr_pass("scan.pdf", [0], 300) == {0: _ocr("x", dpi=300)}
+        inprocess.assert_called_once_with("scan.pdf", [0], 300)
+
+
+class TestAdaptiveOcr:
+    """Test low-DPI-first OCR with high-DPI retries and blank page skipping."""
+
+    def test_blank_page_detection(self):
+        assert server._is_blank_page(bytes([255]) * 4096) is True
+        assert server._is_blank_page(NOISY_PAGE) is False
+
+    def test_only_low_confidence_pages_rerendered(self):
+        passes = []
+
+        def fake_pass(filepath, page_indices, dpi, file_hash=None):
+            passes.append((dpi, list(page_indices)))
+            if dpi == 150:
+                return {0: _ocr("clean", 0.95, 150), 1: _ocr("smudgy", 0.3, 150),
+                        2: {"text": "", "confidence": 0.0, "dpi": 150, "blank": True}}
+            return {1: _ocr("fine print", 0.8, 300)}
+
+        with patch.object(server, '_ocr_pass', side_effect=fake_pass):
+            results = server._ocr_pdf_pages("scan.pdf", [0, 1, 2])
+
+        assert passes == [(150, [0, 1, 2]), (300, [1])]
+        assert results[0]["dpi"] == 150
+        assert results[1] == _ocr("fine print", 0.8, 300)
+        assert results[2]["blank"] is True
+
+    def test_adaptive_disabled_uses_high_dpi(self):
+        with patch.dict(server.config, {"ocr": {"adaptive_dpi": False}}), \
+             patch.object(server, '_ocr_pass', return_value={}) as ocr_pass:
+            server._ocr_pdf_pages("scan.pdf", [0])
+        ocr_pass.assert_called_once_with("scan.pdf", [0], 300, file_hash=None)
+
+
+class TestOcrCache:
+    """Test that unchanged files are served from the OCR cache."""
+
+    def test_second_pass_skips_recognition(self, tmp_path):
+        import diskcache
+
+        cache = diskcache.Cache(str(tmp_path / "ocr"))
+        try:
+            with patch.object(server, '_get_ocr_cache', return_value=cache), \
+                 patch.object(server, '_recognize_pages', return_value={0: _ocr("a"), 1: _ocr("b")}) as recognize:
+                first = server._ocr_pass("scan.pdf", [0, 1], 150, file_hash="abc")
+                second = server._ocr_pass("scan.pdf", [0, 1], 150, file_hash="abc")
+            assert recognize.call_count == 1
+            assert first == second
+
+            # A different DPI or file content is a different key.
+            with patch.object(server, '_get_ocr_cache', return_value=cache), \
+                 patch.object(server, '_recognize_pages', return_value={0: _ocr("c", dpi=300)}) as recognize:
+                server._ocr_pass("scan.pdf", [0], 300, file_hash="abc")
+                server._ocr_pass("scan.pdf", [0], 300, file_hash="changed")
+            assert recognize.call_count == 2
+        finally:
+            cache.close()
+
+    def test_file_hash_is_content_based(self, tmp_path):
+        a = tmp_path / "a.pdf"
+        b = tmp_path / "b.pdf"
+        a.write_bytes(b"%PDF-1.4 same bytes")
+        b.write_bytes(b"%PDF-1.4 same bytes")
+        assert server._file_sha256(str(a)) == server._file_sha256(str(b))
+        assert server._file_sha256(str(tmp_path / "missing.pdf")) is None
+
+
+class TestOcrWarmup:
+    """Test when background OCR warm-up runs and how its state is reported."""
+
+    def test_auto_warms_only_for_libraries_with_ocr_documents(self):
+        scanned = {"scan.pdf": {"filename": "scan.pdf", "ocr_pages": [{"page": 1, "dpi": 150}]}}
+        native = {"native.pdf": {"filename": "native.pdf"}}
+        with patch.dict(server.config, {"ocr": {"warmup": "auto"}}):
+            with patch.object(server, 'load_metadata', return_value=scanned):
+                assert server._should_warm_up_ocr() is True
+            with patch.object(server, 'load_metadata', return_value=native):
+                assert server._should_warm_up_ocr() is False
+
+    def test_always_and_never(self):
+        with patch.object(server, 'load_metadata', return_value={}):
+            with patch.dict(server.config, {"ocr": {"warmup": "always"}}):
+                assert server._should_warm_up_ocr() is True
+            with patch.dict(server.config, {"ocr": {"warmup": "never"}}):
+                assert server._should_warm_up_ocr() is False
+
+    def test_unavailable_when_ocr_libraries_missing(self):
+        with patch.object(server, 'ensure_ocr_loaded', return_value=False), \
+             patch.object(server, 'ocr_warmup_state', "not_started"):
+            server.warm_up_ocr()
+            assert server.ocr_warmup_state == "unavailable"
+
+    def test_ready_after_in_process_reader_built(self):
+        with patch.object(server, 'ensure_ocr_loaded', return_value=True), \
+             patch.object(server, '_get_ocr_pool', return_value=None), \
+             patch.object(server, '_get_ocr_reader') as get_reader, \
+             patch.object(server, 'ocr_warmup_state', "not_started"):
+            server.warm_up_ocr()
+            assert server.ocr_warmup_state == "ready"
+        get_reader.assert_called_once()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,196 @@
+"""
+Unit tests for the shared OpenAI rate limiter.
+These tests don't require OpenAI or ChromaDB - API calls are stubs.
+"""
+import pytest
+import sys
+import os
+import time
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import OpenAIRateLimiter
+
+
+def _limits(rpm=0, tpm=0, reserve=0.2, retries=4):
+    return patch.dict(server.config, {"api": {
+        "requests_per_minute": rpm, "tokens_per_minute": tpm,
+        "interactive_reserve": reserve, "max_retries": retries,
+    }})
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after_ms=None):
+        super().__init__("Error code: 429 - Rate limit reached")
+        self.response = MagicMock()
+        self.response.headers = {"retry-after-ms": str(retry_after_ms)} if retry_after_ms else {}
+
+
+class TestOpenAIRateLimiter:
+    """Test bucket accounting and the interactive reserve."""
+
+    def test_background_cannot_use_interactive_reserve(self):
+        limiter = OpenAIRateLimiter()
+        with _limits(rpm=10, reserve=0.5):
+            for _ in range(5):
+                limiter.acquire(interactive=False)  # uses the unreserved half
+            with limiter._cond:
+                limits = limiter._limits()
+                limiter._refill_locked(limits)
+                assert limiter._wait_seconds_locked(limits, 0, interactive=False) > 0
+                assert limiter._wait_seconds_locked(limits, 0, interactive=True) == 0
+
+            start = time.monotonic()
+            limiter.acquire(interactive=True)
+            assert time.monotonic() - start < 0.1
+
+    def test_oversize_background_call_leaves_the_reserve(self):
+        limiter = OpenAIRateLimiter()
+        with _limits(rpm=500, tpm=200000, reserve=0.2):
+            limiter.acquire(tokens=250000, interactive=False)  # larger than the whole bucket
+            assert limiter.stats()["available_tokens"] >= 40000
+            start = time.monotonic()
+            limiter.acquire(tokens=4000, interactive=True)
+            assert time.monotonic() - start < 0.1
+
+    def test_embedding_batches_fit_background_budget(self):
+        settings = {"embed_batch_tokens": 250000}
+        with _limits(tpm=200000, reserve=0.2), \
+             patch.dict(server.config, {"processing": settings}), \
+             patch.object(server, '_embedding_batcher', None):
+            assert server._get_embedding_batcher().max_tokens == 160000
+
+    def test_token_budget_blocks_until_refilled(self):
+        limiter = OpenAIRateLimiter()
+        with _limits(tpm=60000, reserve=0.0):  # 1000 tokens/second
+            limiter.acquire(tokens=60000)
+            start = time.monotonic()
+            limiter.acquire(tokens=100)
+            assert time.monotonic() - start >= 0.08
+
+    def test_unlimited_when_zero(self):
+        limiter = OpenAIRateLimiter()
+        with _limits(rpm=0, tpm=0):
+            start = time.monotonic()
+            for _ in range(100):
+                limiter.acquire(tokens=10 ** 6)
+            assert time.monotonic() - start < 0.5
+
+    def test_interactive_flag_defaults_from_context(self):
+        limiter = OpenAIRateLimiter()
+        with _limits(rpm=10, reserve=0.5):
+            for _ in range(5):
+                limiter.acquire(interactive=False)
+            token = server._openai_interactive.set(True)
+            try:
+                start = time.monotonic()
+                limiter.acquire()
+                assert time.monotonic() - start < 0.1
+            finally:
+                server._openai_interactive.reset(token)
+
+
+class TestOpenAIRequest:
+    """Test 429 handling around individual API calls."""
+
+    def test_retries_after_retry_after(self):
+        calls = []
+
+        def call():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RateLimitError(retry_after_ms=100)
+            return "ok"
+
+        with _limits(), patch.object(server, 'openai_limiter', OpenAIRateLimiter()):
+            assert server.openai_request(call) == "ok"
+            assert server.openai_limiter.stats()["rate_limited_responses"] == 1
+        assert calls[1] - calls[0] >= 0.09
+
+    def test_gives_up_after_max_retries(self):
+        call = MagicMock(side_effect=RateLimitError(retry_after_ms=1))
+        with _limits(retries=2), patch.object(server, 'openai_limiter', OpenAIRateLimiter()):
+            with pytest.raises(RateLimitError):
+                server.openai_request(call)
+        assert call.call_count == 3
+
+    def test_other_errors_are_not_retried(self):
+        call = MagicMock(side_effect=ValueError("bad request"))
+        with _limits():
+            with pytest.raises(ValueError):
+                server.openai_request(call)
+        assert call.call_count == 1
+
+    def test_embedding_function_calls_go_through_limiter(self):
+        class FakeEmbeddingFunction:
+            def __call__(self, input):
+                return [[0.0] for _ in input]
+
+        ef = server._rate_limit_embedding_function(FakeEmbeddingFunction())
+        with patch.object(server, 'openai_request', side_effect=lambda call, tokens: call()) as request:
+            assert ef(["a" * 400, "b"]) == [[0.0], [0.0]]
+        assert request.call_args[1]["tokens"] == server._estimate_tokens("a" * 400, "b")
+        assert isinstance(ef, FakeEmbeddingFunction)
+
+    def test_embedding_client_sdk_retries_disabled(self):
+        class FakeEmbeddingFunction:
+            def __init__(self):
+                self._client = MagicMock()
+
+            def __call__(self, input):
+                return []
+
+        ef = FakeEmbeddingFunction()
+        sdk_client = ef._client._client
+        server._rate_limit_embedding_function(ef)
+        sdk_client.with_options.assert_called_once_with(max_retries=0)
+        assert ef._client is sdk_client.with_options.return_value.embeddings
+
+
+class TestChatRetrieval:
+    """Test that /chat retrieval (which may wait on the limiter) stays off the event loop."""
+
+    def test_hybrid_search_runs_in_worker_thread_as_interactive(self):
+        import asyncio
+        from fastapi.testclient import TestClient
+
+        seen = {}
+
+        def search(query, col, n_results=10):
+            try:
+                asyncio.get_running_loop()
+                seen["on_event_loop"] = True
+            except RuntimeError:
+                seen["on_event_loop"] = False
+            seen["interactive"] = server._openai_interactive.get()
+            raise RuntimeError("stop after retrieval")
+
+        with patch.object(server, 'openai_client', MagicMock()), \
+             patch.object(server, 'collection', MagicMock()), \
+             patch.object(server, '_safe_collection_count', return_value=10), \
+             patch.object(server, 'load_metadata', return_value={}), \
+             patch.object(server, 'hybrid_search_rrf', side_effect=search):
+            with pytest.raises(RuntimeError):
+                TestClient(server.app).post("/chat", json={"question": "What is the term?"})
+
+        assert seen["interactive"] is True
+        assert seen["on_event_loop"] is False
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,164 @@
+"""
+Unit tests for int8 first-pass vector search and the compression report.
+These tests don't require OpenAI or ChromaDB - vectors are synthetic.
+"""
+import pytest
+import sys
+import os
+
+np = pytest.importorskip("numpy")
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+    from server import Int8VectorIndex, compression_report
+
+
+def _unit_vectors(n, dims, seed=0):
+    rng = np.random.default_rng(seed)
+    m = rng.normal(size=(n, dims)).astype(np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+class FakeCollection:
+    """Just enough of a Chroma collection for the int8 path."""
+
+    name = "nda_documents"
+
+    def __init__(self, vectors, filenames):
+        self.ids = [f"{f}_chunk_{i}" for i, f in enumerate(filenames)]
+        self.vectors = vectors
+        self.filenames = filenames
+
+    def get(self, ids=None, include=None):
+        idx = range(len(self.ids)) if ids is None else [self.ids.index(i) for i in ids]
+        return {
+            "ids": [self.ids[i] for i in idx],
+            "embeddings": [self.vectors[i] for i in idx],
+            "documents": [f"doc {self.ids[i]}" for i in idx],
+            "metadatas": [{"filename": self.filenames[i]} for i in idx],
+        }
+
+
+class TestInt8Index:
+    """Test quantization accuracy and index maintenance."""
+
+    def test_quantization_roundtrip_error_is_small(self):
+        m = _unit_vectors(50, 64)
+        codes, scales = server._quantize_int8(m)
+        assert codes.dtype == np.int8
+        assert np.abs(codes.astype(np.float32) * scales[:, None] - m).max() < scales.max()
+
+    def test_search_finds_exact_neighbours(self):
+        m = _unit_vectors(200, 64)
+        col = FakeCollection(m, ["a.pdf"] * 200)
+        index = Int8VectorIndex()
+        index.build(col)
+        q = m[17] + 0.01
+        ids = [cid for cid, _ in index.search(q, 5)]
+        assert ids[0] == "a.pdf_chunk_17"
+        assert index.stats()["int8_bytes"] < index.stats()["float32_bytes"] / 3
+
+    def test_remove_and_add_file(self):
+        m = _unit_vectors(4, 8)
+        index = Int8VectorIndex()
+        index.build(FakeCollection(m, ["a.pdf", "a.pdf", "b.pdf", "b.pdf"]))
+        index.remove_file("a.pdf")
+        assert index.ids == ["b.pdf_chunk_2", "b.pdf_chunk_3"]
+        index.add(["c.pdf_chunk_0"], m[:1], "c.pdf")
+        assert index.stats()["vectors"] == 3
+        assert index.search(m[0], 1)[0][0] == "c.pdf_chunk_0"
+
+
+class TestSemanticQuery:
+    """Test the query path used by hybrid search."""
+
+    def test_rescored_results_use_exact_distances(self):
+        m = _unit_vectors(100, 32)
+        col = FakeCollection(m, ["a.pdf"] * 100)
+        with patch.dict(server.config, {"rag": {"quantized_search": True, "rescore_factor": 4}}), \
+             patch.object(server, 'embedding_fn', lambda texts: [m[42]]), \
+             patch.object(server, '_int8_index', Int8VectorIndex()), \
+             patch.dict(server._query_embedding_cache, clear=True):
+            result = server.semantic_query(col, "query", 3)
+
+        assert result["ids"][0][0] == "a.pdf_chunk_42"
+        assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+        assert len(result["documents"][0]) == 3
+
+    def test_disabled_uses_chroma_query(self):
+        col = MagicMock()
+        with patch.dict(server.config, {"rag": {"quantized_search": False}}):
+            server.semantic_query(col, "query", 3)
+        col.query.assert_called_once()
+
+    def test_falls_back_to_chroma_on_error(self):
+        col = MagicMock()
+        col.get.side_effect = RuntimeError("no embeddings")
+        with patch.dict(server.config, {"rag": {"quantized_search": True}}), \
+             patch.object(server, 'embedding_fn', lambda texts: [[0.0]]), \
+             patch.object(server, '_int8_index', Int8VectorIndex()), \
+             patch.dict(server._query_embedding_cache, clear=True):
+            server.semantic_query(col, "query", 3)
+        col.query.assert_called_once()
+
+
+class TestQueryEmbeddingCache:
+    """Test that repeated queries are embedded once."""
+
+    def test_repeated_query_embedded_once(self):
+        calls = []
+
+        def embed(texts):
+            calls.append(list(texts))
+            return [[1.0, 0.0]]
+
+        with patch.object(server, 'embedding_fn', embed), \
+             patch.dict(server._query_embedding_cache, clear=True):
+            server.embed_query("What is the term?")
+            server.embed_query("What is the term?")
+            server.embed_query("Who are the parties?")
+        assert calls == [["What is the term?"], ["Who are the parties?"]]
+
+    def test_filename_filter_passed_to_chroma(self):
+        col = MagicMock()
+        with patch.dict(server.config, {"rag": {"quantized_search": False}}), \
+             patch.object(server, 'embedding_fn', lambda texts: [[0.5]]), \
+             patch.dict(server._query_embedding_cache, clear=True):
+            server.semantic_query(col, "term", 3, where={"filename": "a.pdf"})
+        kwargs = col.query.call_args[1]
+        assert kwargs["where"] == {"filename": "a.pdf"}
+        assert kwargs["query_embeddings"] == [[0.5]]
+
+
+class TestCompressionReport:
+    """Test savings and recall figures."""
+
+    def test_report_modes(self):
+        m = _unit_vectors(300, 128, seed=1)
+        queries = m[:10] + 0.05
+        report = compression_report(m, queries, k=5, rescore_factor=4, dimensions=[32, 64, 512])
+
+        modes = report["modes"]
+        assert set(modes) == {"float32", "int8", "int8_rescored", "dimensions_32", "dimensions_64"}
+        assert modes["float32"]["recall_at_k"] == 1.0
+        assert modes["int8_rescored"]["recall_at_k"] >= modes["int8"]["recall_at_k"]
+        assert modes["int8_rescored"]["recall_at_k"] >= 0.9
+        assert modes["int8"]["savings"] == pytest.approx(1 - (128 + 4) / (128 * 4), abs=1e-4)
+        assert modes["dimensions_32"]["savings"] == pytest.approx(0.75)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -128,6 +128,27 @@ class TestRAGGoldenQuestions:
         assert source_found, f"Expected source containing '{expected_source}' not in sources: {sources}"
 
 
+class TestEmbeddingCompression:
+    """Recall@k of int8 / shortened-dimension search on the golden questions (no LLM calls)."""
+
+    def test_compression_report(self, ensure_server_running):
+        response = requests.post(
+            f"{API_URL}/rag/compression-report",
+            json={"questions": [g["question"] for g in GOLDEN_QUESTIONS], "k": 5, "dimensions": [256, 512]},
+            timeout=TIMEOUT
+        )
+        if response.status_code != 200:
+            pytest.skip(f"Compression report unavailable: {response.text[:200]}")
+
+        report = response.json()
+        print(f"\nVectors: {report['vectors']} x {report['dimensions']} ({report['embedding_provider']})")
+        for mode, stats in report["modes"].items():
+            print(f"  {mode:16s} bytes={stats['bytes']:>10} savings={stats['savings']:.0%} recall@{report['k']}={stats['recall_at_k']}")
+
+        # Exact rescoring should make the int8 first pass essentially lossless.
+        assert report["modes"]["int8_rescored"]["recall_at_k"] >= 0.9
+
+
 class TestOCRRegression:
     """
     OCR regression tests for synthetic scanned PDFs.
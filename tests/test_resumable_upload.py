@@ -0,0 +1,139 @@
+"""
+Unit tests for resumable chunked uploads (/upload/sessions).
+These tests don't require OpenAI or ChromaDB - metadata and the job queue are mocked.
+"""
+import pytest
+import sys
+import os
+import hashlib
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+from fastapi.testclient import TestClient
+
+
+SCAN = b"%PDF-1.4 " + bytes(range(256)) * 40
+
+
+@pytest.fixture
+def library(tmp_path, metadata_store):
+    queue = MagicMock()
+    docs = tmp_path / "documents"
+    docs.mkdir()
+    with patch.object(server, 'DOCUMENTS_DIR', str(docs)), \
+         patch.object(server, 'UPLOAD_SESSIONS_DIR', str(tmp_path / "uploads")), \
+         patch.object(server, 'job_queue', queue):
+        yield TestClient(server.app), docs, metadata_store, queue
+
+
+@pytest.fixture
+def client(library):
+    return library[0]
+
+
+def _start(client, content=SCAN, **extra):
+    body = dict({"filename": "scan.pdf", "size": len(content)}, **extra)
+    return client.post("/upload/sessions", json=body).json()
+
+
+class TestRanges:
+    """Test byte-range bookkeeping."""
+
+    def test_merge_and_missing(self):
+        ranges = server._merge_ranges([], 10, 20)
+        ranges = server._merge_ranges(ranges, 30, 40)
+        assert server._missing_ranges(ranges, 50) == [[0, 10], [20, 30], [40, 50]]
+        ranges = server._merge_ranges(ranges, 15, 35)
+        assert ranges == [[10, 40]]
+
+
+class TestResumableUpload:
+    """Test the session / part / commit protocol."""
+
+    def test_parts_out_of_order_then_commit(self, library):
+        client, docs, store, queue = library
+        session = _start(client)
+        sid, half = session["session_id"], len(SCAN) // 2
+        assert session["next_offset"] == 0
+
+        status = client.put(f"/upload/sessions/{sid}?offset={half}", content=SCAN[half:]).json()
+        assert status["missing"] == [[0, half]] and status["complete"] is False
+
+        # Resume: the client asks where to continue.
+        assert client.get(f"/upload/sessions/{sid}").json()["next_offset"] == 0
+        assert client.put(f"/upload/sessions/{sid}?offset=0", content=SCAN[:half]).json()["complete"] is True
+
+        result = client.post(f"/upload/sessions/{sid}/commit", json={"sha256": hashlib.sha256(SCAN).hexdigest()}).json()
+        assert result["status"] == "uploaded" and result["filename"] == "scan.pdf"
+        assert (docs / "scan.pdf").read_bytes() == SCAN
+        assert store.data["scan.pdf"]["file_sha256"] == hashlib.sha256(SCAN).hexdigest()
+        queue.submit.assert_called_once()
+        assert client.get(f"/upload/sessions/{sid}").status_code == 410
+
+    def test_commit_rejects_incomplete_and_bad_hash(self, library):
+        client, docs, store, queue = library
+        session = _start(client, sha256="0" * 64)
+        sid = session["session_id"]
+        client.put(f"/upload/sessions/{sid}?offset=0", content=SCAN[:100])
+        response = client.post(f"/upload/sessions/{sid}/commit", json={})
+        assert response.status_code == 409
+
+        client.put(f"/upload/sessions/{sid}?offset=100", content=SCAN[100:])
+        response = client.post(f"/upload/sessions/{sid}/commit", json={})
+        assert response.status_code == 422
+        assert not (docs / "scan.pdf").exists()
+
+    def test_part_past_declared_size_rejected(self, client):
+        sid = _start(client, content=b"x" * 10)["session_id"]
+        assert client.put(f"/upload/sessions/{sid}?offset=5", content=b"y" * 10).status_code == 416
+        assert client.put(f"/upload/sessions/{sid}?offset=10", content=b"y").status_code == 416
+
+    def test_abort_and_validation(self, client):
+        sid = _start(client)["session_id"]
+        assert client.delete(f"/upload/sessions/{sid}").json()["status"] == "aborted"
+        assert client.get(f"/upload/sessions/{sid}").status_code == 410
+        assert client.get(f"/upload/sessions/{'0' * 32}").status_code == 404
+        assert client.get("/upload/sessions/..%2F..%2Fetc").status_code == 404
+        assert client.post("/upload/sessions", json={"filename": "notes.txt", "size": 5}).status_code == 400
+
+    def test_commit_waits_for_parts_in_flight(self, client):
+        sid = _start(client)["session_id"]
+        client.put(f"/upload/sessions/{sid}?offset=0", content=SCAN)
+        with patch.dict(server._upload_session_parts, {sid: 1}):
+            response = client.post(f"/upload/sessions/{sid}/commit", json={"sha256": hashlib.sha256(SCAN).hexdigest()})
+        assert response.status_code == 409
+        assert client.get(f"/upload/sessions/{sid}").json()["complete"] is True
+
+    def test_part_interrupted_by_abort_reports_gone(self, client):
+        import asyncio
+
+        sid = _start(client)["session_id"]
+
+        class AbortingRequest:
+            async def stream(self):
+                yield SCAN[:100]
+                server.abort_upload_session(sid)
+                yield SCAN[100:200]
+
+        with pytest.raises(server.HTTPException) as e:
+            asyncio.run(server.upload_session_part(sid, 0, AbortingRequest()))
+        assert e.value.status_code == 410
+        assert sid not in server._upload_session_parts
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,178 @@
+"""
+Unit tests for incremental content-addressed snapshots and snapshot restore.
+These tests don't require OpenAI or ChromaDB.
+"""
+import pytest
+import sys
+import os
+import json
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+from fastapi.testclient import TestClient
+
+
+def _tree(root):
+    return {
+        os.path.relpath(os.path.join(d, f), root): open(os.path.join(d, f), "rb").read()
+        for d, _, files in os.walk(root) for f in files
+    }
+
+
+@pytest.fixture
+def data(tmp_path):
+    root = tmp_path / "data"
+    (root / "documents").mkdir(parents=True)
+    (root / "documents" / "a.pdf").write_bytes(b"%PDF a" * 100)
+    (root / "documents" / "copy_of_a.pdf").write_bytes(b"%PDF a" * 100)
+    (root / "documents" / "metadata.json").write_text("{}")
+    (root / "GPUCache").mkdir()
+    (root / "GPUCache" / "data_0").write_bytes(b"locked")
+    return root, tmp_path / "snapshots"
+
+
+class TestSnapshots:
+    """Test that snapshots store each content once and only new or changed files."""
+
+    def test_first_snapshot_dedupes_identical_files(self, data):
+        root, store = data
+        summary = server.create_snapshot(str(root), str(store), server.BACKUP_SKIP_DIRS)
+
+        assert summary["stats"]["files"] == 3
+        assert summary["stats"]["new_objects"] == 2  # a.pdf and its copy share one object
+        manifest = server._load_snapshot_manifest(str(store), summary["id"])
+        assert sorted(manifest["files"]) == ["documents/a.pdf", "documents/copy_of_a.pdf", "documents/metadata.json"]
+
+    def test_upload_sessions_and_in_tree_store_are_skipped(self, data):
+        root, _ = data
+        (root / "uploads").mkdir()
+        (root / "uploads" / "abc.part").write_bytes(b"\0" * 100)
+        summary = server.create_snapshot(str(root), str(root / "snapshots"), server.BACKUP_SKIP_DIRS, [str(root / "uploads")])
+        manifest = server._load_snapshot_manifest(str(root / "snapshots"), summary["id"])
+        assert sorted(manifest["files"]) == ["documents/a.pdf", "documents/copy_of_a.pdf", "documents/metadata.json"]
+
+    def test_second_snapshot_only_touches_changes(self, data):
+        root, store = data
+        first = server.create_snapshot(str(root), str(store))
+        (root / "documents" / "metadata.json").write_text('{"a.pdf": {}}')
+        (root / "documents" / "b.pdf").write_bytes(b"%PDF b")
+
+        with patch.object(server, '_store_snapshot_object', wraps=server._store_snapshot_object) as store_object:
+            second = server.create_snapshot(str(root), str(store))
+
+        stored = sorted(os.path.basename(c.args[1]) for c in store_object.call_args_list)
+        assert stored == ["b.pdf", "metadata.json"]
+        assert second["parent"] == first["id"]
+        assert second["stats"]["unchanged"] == 3
+        assert [s["id"] for s in server.list_snapshots(str(store))] == [first["id"], second["id"]]
+
+    def test_restore_any_snapshot(self, data, tmp_path):
+        root, store = data
+        first = server.create_snapshot(str(root), str(store), server.BACKUP_SKIP_DIRS)
+        original = _tree(root)
+        (root / "documents" / "a.pdf").write_bytes(b"%PDF changed")
+        server.create_snapshot(str(root), str(store), server.BACKUP_SKIP_DIRS)
+
+        result = server.restore_snapshot(str(store), first["id"], str(tmp_path / "restored"))
+
+        assert result["failed"] == []
+        original.pop(os.path.join("GPUCache", "data_0"))
+        assert _tree(tmp_path / "restored") == original
+
+    def test_restore_detects_corrupt_object(self, data, tmp_path):
+        root, store = data
+        summary = server.create_snapshot(str(root), str(store))
+        digest = server._load_snapshot_manifest(str(store), summary["id"])["files"]["documents/metadata.json"]["sha256"]
+        with open(server._snapshot_object_path(str(store), digest), "wb") as f:
+            f.write(b"tampered")
+
+        result = server.restore_snapshot(str(store), summary["id"], str(tmp_path / "restored"))
+        assert result["failed"] == ["documents/metadata.json"]
+
+    def test_damaged_snapshot_is_refused_before_wiping(self, data):
+        root, store = data
+        summary = server.create_snapshot(str(root), str(store), server.BACKUP_SKIP_DIRS)
+        digest = server._load_snapshot_manifest(str(store), summary["id"])["files"]["documents/a.pdf"]["sha256"]
+        os.remove(server._snapshot_object_path(str(store), digest))
+        assert server.verify_snapshot(str(store), summary["id"]) == ["documents/a.pdf", "documents/copy_of_a.pdf"]
+
+        with patch.object(server, 'USER_DATA_DIR', str(root)), \
+             patch.object(server, '_get_snapshot_dir', return_value=str(store)):
+            response = TestClient(server.app).post(f"/backup/snapshots/{summary['id']}/restore")
+        assert response.status_code == 409
+        assert (root / "documents" / "a.pdf").exists()
+
+    def test_restore_refused_while_jobs_are_active(self, data, tmp_path):
+        root, store = data
+        summary = server.create_snapshot(str(root), str(store), server.BACKUP_SKIP_DIRS)
+        queue = server.IngestionJobQueue(str(tmp_path / "jobs.json"), MagicMock())
+        queue.submit("a.pdf", str(root / "documents" / "a.pdf"), "nda")
+        with patch.object(server, 'USER_DATA_DIR', str(root)), \
+             patch.object(server, '_get_snapshot_dir', return_value=str(store)), \
+             patch.object(server, 'job_queue', queue):
+            response = TestClient(server.app).post(f"/backup/snapshots/{summary['id']}/restore")
+        assert response.status_code == 409
+        assert "job" in response.json()["detail"]
+        assert (root / "documents" / "metadata.json").read_text() == "{}"
+
+    def test_restore_reloads_in_memory_state(self, data, tmp_path):
+        root, store = data
+        (root / "jobs.json").write_text(json.dumps({"jobs": [{
+            "id": "j1", "seq": 1, "filename": "a.pdf", "filepath": "a.pdf", "doc_type": "nda", "kind": "process",
+            "status": "running", "priority": 10, "attempts": 1, "updated_at": 0}]}))
+        summary = server.create_snapshot(str(root), str(store), server.BACKUP_SKIP_DIRS)
+        (root / "jobs.json").write_text('{"jobs": []}')
+        queue = server.IngestionJobQueue(str(root / "jobs.json"), MagicMock())
+        queue.snapshot()  # loads the current (empty) jobs.json
+        ocr_cache = MagicMock()
+        with patch.object(server, 'USER_DATA_DIR', str(root)), \
+             patch.object(server, '_get_snapshot_dir', return_value=str(store)), \
+             patch.object(server, 'job_queue', queue), \
+             patch.object(server, '_ocr_cache', ocr_cache), \
+             patch.object(server, '_near_duplicate_index', MagicMock()), \
+             patch.object(server, 'chroma_client', None), \
+             patch.object(server, 'initialize_openai_client') as initialize:
+            response = TestClient(server.app).post(f"/backup/snapshots/{summary['id']}/restore")
+            assert server._ocr_cache is None and server._near_duplicate_index is None
+        assert response.status_code == 200
+        ocr_cache.close.assert_called_once()
+        initialize.assert_called_once()
+        # The restored job was running when the snapshot was taken, so it is queued again.
+        assert [(j["id"], j["status"]) for j in queue.snapshot()["jobs"]] == [("j1", "queued")]
+
+    def test_snapshot_dir_inside_data_dir_is_refused(self, data):
+        root, _ = data
+        with patch.object(server, 'USER_DATA_DIR', str(root)), \
+             patch.dict(server.config, {"backup": {"snapshot_dir": str(root / "snapshots")}}):
+            client = TestClient(server.app)
+            assert client.post("/backup/snapshots").status_code == 400
+            assert client.post("/backup/snapshots/abc/restore").status_code == 400
+        assert (root / "documents" / "a.pdf").exists()
+
+    def test_prune_keeps_newest_and_collects_objects(self, data):
+        root, store = data
+        server.create_snapshot(str(root), str(store))
+        (root / "documents" / "a.pdf").write_bytes(b"%PDF replaced")
+        (root / "documents" / "copy_of_a.pdf").unlink()
+        latest = server.create_snapshot(str(root), str(store))
+
+        assert server.prune_snapshots(str(store), keep=1) == {"snapshots_removed": 1, "objects_removed": 1}
+        assert [s["id"] for s in server.list_snapshots(str(store))] == [latest["id"]]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
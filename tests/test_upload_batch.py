@@ -0,0 +1,83 @@
+"""
+Unit tests for the multi-file POST /upload/batch endpoint.
+These tests don't require OpenAI or ChromaDB - metadata and the job queue are mocked.
+"""
+import pytest
+import sys
+import os
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def library(tmp_path, metadata_store):
+    queue = MagicMock()
+    with patch.object(server, 'DOCUMENTS_DIR', str(tmp_path)), \
+         patch.object(server, 'job_queue', queue):
+        yield tmp_path, metadata_store, queue
+
+
+def _batch(files, **params):
+    query = "&".join(f"{k}={v}" for k, v in dict({"doc_type": "nda"}, **params).items())
+    parts = [("files", (name, content, "application/octet-stream")) for name, content in files]
+    return TestClient(server.app).post(f"/upload/batch?{query}", files=parts)
+
+
+class TestUploadBatch:
+    """Test per-file results, the single metadata write and queueing."""
+
+    def test_many_files_one_metadata_write(self, library):
+        docs, store, queue = library
+        files = [(f"nda_{i}.pdf", f"%PDF-1.4 contract {i}".encode()) for i in range(5)]
+        body = _batch(files).json()
+
+        assert body["counts"] == {"uploaded": 5}
+        assert [r["filename"] for r in body["results"]] == [name for name, _ in files]
+        assert store.saves == 1
+        assert sorted(store.data) == sorted(name for name, _ in files)
+        assert queue.submit.call_count == 5
+        assert all(c.args[3] == server.PRIORITY_BULK for c in queue.submit.call_args_list)
+
+    def test_bad_files_and_in_batch_duplicates(self, library):
+        docs, store, queue = library
+        body = _batch([
+            ("a.pdf", b"%PDF-1.4 same"),
+            ("notes.txt", b"plain text"),
+            ("b.pdf", b"%PDF-1.4 same"),
+        ], skip_processing="true").json()
+
+        statuses = [r["status"] for r in body["results"]]
+        assert statuses == ["uploaded", "error", "duplicate"]
+        assert body["results"][1]["detail"] == "Only PDF and DOCX files are allowed"
+        assert body["results"][2]["duplicate_of"] == "a.pdf"
+        assert sorted(os.listdir(docs)) == ["a.pdf"]
+        assert body["queued"] == 0
+        queue.submit.assert_not_called()
+
+    def test_oversized_file_is_rejected_alone(self, library):
+        docs, store, queue = library
+        with patch.object(server, 'MAX_UPLOAD_SIZE', 10), patch.object(server, 'UPLOAD_CHUNK_SIZE', 4):
+            body = _batch([("big.pdf", b"x" * 20), ("small.pdf", b"tiny")]).json()
+
+        assert [r["status"] for r in body["results"]] == ["error", "uploaded"]
+        assert sorted(os.listdir(docs)) == ["small.pdf"]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,128 @@
+"""
+Unit tests for content-hash deduplication of uploads.
+These tests don't require OpenAI or ChromaDB - metadata and the job queue are mocked.
+"""
+import pytest
+import sys
+import os
+import hashlib
+
+# Add python folder to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from unittest.mock import patch, MagicMock
+
+# Mock chromadb before importing server
+with patch.dict('sys.modules', {
+    'chromadb': MagicMock(),
+    'chromadb.utils': MagicMock(),
+    'chromadb.utils.embedding_functions': MagicMock(),
+}):
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ.setdefault('USER_DATA_DIR', '/tmp/test_docusenselm')
+
+    import server
+
+from fastapi.testclient import TestClient
+
+
+PDF = b"%PDF-1.4 mutual nda between acme and beta"
+
+
+@pytest.fixture
+def library(tmp_path, metadata_store):
+    queue = MagicMock()
+    with patch.object(server, 'DOCUMENTS_DIR', str(tmp_path)), \
+         patch.object(server, 'job_queue', queue):
+        yield tmp_path, metadata_store, queue
+
+
+def _upload(name, content, **params):
+    client = TestClient(server.app)
+    query = "&".join(f"{k}={v}" for k, v in dict({"doc_type": "nda"}, **params).items())
+    return client.post(f"/upload?{query}", files={"file": (name, content, "application/pdf")})
+
+
+class TestUploadDedup:
+    """Test that byte-identical uploads are linked instead of reprocessed."""
+
+    def test_hash_recorded_while_streaming(self, library):
+        docs, store, queue = library
+        response = _upload("NDA.pdf", PDF)
+        assert response.json()["status"] == "uploaded"
+        assert store.data["NDA.pdf"]["file_sha256"] == hashlib.sha256(PDF).hexdigest()
+        queue.submit.assert_called_once()
+
+    def test_duplicate_is_linked(self, library):
+        docs, store, queue = library
+        _upload("NDA.pdf", PDF)
+        response = _upload("Copy of NDA.pdf", PDF).json()
+
+        assert response["status"] == "duplicate"
+        assert response["filename"] == response["duplicate_of"] == "NDA.pdf"
+        assert sorted(os.listdir(docs)) == ["NDA.pdf"]
+        assert list(store.data) == ["NDA.pdf"]
+        assert queue.submit.call_count == 1
+
+    def test_duplicate_kept_as_alias(self, library):
+        docs, store, queue = library
+        _upload("NDA.pdf", PDF)
+        store.data["NDA.pdf"].update({"status": "processed", "competency_answers": {"term": "2 years"}})
+        response = _upload("NDA.pdf", PDF, on_duplicate="alias").json()
+
+        assert response == {"status": "alias", "filename": "NDA_1.pdf", "original_filename": "NDA.pdf",
+                            "file_size": len(PDF), "duplicate_of": "NDA.pdf"}
+        alias = store.data["NDA_1.pdf"]
+        assert alias["duplicate_of"] == "NDA.pdf"
+        assert alias["status"] == "processed"
+        assert alias["competency_answers"] == {"term": "2 years"}
+        assert queue.submit.call_count == 1
+
+    def test_process_mode_and_failed_originals_reprocess(self, library):
+        docs, store, queue = library
+        _upload("NDA.pdf", PDF)
+        assert _upload("NDA.pdf", PDF, on_duplicate="process").json()["status"] == "uploaded"
+
+        store.data["NDA.pdf"]["status"] = "error"
+        store.data["NDA_1.pdf"]["status"] = "error"
+        assert _upload("NDA.pdf", PDF).json()["status"] == "uploaded"
+        assert queue.submit.call_count == 3
+
+    def test_invalid_mode_rejected(self, library):
+        assert _upload("NDA.pdf", PDF, on_duplicate="merge").status_code == 400
+
+
+class TestContentHashIndex:
+    """Test the index built from metadata and alias bookkeeping."""
+
+    def test_index_skips_aliases_and_unhashed_documents(self):
+        metadata = {"a.pdf": {"file_sha256": "x"}, "alias.pdf": {"duplicate_of": "a.pdf", "file_sha256": "x"},
+                    "old.pdf": {"filename": "old.pdf"}}
+        assert server._content_hash_index(metadata) == {"x": "a.pdf"}
+
+    def test_backfills_documents_without_hashes(self, library):
+        docs, store, queue = library
+        (docs / "old.pdf").write_bytes(PDF)
+        store.data = {"old.pdf": {"filename": "old.pdf"}, "gone.pdf": {"filename": "gone.pdf"},
+                      "alias.pdf": {"duplicate_of": "old.pdf"}}
+
+        assert server.backfill_content_hashes() == 1
+        assert store.data["old.pdf"]["file_sha256"] == hashlib.sha256(PDF).hexdigest()
+        assert "file_sha256" not in store.data["gone.pdf"]
+        assert server.backfill_content_hashes() == 0
+        assert _upload("Copy.pdf", PDF).json()["duplicate_of"] == "old.pdf"
+
+    def test_sync_aliases(self):
+        metadata = {
+            "a.pdf": {"status": "processed", "text_extracted": True, "competency_answers": {"term": 1}},
+            "b.pdf": {"status": "pending", "duplicate_of": "a.pdf", "competency_answers": {}},
+            "c.pdf": {"status": "pending"},
+        }
+        assert server._sync_aliases(metadata, "a.pdf") == 1
+        assert metadata["b.pdf"]["status"] == "processed"
+        assert metadata["b.pdf"]["competency_answers"] == {"term": 1}
+        assert metadata["c.pdf"]["status"] == "pending"
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])